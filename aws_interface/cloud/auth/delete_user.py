@@ -1,5 +1,6 @@
 from cloud.aws import *
 from cloud.response import Response
+from cloud.auth.util import invalidate_user
 
 # Define the input output format of the function.
 # This information is used when creating the *SDK*.
@@ -26,6 +27,7 @@ def do(data, boto3):
     table_name = 'auth-{}'.format(app_id)
 
     dynamo = DynamoDB(boto3)
-    _ = dynamo.delete_item(table_name, user_id)
+    _ = dynamo.delete_item(table_name, user_id, partition='user')
+    invalidate_user(user_id)
     body['success'] = True
     return Response(body)
@@ -5,12 +5,13 @@ from cloud.response import Response
 # This information is used when creating the *SDK*.
 info = {
     'input_format': {
-        'session_id': 'str'
+        'session_id': 'str',
+        'fields': 'list?',
     },
     'output_format': {
         'item': {
             'id': 'str',
-            'creationDate': 'int',
+            'creationDate': 'float',
             'email': 'str',
             'passwordHash': 'str',
             'salt': 'str',
@@ -28,12 +29,13 @@ def do(data, boto3):
     app_id = data['app_id']
 
     session_id = params.get('session_id', None)
+    fields = params.get('fields', None)
 
     table_name = 'auth-{}'.format(app_id)
 
     dynamo = DynamoDB(boto3)
     try:
-        result = dynamo.get_item(table_name, session_id)
+        result = dynamo.get_item(table_name, session_id, ['userId'])
     except BaseException as ex:
         print(ex)
         body['message'] = 'permission denied'
@@ -42,8 +44,8 @@ def do(data, boto3):
     item = result.get('Item', {})
     user_id = item.get('userId', None)
     if user_id:
-        user = dynamo.get_item(table_name, user_id).get('Item', None)
-        body['item'] = user
+        user = dynamo.get_item(table_name, user_id, fields).get('Item', None)
+        body['item'] = project_item(user, fields)
     else:
         body['item'] = None
     return Response(body)
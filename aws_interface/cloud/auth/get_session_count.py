@@ -24,7 +24,7 @@ def do(data, boto3):
     partition = 'session'
 
     dynamo = DynamoDB(boto3)
-    count = dynamo.get_item_count(table_name, '{}-count'.format(partition))
-    item = count.get('Item', {'count': 0})
+    count = dynamo.get_item_count(table_name, partition)
+    item = count.get('Item')
     body['item'] = item
     return Response(body)
@@ -27,9 +27,7 @@ def do(data, boto3):
     partition = 'session'
 
     dynamo = DynamoDB(boto3)
-    result = dynamo.get_items(table_name, partition, exclusive_start_key=start_key, limit=limit)
-    items = result.get('Items', [])
-    end_key = result.get('LastEvaluatedKey', None)
+    items, end_key = dynamo.get_items_page(table_name, partition, int(limit), exclusive_start_key=start_key)
     body['items'] = items
     body['end_key'] = end_key
     return Response(body)
@@ -6,12 +6,13 @@ from cloud.response import Response
 # This information is used when creating the *SDK*.
 info = {
     'input_format': {
-        'user_id': 'str'
+        'user_id': 'str',
+        'fields': 'list?',
     },
     'output_format': {
         'item': {
             'id': 'str',
-            'creationDate': 'int',
+            'creationDate': 'float',
             'email': 'str',
             'passwordHash': 'str',
             'salt': 'str',
@@ -29,11 +30,12 @@ def do(data, boto3):
     app_id = data['app_id']
 
     user_id = params.get('user_id', None)
+    fields = params.get('fields', None)
 
     table_name = 'auth-{}'.format(app_id)
 
     dynamo = DynamoDB(boto3)
-    result = dynamo.get_item(table_name, user_id)
+    result = dynamo.get_item(table_name, user_id, fields)
     item = result.get('Item', None)
-    body['item'] = item
+    body['item'] = project_item(item, fields)
     return Response(body)
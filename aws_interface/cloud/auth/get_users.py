@@ -5,12 +5,13 @@ from cloud.response import Response
 # This information is used when creating the *SDK*.
 info = {
     'input_format': {
-        'start_key': 'str'
+        'start_key': 'str',
+        'fields': 'list?',
     },
     'output_format': {
         'items': [{
             'id': 'str',
-            'creationDate': 'int',
+            'creationDate': 'float',
             'email': 'str',
             'passwordHash': 'str',
             'salt': 'str',
@@ -30,14 +31,15 @@ def do(data, boto3):
 
     start_key = params.get('start_key', None)
     limit = params.get('limit', 100)
+    fields = params.get('fields', None)
 
     table_name = 'auth-{}'.format(app_id)
     partition = 'user'
 
     dynamo = DynamoDB(boto3)
-    result = dynamo.get_items(table_name, partition, exclusive_start_key=start_key, limit=limit)
-    items = result.get('Items', [])
-    end_key = result.get('LastEvaluatedKey', None)
+    items, end_key = dynamo.get_items_page(table_name, partition, int(limit), exclusive_start_key=start_key,
+                                           fields=fields)
+    items = [project_item(item, fields) for item in items]
     body['items'] = items
     body['end_key'] = end_key
     return Response(body)
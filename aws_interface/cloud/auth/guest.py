@@ -38,7 +38,7 @@ def do(data, boto3):
         body['message'] = '게스트 로그인이 비활성화 상태입니다.'
         return Response(body)
 
-    dynamo = DynamoDB(boto3)
+    dynamo = DynamoDB(boto3, transactional=recipe.get('transactional_writes', False))
 
     if guest_id:
         result = dynamo.get_item(table_name, guest_id)
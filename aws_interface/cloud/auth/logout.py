@@ -1,5 +1,6 @@
 from cloud.aws import *
 from cloud.response import Response
+from cloud.auth.util import invalidate_session
 
 
 # Define the input output format of the function.
@@ -25,6 +26,7 @@ def do(data, boto3):
     table_name = 'auth-{}'.format(app_id)
 
     dynamo = DynamoDB(boto3)
-    dynamo.delete_item(table_name, session_id)
+    dynamo.delete_item(table_name, session_id, partition='session')
+    invalidate_session(session_id)
     body['message'] = '로그아웃 되었습니다.'
     return Response(body)
@@ -45,7 +45,7 @@ def do(data, boto3):
         body['message'] = '이메일 로그인이 비활성화 상태입니다.'
         return Response(body)
 
-    dynamo = DynamoDB(boto3)
+    dynamo = DynamoDB(boto3, transactional=recipe.get('transactional_writes', False))
     resp = dynamo.get_items_with_index(table_name, 'partition-email', 'partition', 'user', 'email', email)
     users = resp['Items']
     if len(users) > 0:
@@ -34,7 +34,7 @@ def do(data, boto3):
     partition = 'user'
     default_group_name = 'admin'
 
-    dynamo = DynamoDB(boto3)
+    dynamo = DynamoDB(boto3, transactional=data['recipe'].get('transactional_writes', False))
     resp = dynamo.get_items_with_index(table_name, 'partition-email', 'partition', 'user', 'email', email)
     users = resp['Items']
     if len(users) > 0:
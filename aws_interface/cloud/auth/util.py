@@ -0,0 +1,40 @@
+from cloud.cache import LRUCache
+import cloud.metrics as metrics
+import cloud.auth.get_me as get_me
+
+session_cache = LRUCache(max_size=1024, ttl=60)
+
+
+def get_session_user(data, boto3):
+    """
+    Resolve data['params']['session_id'] to the user (id, group), using the
+    in-container session cache before falling back to get_me.
+    """
+    session_id = data['params'].get('session_id', None)
+    if not session_id:
+        return None
+    user = session_cache.get(session_id)
+    metrics.count('session_cache_hits' if user is not None else 'session_cache_misses')
+    if user is None:
+        me_data = dict(data)
+        me_data['params'] = {
+            'session_id': session_id,
+            'fields': ['id', 'group'],
+        }
+        item = get_me.do(me_data, boto3).get('body', {}).get('item', None)
+        if not item:
+            return None
+        user = {
+            'id': item.get('id', None),
+            'group': item.get('group', None),
+        }
+        session_cache.put(session_id, user)
+    return dict(user)
+
+
+def invalidate_session(session_id):
+    session_cache.pop(session_id)
+
+
+def invalidate_user(user_id):
+    session_cache.pop_if(lambda user: user.get('id', None) == user_id)
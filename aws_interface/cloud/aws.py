@@ -1,23 +1,413 @@
+import decimal
 import json
+import os
+import random
 import time
 import tempfile
+import threading
 import traceback
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import botocore
+import botocore.config
+import botocore.exceptions
 from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
 from time import sleep
 from sys import maxsize
+import cloud.metrics as metrics
+from cloud.cache import VersionedCache
 import cloud.shortuuid as shortuuid
 
 
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def serialize_item(item):
+    """
+    Convert python values to the attribute value format of the low-level client.
+    """
+    return dict((key, _serializer.serialize(value)) for key, value in item.items())
+
+
+def deserialize_item(item):
+    return dict((key, _deserializer.deserialize(value)) for key, value in item.items())
+
+
+def to_decimal(value):
+    """
+    DynamoDB rejects float, convert floats to Decimal through their shortest repr.
+    """
+    if isinstance(value, float):
+        return decimal.Decimal(repr(value))
+    if isinstance(value, dict):
+        return dict((key, to_decimal(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [to_decimal(item) for item in value]
+    return value
+
+
+def get_backoff(attempt, base=0.05, cap=2.0):
+    """
+    Full jitter exponential backoff.
+
+    :return: Seconds to wait before retry number attempt (0-based)
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def get_projection(fields):
+    """
+    :param fields: Attribute names, nested attributes as dotted paths e.g. 'extra.name'
+    :return: (ProjectionExpression, ExpressionAttributeNames)
+    """
+    names = {}
+    paths = []
+    fields = list(dict.fromkeys(fields))
+    for field in fields:
+        # DynamoDB rejects overlapping paths, so paths under a requested parent are skipped,
+        # e.g. 'extra.name' when 'extra' is requested
+        parents = field.split('.')
+        if any('.'.join(parents[:depth]) in fields for depth in range(1, len(parents))):
+            continue
+        parts = []
+        for part in field.split('.'):
+            placeholder = '#p{}'.format(len(names))
+            names[placeholder] = part
+            parts.append(placeholder)
+        paths.append('.'.join(parts))
+    return ', '.join(paths), names
+
+
+def get_update_expression(fields):
+    """
+    :param fields: {path: value}, nested attributes as dotted paths e.g. 'profile.address.city'.
+    A value of None removes the attribute.
+    :return: (UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+    """
+    names = {}
+    values = {}
+    sets = []
+    removes = []
+    for index, (field, value) in enumerate(fields.items()):
+        parts = []
+        for part in field.split('.'):
+            placeholder = '#u{}'.format(len(names))
+            names[placeholder] = part
+            parts.append(placeholder)
+        path = '.'.join(parts)
+        if value is None:
+            removes.append(path)
+        else:
+            values[':u{}'.format(index)] = value
+            sets.append('{} = :u{}'.format(path, index))
+    clauses = []
+    if sets:
+        clauses.append('SET ' + ', '.join(sets))
+    if removes:
+        clauses.append('REMOVE ' + ', '.join(removes))
+    return ' '.join(clauses), names, values
+
+
+def project_item(item, fields):
+    """
+    Drop the attributes fetched for internal use that are not in fields.
+
+    :param fields: Requested attributes, nested ones as dotted paths
+    """
+    if item is None or not fields:
+        return item
+    top_fields = set(field.split('.')[0] for field in fields) | {'id'}
+    return dict((key, value) for key, value in item.items() if key in top_fields)
+
+
+DEFAULT_INDEX = 'partition-creationDate'
+
+
+def get_index_name(sort_key, hash_key='partition'):
+    return '{}-{}'.format(hash_key, sort_key)
+
+
+def get_index_keys(index_name):
+    """
+    :return: (hash_key, sort_key) of an index named by get_index_name
+    """
+    hash_key, _, sort_key = index_name.partition('-')
+    return hash_key, sort_key
+
+
+# creationDate keeps microseconds, so items written within the same second keep their order
+CREATION_DATE_PRECISION = decimal.Decimal('0.000001')
+
+
+def get_creation_date():
+    """
+    :return: Current time in seconds as a Decimal with microseconds. Whole seconds
+    written before compare with it as before.
+    """
+    return decimal.Decimal(repr(time.time())).quantize(CREATION_DATE_PRECISION)
+
+
+def get_creation_date_condition(partition, since=None, until=None):
+    """
+    :param since: Seconds, items created at or after it
+    :param until: Seconds, items created at or before it
+    :return: Key condition on partition-creationDate, None if since and until are None
+    """
+    if since is None and until is None:
+        return None
+    key = Key('creationDate')
+    if since is not None and until is not None:
+        condition = key.between(to_decimal(since), to_decimal(until))
+    elif since is not None:
+        condition = key.gte(to_decimal(since))
+    else:
+        condition = key.lte(to_decimal(until))
+    return Key('partition').eq(partition) & condition
+
+
+def get_index_key(item, index_keys=('partition', 'creationDate')):
+    """
+    :return: Key of item in the index, usable as an ExclusiveStartKey
+    """
+    key = {
+        'id': item['id']
+    }
+    for index_key in index_keys:
+        key[index_key] = item[index_key]
+    return key
+
+
+def chunks(items, size):
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
 class Config:
     stage_name = 'prod_aws_interface'
+    max_pool_connections = 50
+    tcp_keepalive = True
+
+
+class ClientPool:
+    """
+    Process-wide cache of boto3 clients and resources keyed by (session, service, region).
+    Clients are thread-safe and shared by all threads. Resources are not, so each thread
+    keeps its own.
+    """
+    def __init__(self, max_pool_connections=None, tcp_keepalive=None):
+        self.max_pool_connections = max_pool_connections or Config.max_pool_connections
+        self.tcp_keepalive = Config.tcp_keepalive if tcp_keepalive is None else tcp_keepalive
+        self._clients = weakref.WeakKeyDictionary()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def configure(self, max_pool_connections=None, tcp_keepalive=None):
+        """
+        Change connection settings. Cached clients and resources are dropped so the
+        new settings take effect on the next call.
+        """
+        if max_pool_connections:
+            self.max_pool_connections = max_pool_connections
+        if tcp_keepalive is not None:
+            self.tcp_keepalive = tcp_keepalive
+        self.clear()
+
+    def get_config(self):
+        try:
+            return botocore.config.Config(max_pool_connections=self.max_pool_connections,
+                                          tcp_keepalive=self.tcp_keepalive)
+        except TypeError:  # botocore < 1.27 has no tcp_keepalive option
+            return botocore.config.Config(max_pool_connections=self.max_pool_connections)
+
+    def client(self, boto3_session, service_name, region_name=None):
+        key = (service_name, region_name)
+        client = self._clients.get(boto3_session, {}).get(key, None)
+        if client is None:
+            with self._lock:
+                clients = self._clients.setdefault(boto3_session, {})
+                client = clients.get(key, None)
+                if client is None:
+                    client = boto3_session.client(service_name, region_name=region_name, config=self.get_config())
+                    clients[key] = client
+        return client
+
+    def resource(self, boto3_session, service_name, region_name=None):
+        resources = getattr(self._local, 'resources', None)
+        if resources is None:
+            resources = self._local.resources = weakref.WeakKeyDictionary()
+        key = (service_name, region_name)
+        resource = resources.get(boto3_session, {}).get(key, None)
+        if resource is None:
+            # Creating clients and resources from one session is not thread-safe
+            with self._lock:
+                resource = boto3_session.resource(service_name, region_name=region_name, config=self.get_config())
+            resources.setdefault(boto3_session, {})[key] = resource
+        return resource
+
+    def clear(self):
+        with self._lock:
+            self._clients = weakref.WeakKeyDictionary()
+            self._local = threading.local()
+
+
+client_pool = ClientPool()
+
+
+ON_DEMAND = 'PAY_PER_REQUEST'
+PROVISIONED = 'PROVISIONED'
+
+
+def get_provisioned_throughput(capacity):
+    return {
+        'ReadCapacityUnits': int(capacity.get('read_capacity', 1)),
+        'WriteCapacityUnits': int(capacity.get('write_capacity', 1)),
+    }
+
+
+def throughput_matches(throughput, capacity):
+    """
+    :param throughput: ProvisionedThroughput of a table or index description
+    :return: True if throughput needs no update. With autoscaling, any value between the
+    provisioned minimum and the autoscaling maximum matches.
+    """
+    read = throughput.get('ReadCapacityUnits', 0)
+    write = throughput.get('WriteCapacityUnits', 0)
+    min_read = int(capacity.get('read_capacity', 1))
+    min_write = int(capacity.get('write_capacity', 1))
+    autoscaling = capacity.get('autoscaling', None)
+    if autoscaling:
+        return min_read <= read <= autoscaling['max_read_capacity'] and \
+            min_write <= write <= autoscaling['max_write_capacity']
+    return read == min_read and write == min_write
+
+
+THROTTLE_ERRORS = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
+
+
+def get_error_code(ex):
+    return ex.response.get('Error', {}).get('Code', None)
+
+
+class AdaptiveRateLimiter:
+    """
+    Client-side token bucket of one table. Requests are not limited until the table
+    throttles. The rate then drops to half of the rate measured, and grows back by
+    RATE_INCREASE requests per second every second without throttling. Requests in
+    flight throttle together, the rate drops at most once per DECREASE_INTERVAL.
+    """
+    MIN_RATE = 1.0
+    RATE_INCREASE = 5.0
+    DECREASE_FACTOR = 0.5
+    DECREASE_INTERVAL = 1.0
+
+    def __init__(self):
+        self.rate = None
+        self.tokens = 0.0
+        self.throttle_count = 0
+        self.updated_at = time.time()
+        self.adjusted_at = self.updated_at
+        self.decreased_at = self.updated_at
+        self.window_started_at = self.updated_at
+        self.window_count = 0
+        self.measured_rate = 0.0
+        self._lock = threading.Lock()
+
+    def _measure(self, now):
+        self.window_count += 1
+        elapsed = now - self.window_started_at
+        if elapsed >= 1.0:
+            self.measured_rate = self.window_count / elapsed
+            self.window_started_at = now
+            self.window_count = 0
+
+    def acquire(self):
+        """
+        Wait until the rate allows one more request.
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                if self.rate is None:
+                    self._measure(now)
+                    return
+                # Bursts are limited to one second of requests
+                self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    self._measure(now)
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            sleep(wait)
+
+    def throttled(self):
+        with self._lock:
+            now = time.time()
+            self.throttle_count += 1
+            if self.rate is not None and now - self.decreased_at < self.DECREASE_INTERVAL:
+                return
+            rate = self.rate
+            if rate is None:
+                # Rate of the last full second, or of the current one if it is higher
+                rate = max(self.measured_rate, self.window_count / max(now - self.window_started_at, 0.1))
+            self.rate = max(self.MIN_RATE, rate * self.DECREASE_FACTOR)
+            self.tokens = min(self.tokens, 1.0)
+            self.updated_at = now
+            self.adjusted_at = now
+            self.decreased_at = now
+
+    def succeeded(self):
+        with self._lock:
+            if self.rate is None:
+                return
+            now = time.time()
+            self.rate += self.RATE_INCREASE * min(now - self.adjusted_at, 1.0)
+            self.adjusted_at = now
+
+
+class RateLimiters:
+    """
+    Process-wide AdaptiveRateLimiter of every table, shared by all DynamoDB instances.
+    """
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, table_name):
+        limiter = self._limiters.get(table_name, None)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.setdefault(table_name, AdaptiveRateLimiter())
+        return limiter
+
+    def get_throttle_counts(self):
+        """
+        :return: {table_name: number of throttled requests}
+        """
+        with self._lock:
+            return dict((table_name, limiter.throttle_count) for table_name, limiter in self._limiters.items())
+
+    def clear(self):
+        with self._lock:
+            self._limiters = {}
+
+
+rate_limiters = RateLimiters()
+
+# Incremented by every write of an item, validates the copies of item_cache
+VERSION_FIELD = '_version'
+# Items read by get_item, keyed by (table_name, item_id), see cloud.database.get_item
+item_cache = VersionedCache(max_size=int(os.environ.get('ITEM_CACHE_SIZE', '1024')))
 
 
 class APIGateway:
     def __init__(self, boto3_session):
-        self.apigateway_client = boto3_session.client('apigateway')
-        self.lambda_client = boto3_session.client('lambda')
+        self.apigateway_client = client_pool.client(boto3_session, 'apigateway')
+        self.lambda_client = client_pool.client(boto3_session, 'lambda')
         self.iam = IAM(boto3_session)
 
     def get_rest_api_id(self, rest_api_name):
@@ -263,49 +653,150 @@ class APIGateway:
 
 
 class DynamoDB:
-    def __init__(self, boto3_session):
-        self.client = boto3_session.client('dynamodb')
-        self.resource = boto3_session.resource('dynamodb')
-
-    def init_table(self, table_name):
-        self.create_table(table_name)
+    BATCH_WRITE_SIZE = 25
+    BATCH_GET_SIZE = 100
+    BATCH_MAX_RETRIES = 8
+    MAX_COUNT_SHARDS = 100
+    TRANSACTION_MAX_RETRIES = 3
+    DEFAULT_CAPACITY = {
+        'mode': PROVISIONED,
+        'read_capacity': 1,
+        'write_capacity': 1,
+    }
+    EXPORT_SEGMENTS = 4
+    EXPORT_PAGE_SIZE = 1000
+
+    def __init__(self, boto3_session, count_shards=None, transactional=False):
+        """
+        :param count_shards: {partition: number of count shards}, 1 for partitions not listed
+        :param transactional: Write items and their counts in one transaction by default
+        """
+        self.client = client_pool.client(boto3_session, 'dynamodb')
+        self.resource = client_pool.resource(boto3_session, 'dynamodb')
+        self.count_shards = count_shards or {}
+        self.transactional = transactional
+
+    @contextmanager
+    def _request(self, operation, table_name):
+        """
+        Rate limit a request to table_name and report how long it took. Throttling
+        slows down the following requests to the table.
+        """
+        limiter = rate_limiters.get(table_name)
+        limiter.acquire()
+        try:
+            with metrics.aws_call('dynamodb', operation, table_name):
+                yield
+        except botocore.exceptions.ClientError as ex:
+            if get_error_code(ex) in THROTTLE_ERRORS:
+                limiter.throttled()
+                metrics.count('throttled_requests')
+            raise
+        limiter.succeeded()
+
+    def _throttled(self, table_name):
+        """
+        Report a batch request that left items or keys unprocessed, DynamoDB does so
+        when the table throttles.
+        """
+        rate_limiters.get(table_name).throttled()
+        metrics.count('throttled_requests')
+
+    def init_table(self, table_name, capacity=None):
+        self.create_table(table_name, capacity)
         self.update_table(table_name, indexes=[{
             'hash_key': 'partition',
             'hash_key_type': 'S',
             'sort_key': 'creationDate',
             'sort_key_type': 'N'
-        }])
+        }], capacity=capacity)
+
+    def create_table(self, table_name, capacity=None):
+        """
+        Create the table and wait until it is active, nothing happens if it exists.
 
-    def create_table(self, table_name):
+        :param capacity: Capacity profile, see RecipeController.set_capacity. DEFAULT_CAPACITY if None
+        """
+        capacity = capacity or self.DEFAULT_CAPACITY
+        kwargs = {
+            'BillingMode': capacity['mode'],
+        }
+        if capacity['mode'] == PROVISIONED:
+            kwargs['ProvisionedThroughput'] = get_provisioned_throughput(capacity)
         try:
-            response = self.client.create_table(
-                AttributeDefinitions=[
-                    {
-                        'AttributeName': 'id',
-                        'AttributeType': 'S'
-                    }
-                ],
-                TableName=table_name,
-                KeySchema=[
-                    {
-                        'AttributeName': 'id',
-                        'KeyType': 'HASH'
+            with self._request('CreateTable', table_name):
+                response = self.client.create_table(
+                    AttributeDefinitions=[
+                        {
+                            'AttributeName': 'id',
+                            'AttributeType': 'S'
+                        }
+                    ],
+                    TableName=table_name,
+                    KeySchema=[
+                        {
+                            'AttributeName': 'id',
+                            'KeyType': 'HASH'
+                        },
+                    ],
+                    StreamSpecification={
+                        'StreamEnabled': True,
+                        'StreamViewType': 'KEYS_ONLY'
                     },
-                ],
-                ProvisionedThroughput={
-                    'ReadCapacityUnits': 1,
-                    'WriteCapacityUnits': 1
-                },
-                StreamSpecification={
-                    'StreamEnabled': True,
-                    'StreamViewType': 'KEYS_ONLY'
-                }
-            )
-            return response
-        except:
-            return None
+                    **kwargs
+                )
+        except botocore.exceptions.ClientError as ex:
+            if get_error_code(ex) == 'ResourceInUseException':  # The table exists
+                return None
+            raise
+        # Indexes can only be added to an active table
+        self.client.get_waiter('table_exists').wait(TableName=table_name)
+        return response
 
-    def update_table(self, table_name, indexes):
+    def describe_table(self, table_name):
+        with self._request('DescribeTable', table_name):
+            return self.client.describe_table(TableName=table_name)['Table']
+
+    def get_index_names(self, table_name):
+        return [index['IndexName'] for index in self.describe_table(table_name).get('GlobalSecondaryIndexes', [])]
+
+    def get_index_statuses(self, table_name):
+        """
+        :return: {index_name: 'CREATING', 'UPDATING', 'DELETING' or 'ACTIVE'}. A created
+        index stays CREATING while it is backfilled, it cannot be queried before ACTIVE.
+        """
+        indexes = self.describe_table(table_name).get('GlobalSecondaryIndexes', [])
+        return dict((index['IndexName'], index.get('IndexStatus', 'ACTIVE')) for index in indexes)
+
+    def delete_index(self, table_name, index_name):
+        """
+        :return: False if the table is busy with another index, try again later
+        """
+        try:
+            with self._request('UpdateTable', table_name):
+                self.client.update_table(TableName=table_name, GlobalSecondaryIndexUpdates=[{
+                    'Delete': {
+                        'IndexName': index_name,
+                    }
+                }])
+        except botocore.exceptions.ClientError as ex:
+            if get_error_code(ex) not in ('ResourceInUseException', 'LimitExceededException'):
+                raise
+            print('Index {} of {} is not deleted yet: {}'.format(index_name, table_name, ex))
+            return False
+        return True
+
+    def update_table(self, table_name, indexes, capacity=None):
+        """
+        Create the indexes the table does not have yet. DynamoDB creates one index at a
+        time, indexes it refuses for now are created by a later call.
+
+        :param capacity: Throughput of new indexes of a provisioned table, DEFAULT_CAPACITY if None
+        """
+        table = self.describe_table(table_name)
+        existing = set(index['IndexName'] for index in table.get('GlobalSecondaryIndexes', []))
+        billing_mode = table.get('BillingModeSummary', {}).get('BillingMode', PROVISIONED)
+        capacity = capacity or self.DEFAULT_CAPACITY
         responses = []
         for index in indexes:
             attr_updates = []
@@ -328,6 +819,8 @@ class DynamoDB:
                 })
             else:
                 index_name = hash_key
+            if index_name in existing:
+                continue
             index_create = {
                     'Create': {
                         'IndexName': index_name,
@@ -335,12 +828,10 @@ class DynamoDB:
                         'Projection': {
                             'ProjectionType': 'ALL'
                         },
-                        'ProvisionedThroughput': {
-                            'ReadCapacityUnits': 1,
-                            'WriteCapacityUnits': 1
-                        }
                     }
                 }
+            if billing_mode == PROVISIONED:
+                index_create['Create']['ProvisionedThroughput'] = get_provisioned_throughput(capacity)
             hash_key_update = {
                 'AttributeName': hash_key,
                 'AttributeType': hash_key_type
@@ -354,146 +845,797 @@ class DynamoDB:
                 }
                 attr_updates.append(sort_key_update)
             try:
-                response = self.client.update_table(
-                    AttributeDefinitions=attr_updates,
-                    TableName=table_name,
-                    GlobalSecondaryIndexUpdates=index_updates
-                )
+                with self._request('UpdateTable', table_name):
+                    response = self.client.update_table(
+                        AttributeDefinitions=attr_updates,
+                        TableName=table_name,
+                        GlobalSecondaryIndexUpdates=index_updates
+                    )
                 responses.append(response)
-            except:
-                continue
+            except botocore.exceptions.ClientError as ex:
+                if get_error_code(ex) not in ('ResourceInUseException', 'LimitExceededException'):
+                    raise
+                print('Index {} of {} is not created yet: {}'.format(index_name, table_name, ex))
         return responses
 
-    def delete_item(self, table_name, item_id):
-        item = self.get_item(table_name, item_id)
-        partition = item.get('Item', {}).get('partition', None)
-        if not partition:
-            print('It cannot be removed. table_name: {}, item_id: {}'.format(table_name, item_id))
-            return False
-        response = self.client.delete_item(
-            TableName=table_name,
-            Key={
-                'id': {
-                    'S': item_id
-                }
+    def apply_capacity(self, table_name, capacity):
+        """
+        Change the billing mode and provisioned throughput of the table and its indexes
+        where they differ from capacity. With autoscaling, throughput within its bounds
+        is left to it. See ApplicationAutoScaling.apply_dynamodb_capacity for the
+        autoscaling targets.
+
+        :param capacity: Capacity profile, see RecipeController.set_capacity
+        :return: List of changes, empty when the table already matched
+        """
+        table = self.describe_table(table_name)
+        if table.get('TableStatus', 'ACTIVE') != 'ACTIVE':
+            print('Table {} is {}, its capacity is applied later'.format(table_name, table['TableStatus']))
+            return []
+        mode = capacity['mode']
+        current_mode = table.get('BillingModeSummary', {}).get('BillingMode', PROVISIONED)
+        kwargs = {}
+        changes = []
+        if mode != current_mode:
+            kwargs['BillingMode'] = mode
+            changes.append('{} billing mode {} -> {}'.format(table_name, current_mode, mode))
+        if mode == PROVISIONED:
+            throughput = get_provisioned_throughput(capacity)
+            # Switching to provisioned sets the throughput of the table and of every index at once
+            if mode != current_mode or not throughput_matches(table.get('ProvisionedThroughput', {}), capacity):
+                kwargs['ProvisionedThroughput'] = throughput
+                changes.append('{} throughput {}'.format(table_name, throughput))
+            index_updates = []
+            for index in table.get('GlobalSecondaryIndexes', []):
+                if mode != current_mode or not throughput_matches(index.get('ProvisionedThroughput', {}), capacity):
+                    index_updates.append({
+                        'Update': {
+                            'IndexName': index['IndexName'],
+                            'ProvisionedThroughput': throughput,
+                        }
+                    })
+                    changes.append('{} index {} throughput {}'.format(table_name, index['IndexName'], throughput))
+            if index_updates:
+                kwargs['GlobalSecondaryIndexUpdates'] = index_updates
+        if not kwargs:
+            return []
+        try:
+            with self._request('UpdateTable', table_name):
+                self.client.update_table(TableName=table_name, **kwargs)
+        except botocore.exceptions.ClientError as ex:
+            if get_error_code(ex) not in ('ResourceInUseException', 'LimitExceededException'):
+                raise
+            print('Capacity of {} is not applied yet: {}'.format(table_name, ex))
+            return []
+        return changes
+
+    def delete_item(self, table_name, item_id, partition=None, condition=None):
+        """
+        Delete an item and decrement the count of its partition.
+
+        When the partition is known, the delete and the count update are written in a
+        single TransactWriteItems. Otherwise the item is deleted with ReturnValues ALL_OLD
+        and the count of the returned item's partition is decremented.
+
+        :param partition: Partition of the item, if the caller knows it
+        :param condition: Extra (expression, names, values) the item must satisfy,
+        e.g. a permission check. Values are plain python values.
+        :return: Response of the delete or False if the item does not exist or the condition failed
+        """
+        expression = 'attribute_exists(#id)'
+        names = {'#id': 'id'}
+        values = {}
+        if partition:
+            expression = '#partition = :partition'
+            names = {'#partition': 'partition'}
+            values = {':partition': partition}
+        if condition:
+            condition_expression, condition_names, condition_values = condition
+            expression = '{} AND ({})'.format(expression, condition_expression)
+            names.update(condition_names)
+            values.update(condition_values)
+        key = {
+            'id': {
+                'S': item_id
             }
-        )
-        self._add_item_count(table_name, '{}-count'.format(partition), value_to_add=-1)
+        }
+        delete = {
+            'TableName': table_name,
+            'Key': key,
+            'ConditionExpression': expression,
+            'ExpressionAttributeNames': names,
+        }
+        if values:
+            delete['ExpressionAttributeValues'] = serialize_item(values)
+
+        try:
+            if partition:
+                with self._request('TransactWriteItems', table_name):
+                    response = self.client.transact_write_items(TransactItems=[
+                        {'Delete': delete},
+                        {'Update': self._get_count_update(table_name, self.get_count_id(partition), -1)},
+                    ])
+                item_cache.invalidate((table_name, item_id))
+                return response
+            with self._request('DeleteItem', table_name):
+                response = self.client.delete_item(ReturnValues='ALL_OLD', **delete)
+        except botocore.exceptions.ClientError as ex:
+            code = ex.response.get('Error', {}).get('Code', None)
+            if code in ('ConditionalCheckFailedException', 'TransactionCanceledException'):
+                print('It cannot be removed. table_name: {}, item_id: {}'.format(table_name, item_id))
+                return False
+            raise
+        response['Attributes'] = deserialize_item(response.get('Attributes', {}))
+        item_cache.invalidate((table_name, item_id), response['Attributes'].get(VERSION_FIELD, 0) + 1)
+        partition = response['Attributes'].get('partition', None)
+        if partition:
+            self._add_item_count(table_name, self.get_count_id(partition), value_to_add=-1)
         return response
 
-    def get_item(self, table_name, item_id):
+    def get_item(self, table_name, item_id, fields=None, consistent_read=False):
+        """
+        :param fields: Attributes to return besides id, all if None
+        """
         table = self.resource.Table(table_name)
-        item = table.get_item(Key={
-            'id': item_id
-        })
+        kwargs = {}
+        if consistent_read:
+            kwargs['ConsistentRead'] = True
+        if fields:
+            expression, names = get_projection(list(fields) + ['id'])
+            kwargs['ProjectionExpression'] = expression
+            kwargs['ExpressionAttributeNames'] = names
+        with self._request('GetItem', table_name):
+            item = table.get_item(Key={
+                'id': item_id
+            }, **kwargs)
         return item
 
-    def get_items(self, table_name, partition, exclusive_start_key=None, limit=None, reverse=False):
+    def batch_get_items(self, table_name, item_ids, fields=None):
+        """
+        Read many items with BatchGetItem, 100 keys per request, retrying
+        UnprocessedKeys with jittered backoff.
+
+        :param fields: Attributes to return, all if None
+        :return: {'items': {item_id: item}, 'unprocessed_ids': ids that could not be read}
+        """
+        request = {}
+        if fields:
+            expression, names = get_projection(set(fields) | {'id'})
+            request['ProjectionExpression'] = expression
+            request['ExpressionAttributeNames'] = names
+
+        items = {}
+        unprocessed_ids = []
+        # BatchGetItem rejects duplicated keys
+        unique_ids = list(dict.fromkeys(item_ids))
+        for chunk in chunks(unique_ids, self.BATCH_GET_SIZE):
+            keys = [{'id': item_id} for item_id in chunk]
+            for attempt in range(self.BATCH_MAX_RETRIES + 1):
+                if attempt:
+                    sleep(get_backoff(attempt - 1))
+                request['Keys'] = keys
+                with self._request('BatchGetItem', table_name):
+                    response = self.resource.batch_get_item(RequestItems={
+                        table_name: request
+                    })
+                for item in response.get('Responses', {}).get(table_name, []):
+                    items[item['id']] = item
+                keys = response.get('UnprocessedKeys', {}).get(table_name, {}).get('Keys', [])
+                if not keys:
+                    break
+                metrics.count('unprocessed_keys', len(keys))
+                self._throttled(table_name)
+            unprocessed_ids.extend(key['id'] for key in keys)
+        return {
+            'items': items,
+            'unprocessed_ids': unprocessed_ids,
+        }
+
+    def iter_items(self, table_name, partition, page_size=100, reverse=False, max_items=None,
+                   exclusive_start_key=None, fields=None):
+        """
+        Yield the items of partition, querying the next page only when the previous
+        one is consumed, so a whole partition can be streamed with bounded memory.
+
+        :param page_size: Items per Query
+        :param max_items: Stop after this many items, all if None
+        :param exclusive_start_key: Resume after this key, e.g. from get_index_key
+        :param fields: Attributes to return, all if None
+        """
+        yielded = 0
+        while True:
+            limit = page_size
+            if max_items:
+                limit = min(page_size, max_items - yielded)
+            response = self.get_items(table_name, partition, exclusive_start_key, limit, reverse, fields)
+            for item in response.get('Items', []):
+                yield item
+                yielded += 1
+                if max_items and yielded >= max_items:
+                    return
+            exclusive_start_key = response.get('LastEvaluatedKey', None)
+            if not exclusive_start_key:
+                return
+
+    def get_items_page(self, table_name, partition, limit=100, reverse=False, exclusive_start_key=None,
+                       fields=None, condition=None, max_read_units=None, index_name=DEFAULT_INDEX,
+                       key_condition=None):
+        """
+        Collect up to limit items of partition. With a condition, Query is repeated until
+        limit matching items are found, the partition ends or max_read_units are consumed.
+
+        :param fields: Attributes to return, all if None. The index keys are always
+        returned, end_key is made of them.
+        :param condition: (expression, names, values) used as FilterExpression
+        :param max_read_units: Read capacity budget of the whole page, unlimited if None
+        :param index_name: Index 'partition-<sort key>' to query
+        :param key_condition: Key condition on the index, all items of partition if None
+        :return: (items, end_key) with up to limit items, end_key is None after the last item
+        """
+        index_keys = get_index_keys(index_name)
+        if fields:
+            fields = list(fields) + list(index_keys)
+        items = []
+        read_units = 0
+        end_key = exclusive_start_key
+        while True:
+            response = self.get_items(table_name, partition, end_key, limit, reverse, fields, condition,
+                                      return_consumed_capacity=max_read_units is not None,
+                                      index_name=index_name, key_condition=key_condition)
+            read_units += response.get('ConsumedCapacity', {}).get('CapacityUnits', 0)
+            end_key = response.get('LastEvaluatedKey', None)
+            page = response.get('Items', [])
+            needed = limit - len(items)
+            if len(page) > needed:
+                # Resume right after the last item returned, the rest of the page is read again
+                items.extend(page[:needed])
+                end_key = get_index_key(items[-1], index_keys)
+            else:
+                items.extend(page)
+            if len(items) >= limit or not end_key:
+                break
+            if max_read_units is not None and read_units >= max_read_units:
+                metrics.count('read_budget_exhausted')
+                break
+        metrics.count('page_read_units', read_units)
+        return items, end_key
+
+    def get_items(self, table_name, partition, exclusive_start_key=None, limit=None, reverse=False, fields=None,
+                  condition=None, return_consumed_capacity=False, index_name=DEFAULT_INDEX, key_condition=None):
+        """
+        :param key_condition: Key condition on index_name, Key('partition').eq(partition) if None
+        """
         scan_index_forward = not reverse
-        index_name = 'partition-creationDate'
+        if key_condition is None:
+            key_condition = Key('partition').eq(partition)
         table = self.resource.Table(table_name)
         if not limit:
             limit = maxsize
+        kwargs = {}
         if exclusive_start_key:
+            kwargs['ExclusiveStartKey'] = exclusive_start_key
+        if fields:
+            expression, names = get_projection(list(fields) + ['id'])
+            kwargs['ProjectionExpression'] = expression
+            kwargs['ExpressionAttributeNames'] = names
+        if condition:
+            expression, names, values = condition
+            kwargs['FilterExpression'] = expression
+            kwargs.setdefault('ExpressionAttributeNames', {}).update(names)
+            kwargs['ExpressionAttributeValues'] = dict(values)
+        if return_consumed_capacity:
+            kwargs['ReturnConsumedCapacity'] = 'TOTAL'
+        with self._request('Query', table_name):
             response = table.query(
                 IndexName=index_name,
                 Limit=limit,
                 ConsistentRead=False,
-                ExclusiveStartKey=exclusive_start_key,
-                KeyConditionExpression=Key('partition').eq(partition),
+                KeyConditionExpression=key_condition,
                 ScanIndexForward=scan_index_forward,
+                **kwargs
             )
-        else:
-            response = table.query(
-                IndexName=index_name,
-                Limit=limit,
-                ConsistentRead=False,
-                KeyConditionExpression=Key('partition').eq(partition),
-                ScanIndexForward=scan_index_forward,
+        return response
+
+    def scan_items(self, table_name, segment=0, total_segments=1, exclusive_start_key=None, limit=None,
+                   partition=None, fields=None):
+        """
+        Read one Scan page of a segment of the table.
+
+        :param partition: Only return the items of this partition
+        :param fields: Attributes to return besides id, all if None
+        :return: Scan response with deserialized Items and LastEvaluatedKey
+        """
+        kwargs = {}
+        if exclusive_start_key:
+            kwargs['ExclusiveStartKey'] = serialize_item(exclusive_start_key)
+        if limit:
+            kwargs['Limit'] = limit
+        if fields:
+            expression, names = get_projection(list(fields) + ['id'])
+            kwargs['ProjectionExpression'] = expression
+            kwargs['ExpressionAttributeNames'] = names
+        if partition:
+            kwargs['FilterExpression'] = '#partition = :partition'
+            kwargs.setdefault('ExpressionAttributeNames', {})['#partition'] = 'partition'
+            kwargs['ExpressionAttributeValues'] = serialize_item({':partition': partition})
+        with self._request('Scan', table_name):
+            response = self.client.scan(
+                TableName=table_name,
+                Segment=segment,
+                TotalSegments=total_segments,
+                **kwargs
             )
+        response['Items'] = [deserialize_item(item) for item in response.get('Items', [])]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = deserialize_item(response['LastEvaluatedKey'])
         return response
 
+    def export_items(self, table_name, write, partition=None, total_segments=EXPORT_SEGMENTS, checkpoint=None,
+                     on_checkpoint=None, page_size=EXPORT_PAGE_SIZE, fields=None):
+        """
+        Read the table with a parallel segmented Scan, one thread per segment, and pass
+        every page to write.
+
+        :param write: Called with each list of items. Calls are serialized, write does
+        not have to be thread-safe.
+        :param partition: Only export the items of this partition
+        :param checkpoint: {segment: {'start_key': key, 'done': bool}} updated in place after
+        every written page. Pass it again with the same total_segments to resume: finished
+        segments are skipped, the others restart after their last written page.
+        :param on_checkpoint: Called with checkpoint after every update, e.g. to save it
+        :return: Number of items written
+        """
+        if checkpoint is None:
+            checkpoint = {}
+        lock = threading.Lock()
+        exported = [0]
+        invocation = metrics.get_current()
+
+        def export_segment(segment):
+            with lock:
+                state = checkpoint.setdefault(str(segment), {'start_key': None, 'done': False})
+            with metrics.bind(invocation):
+                while not state['done']:
+                    response = self.scan_items(table_name, segment, total_segments, state['start_key'],
+                                               page_size, partition, fields)
+                    with lock:
+                        if response['Items']:
+                            write(response['Items'])
+                            exported[0] += len(response['Items'])
+                        state['start_key'] = response.get('LastEvaluatedKey', None)
+                        state['done'] = state['start_key'] is None
+                        if on_checkpoint:
+                            on_checkpoint(checkpoint)
+
+        with ThreadPoolExecutor(max_workers=total_segments) as executor:
+            futures = [executor.submit(export_segment, segment) for segment in range(total_segments)]
+            for future in futures:
+                future.result()
+        metrics.count('exported_items', exported[0])
+        return exported[0]
+
     def get_items_with_index(self, table_name, index_name, hash_key_name, hash_key_value, sort_key_name, sort_key_value,
                              exclusive_start_key=None, limit=100):
         table = self.resource.Table(table_name)
-        if exclusive_start_key:
-            response = table.query(
-                IndexName=index_name,
-                Limit=limit,
-                ConsistentRead=False,
-                ExclusiveStartKey=exclusive_start_key,
-                KeyConditionExpression=Key(hash_key_name).eq(hash_key_value) & Key(sort_key_name).eq(sort_key_value)
-            )
-        else:
-            response = table.query(
-                IndexName=index_name,
-                Limit=limit,
-                ConsistentRead=False,
-                KeyConditionExpression=Key(hash_key_name).eq(hash_key_value) & Key(sort_key_name).eq(sort_key_value),
-            )
+        with self._request('Query', table_name):
+            if exclusive_start_key:
+                response = table.query(
+                    IndexName=index_name,
+                    Limit=limit,
+                    ConsistentRead=False,
+                    ExclusiveStartKey=exclusive_start_key,
+                    KeyConditionExpression=Key(hash_key_name).eq(hash_key_value) & Key(sort_key_name).eq(sort_key_value)
+                )
+            else:
+                response = table.query(
+                    IndexName=index_name,
+                    Limit=limit,
+                    ConsistentRead=False,
+                    KeyConditionExpression=Key(hash_key_name).eq(hash_key_value) & Key(sort_key_name).eq(sort_key_value),
+                )
         return response
 
-    def put_item(self, table_name, partition, item, item_id=None, creation_date=None):
+    def put_item(self, table_name, partition, item, item_id=None, creation_date=None, transactional=None):
+        """
+        Write item and increase the count of its partition.
+
+        :param transactional: Commit the item and the count in one TransactWriteItems,
+        defaults to the transactional setting of this DynamoDB. If the transaction keeps
+        conflicting on the count, the two requests are sent separately.
+        """
         if not item_id:
             item_id = str(shortuuid.uuid())
         if not creation_date:
-            creation_date = int(time.time())
-        table = self.resource.Table(table_name)
+            creation_date = get_creation_date()
         item['id'] = item_id
         item['creationDate'] = creation_date
         item['partition'] = partition
+        item[VERSION_FIELD] = 1
 
-        response = table.put_item(
-            TableName=table_name,
-            Item=item,
-        )
-        self._add_item_count(table_name, '{}-count'.format(partition))
+        if transactional is None:
+            transactional = self.transactional
+        if transactional:
+            response = self._transact_put_item(table_name, partition, item)
+            if response:
+                item_cache.invalidate((table_name, item_id))
+                return response
+
+        table = self.resource.Table(table_name)
+        with self._request('PutItem', table_name):
+            response = table.put_item(
+                TableName=table_name,
+                Item=item,
+            )
+        # A new item has no older copy to guard against, no tombstone is needed
+        item_cache.invalidate((table_name, item_id))
+        self._add_item_count(table_name, self.get_count_id(partition))
         return response
 
-    def update_item(self, table_name, item_id, item):
+    def replace_item(self, table_name, item, condition):
+        """
+        Overwrite an existing item with one conditional PutItem. The version of item is
+        increased, the partition count is left as it is.
+
+        :param item: Whole new item with its id, partition and creationDate
+        :param condition: (expression, names, values) the stored item must satisfy, e.g.
+        its version and a permission check
+        :return: Response or False if the condition failed
+        """
+        expression, names, values = condition
+        item['update_date'] = int(time.time())
+        item[VERSION_FIELD] = item.get(VERSION_FIELD, 0) + 1
+        kwargs = {}
+        if values:
+            kwargs['ExpressionAttributeValues'] = values
         table = self.resource.Table(table_name)
-        update_date = int(time.time())
-        item['id'] = item_id
-        item['update_date'] = update_date
-        response = table.put_item(
-            TableName=table_name,
-            Item=item,
-        )
+        try:
+            with self._request('PutItem', table_name):
+                response = table.put_item(
+                    Item=item,
+                    ConditionExpression='attribute_exists(#id) AND ({})'.format(expression),
+                    ExpressionAttributeNames=dict(names, **{'#id': 'id'}),
+                    **kwargs
+                )
+        except botocore.exceptions.ClientError as ex:
+            if get_error_code(ex) == 'ConditionalCheckFailedException':
+                return False
+            raise
+        item_cache.invalidate((table_name, item['id']), item[VERSION_FIELD])
+        return response
+
+    def _transact_put_item(self, table_name, partition, item):
+        """
+        :return: Response or None if the transaction was cancelled by conflicting writes
+        """
+        for attempt in range(self.TRANSACTION_MAX_RETRIES + 1):
+            if attempt:
+                sleep(get_backoff(attempt - 1))
+            try:
+                with self._request('TransactWriteItems', table_name):
+                    return self.client.transact_write_items(TransactItems=[
+                        {'Put': {
+                            'TableName': table_name,
+                            'Item': serialize_item(item),
+                        }},
+                        {'Update': self._get_count_update(table_name, self.get_count_id(partition), 1)},
+                    ])
+            except botocore.exceptions.ClientError as ex:
+                if ex.response.get('Error', {}).get('Code', None) != 'TransactionCanceledException':
+                    raise
+                metrics.count('transaction_conflicts')
+        return None
+
+    def batch_put_items(self, table_name, partition_items, creation_date=None, max_retries=None,
+                        replaced_partitions=None, keep_creation_dates=False):
+        """
+        Write many items with BatchWriteItem, 25 per request. Unprocessed items are
+        retried with jittered backoff and the count of each partition is increased
+        once, by the number of items written to it. Batches never use transactions,
+        which would cost twice the write capacity per item.
+
+        :param partition_items: List of (partition, item) tuples
+        :param max_retries: Retries of unprocessed items, BATCH_MAX_RETRIES if None
+        :param replaced_partitions: {item_id: partition} of items the batch overwrites,
+        they are not counted again and are moved between counts if their partition changes
+        :param keep_creation_dates: Keep the creationDate of items that have one, e.g. on
+        import, it must be a number. Otherwise the server sets every creationDate
+        :return: {'item_ids': ids written, 'unprocessed_items': items that could not be written}
+        """
+        # Items are one microsecond apart, they are read back in the order they were given
+        now = get_creation_date()
+        items = []
+        for index, (partition, item) in enumerate(partition_items):
+            item['id'] = item.get('id', None) or str(shortuuid.uuid())
+            if not keep_creation_dates or not item.get('creationDate', None):
+                item['creationDate'] = creation_date or now + index * CREATION_DATE_PRECISION
+            item['partition'] = partition
+            item[VERSION_FIELD] = 1
+            items.append(item)
+
+        unprocessed_items = []
+        written = []
+        try:
+            for chunk in chunks(items, self.BATCH_WRITE_SIZE):
+                unprocessed = self._batch_write(table_name, [{
+                    'PutRequest': {
+                        'Item': item
+                    }
+                } for item in chunk], max_retries)
+                unprocessed_ids = set(request['PutRequest']['Item']['id'] for request in unprocessed)
+                written.extend(item for item in chunk if item['id'] not in unprocessed_ids)
+                unprocessed_items.extend(unprocessed)
+        finally:
+            # Chunks written before a failing one are counted too
+            self._count_written_items(table_name, written, replaced_partitions or {})
+        return {
+            'item_ids': [item['id'] for item in written],
+            'unprocessed_items': [request['PutRequest']['Item'] for request in unprocessed_items],
+        }
+
+    def _count_written_items(self, table_name, items, replaced_partitions):
+        counts = {}
+        for item in items:
+            # Dropped rather than left as tombstones, which would push hot items out
+            item_cache.invalidate((table_name, item['id']))
+            replaced_partition = replaced_partitions.get(item['id'], None)
+            if replaced_partition == item['partition']:
+                continue
+            if replaced_partition is not None:
+                counts[replaced_partition] = counts.get(replaced_partition, 0) - 1
+            counts[item['partition']] = counts.get(item['partition'], 0) + 1
+        for partition, count in counts.items():
+            if not count:
+                continue
+            self._add_item_count(table_name, self.get_count_id(partition), value_to_add=count)
+
+    def batch_write_items(self, table_name, put_items=(), delete_ids=(), max_retries=None):
+        """
+        Put and delete raw items with BatchWriteItem, 25 requests at a time, without
+        touching partition counts.
+
+        :return: Requests still unprocessed after the retries
+        """
+        requests = [{'PutRequest': {'Item': item}} for item in put_items]
+        requests += [{'DeleteRequest': {'Key': {'id': item_id}}} for item_id in delete_ids]
+        for item_id in [item['id'] for item in put_items] + list(delete_ids):
+            item_cache.invalidate((table_name, item_id))
+        unprocessed = []
+        for chunk in chunks(requests, self.BATCH_WRITE_SIZE):
+            unprocessed.extend(self._batch_write(table_name, chunk, max_retries))
+        return unprocessed
+
+    def _batch_write(self, table_name, requests, max_retries=None):
+        """
+        :return: Requests still unprocessed after max_retries retries, BATCH_MAX_RETRIES if None
+        """
+        if max_retries is None:
+            max_retries = self.BATCH_MAX_RETRIES
+        for attempt in range(max_retries + 1):
+            if attempt:
+                sleep(get_backoff(attempt - 1))
+            with self._request('BatchWriteItem', table_name):
+                response = self.resource.batch_write_item(RequestItems={
+                    table_name: requests
+                })
+            requests = response.get('UnprocessedItems', {}).get(table_name, [])
+            if not requests:
+                break
+            metrics.count('unprocessed_items', len(requests))
+            self._throttled(table_name)
+        return requests
+
+    def update_item_fields(self, table_name, item_id, fields, condition=None, return_values=None):
+        """
+        Change some attributes of an existing item with one UpdateItem, without
+        reading or rewriting the rest of it.
+
+        :param fields: {path: value}, see get_update_expression
+        :param condition: Extra (expression, names, values) the item must satisfy,
+        e.g. a permission check
+        :param return_values: ReturnValues of UpdateItem e.g. 'ALL_OLD', see Attributes of the response
+        :return: Response or False if the item does not exist or the condition failed
+        """
+        fields = dict(fields)
+        fields['update_date'] = int(time.time())
+        update_expression, names, values = get_update_expression(fields)
+        update_expression += ' ADD #version :version_step'
+        names['#version'] = VERSION_FIELD
+        values[':version_step'] = 1
+        expression = 'attribute_exists(#id)'
+        names['#id'] = 'id'
+        if condition:
+            condition_expression, condition_names, condition_values = condition
+            expression = '{} AND ({})'.format(expression, condition_expression)
+            names.update(condition_names)
+            values.update(condition_values)
+        table = self.resource.Table(table_name)
+        # The new version is needed to validate item_cache
+        return_values = return_values or 'UPDATED_NEW'
+        try:
+            with self._request('UpdateItem', table_name):
+                response = table.update_item(
+                    Key={
+                        'id': item_id
+                    },
+                    UpdateExpression=update_expression,
+                    ConditionExpression=expression,
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues=values,
+                    ReturnValues=return_values,
+                )
+        except botocore.exceptions.ClientError as ex:
+            if ex.response.get('Error', {}).get('Code', None) == 'ConditionalCheckFailedException':
+                return False
+            raise
+        version = response.get('Attributes', {}).get(VERSION_FIELD, 0)
+        if return_values.endswith('_OLD'):
+            version += 1
+        item_cache.invalidate((table_name, item_id), version)
         return response
 
     def _put_item_count(self, table_name, count_id, value):
         response = self.put_item(table_name, 'meta_info', {'count': value}, item_id=count_id)
         return response
 
-    def _add_item_count(self, table_name, count_id, value_to_add=1):
-        response = self.client.update_item(
-            ExpressionAttributeNames={
+    def _get_count_update(self, table_name, count_id, value_to_add):
+        return {
+            'TableName': table_name,
+            'Key': {
+                'id': {
+                    'S': count_id,
+                }
+            },
+            'UpdateExpression': 'ADD #A :v',
+            'ExpressionAttributeNames': {
                 '#A': 'count',
             },
-            ExpressionAttributeValues={
+            'ExpressionAttributeValues': {
                 ':v': {
                     'N': str(value_to_add),
                 }
             },
-            Key={
-                'id': {
-                    'S': count_id,
-                }
-            },
-            ReturnValues='ALL_NEW',
-            TableName=table_name,
-            UpdateExpression='ADD #A :v',
-        )
-        return response
+        }
 
-    def get_item_count(self, table_name, count_id):
-        response = self.get_item(table_name, count_id)
+    def _add_item_count(self, table_name, count_id, value_to_add=1):
+        with self._request('UpdateItem', table_name):
+            response = self.client.update_item(
+                ReturnValues='ALL_NEW',
+                **self._get_count_update(table_name, count_id, value_to_add)
+            )
         return response
 
+    def get_count_shards(self, partition):
+        return max(1, min(int(self.count_shards.get(partition, 1)), self.MAX_COUNT_SHARDS))
+
+    def get_count_ids(self, partition):
+        """
+        Shard 0 keeps the original '{partition}-count' key, so counts written before
+        sharding was enabled are still included.
+        """
+        count_id = '{}-count'.format(partition)
+        return [count_id] + ['{}-{}'.format(count_id, shard) for shard in range(1, self.get_count_shards(partition))]
+
+    def get_count_id(self, partition):
+        """
+        :return: A random count shard of partition to write to
+        """
+        return random.choice(self.get_count_ids(partition))
+
+    def get_item_count(self, table_name, partition):
+        """
+        Sum the count shards of partition. Shards BatchGetItem left unprocessed
+        are read one by one, a shard that cannot be read raises instead of being
+        left out of the sum.
+
+        :return: {'Item': {'id': '{partition}-count', 'count': total}}
+        """
+        count_ids = self.get_count_ids(partition)
+        if len(count_ids) == 1:
+            response = self.get_item(table_name, count_ids[0])
+            count = response.get('Item', {}).get('count', 0)
+        else:
+            result = self.batch_get_items(table_name, count_ids)
+            shards = list(result['items'].values())
+            for count_id in result['unprocessed_ids']:
+                shards.append(self.get_item(table_name, count_id).get('Item', {}))
+            count = sum(shard.get('count', 0) for shard in shards)
+        return {
+            'Item': {
+                'id': '{}-count'.format(partition),
+                'count': count,
+            }
+        }
+
+
+class ApplicationAutoScaling:
+    SERVICE_NAMESPACE = 'dynamodb'
+    DEFAULT_TARGET_UTILIZATION = 70.0
+
+    def __init__(self, boto3_session):
+        self.client = client_pool.client(boto3_session, 'application-autoscaling')
+
+    @classmethod
+    def get_dynamodb_targets(cls, table_name, index_names):
+        """
+        :return: List of (resource_id, scalable_dimension, 'read' or 'write') of the table and its indexes
+        """
+        resources = [('table/{}'.format(table_name), 'table')]
+        resources += [('table/{}/index/{}'.format(table_name, index_name), 'index') for index_name in index_names]
+        targets = []
+        for resource_id, kind in resources:
+            for unit in ('read', 'write'):
+                dimension = 'dynamodb:{}:{}CapacityUnits'.format(kind, unit.title())
+                targets.append((resource_id, dimension, unit))
+        return targets
+
+    @classmethod
+    def get_policy_name(cls, resource_id, unit):
+        return '{}-{}-utilization'.format(resource_id.replace('/', '-'), unit)
+
+    def apply_dynamodb_capacity(self, table_name, index_names, capacity):
+        """
+        Register target tracking autoscaling of the table and its indexes when capacity
+        has autoscaling, deregister it otherwise. Targets and policies that already
+        match are left untouched.
+
+        :return: List of changes
+        """
+        targets = self.get_dynamodb_targets(table_name, index_names)
+        resource_ids = list(dict.fromkeys(resource_id for resource_id, _, _ in targets))
+        response = self.client.describe_scalable_targets(ServiceNamespace=self.SERVICE_NAMESPACE,
+                                                         ResourceIds=resource_ids)
+        existing = dict(((target['ResourceId'], target['ScalableDimension']), target)
+                        for target in response.get('ScalableTargets', []))
+        autoscaling = capacity.get('autoscaling', None) if capacity['mode'] == PROVISIONED else None
+        policies = {}
+        if autoscaling:
+            response = self.client.describe_scaling_policies(
+                ServiceNamespace=self.SERVICE_NAMESPACE,
+                PolicyNames=[self.get_policy_name(resource_id, unit) for resource_id, _, unit in targets],
+            )
+            policies = dict((policy['PolicyName'], policy) for policy in response.get('ScalingPolicies', []))
+
+        changes = []
+        for resource_id, dimension, unit in targets:
+            target = existing.get((resource_id, dimension), None)
+            if not autoscaling:
+                if target:
+                    # Its scaling policies are deleted with it
+                    self.client.deregister_scalable_target(ServiceNamespace=self.SERVICE_NAMESPACE,
+                                                           ResourceId=resource_id, ScalableDimension=dimension)
+                    changes.append('{} {} autoscaling removed'.format(resource_id, unit))
+                continue
+            min_capacity = int(capacity['{}_capacity'.format(unit)])
+            max_capacity = int(autoscaling['max_{}_capacity'.format(unit)])
+            if not target or target['MinCapacity'] != min_capacity or target['MaxCapacity'] != max_capacity:
+                self.client.register_scalable_target(ServiceNamespace=self.SERVICE_NAMESPACE,
+                                                     ResourceId=resource_id, ScalableDimension=dimension,
+                                                     MinCapacity=min_capacity, MaxCapacity=max_capacity)
+                changes.append('{} {} autoscaling {}-{}'.format(resource_id, unit, min_capacity, max_capacity))
+            policy_name = self.get_policy_name(resource_id, unit)
+            target_value = float(autoscaling.get('target_utilization', self.DEFAULT_TARGET_UTILIZATION))
+            policy = policies.get(policy_name, {}).get('TargetTrackingScalingPolicyConfiguration', {})
+            if policy.get('TargetValue', None) != target_value:
+                self.client.put_scaling_policy(
+                    PolicyName=policy_name,
+                    ServiceNamespace=self.SERVICE_NAMESPACE,
+                    ResourceId=resource_id,
+                    ScalableDimension=dimension,
+                    PolicyType='TargetTrackingScaling',
+                    TargetTrackingScalingPolicyConfiguration={
+                        'TargetValue': target_value,
+                        'PredefinedMetricSpecification': {
+                            'PredefinedMetricType': 'DynamoDB{}CapacityUtilization'.format(unit.title()),
+                        },
+                    },
+                )
+                changes.append('{} {} target utilization {}'.format(resource_id, unit, target_value))
+        return changes
+
 
 class Lambda:
     def __init__(self, boto3_session):
-        self.client = boto3_session.client('lambda')
+        self.client = client_pool.client(boto3_session, 'lambda')
 
     def create_function(self, name, description, runtime, role_arn, handler, zip_file):
         response = self.client.create_function(
@@ -525,8 +1667,8 @@ class Lambda:
 
 class S3:
     def __init__(self, boto3_session):
-        self.client = boto3_session.client('s3')
-        self.resource = boto3_session.resource('s3')
+        self.client = client_pool.client(boto3_session, 's3')
+        self.resource = client_pool.resource(boto3_session, 's3')
 
     @classmethod
     def to_dns_name(cls, bucket_name):
@@ -548,29 +1690,33 @@ class S3:
 
     def create_bucket(self, bucket_name):
         bucket_name = self.to_dns_name(bucket_name)
-        response = self.client.create_bucket(
-            ACL='private',
-            Bucket=bucket_name,
-            CreateBucketConfiguration={
-                'LocationConstraint': 'ap-northeast-2'
-            },
-        )
+        with metrics.aws_call('s3', 'CreateBucket', bucket_name):
+            response = self.client.create_bucket(
+                ACL='private',
+                Bucket=bucket_name,
+                CreateBucketConfiguration={
+                    'LocationConstraint': 'ap-northeast-2'
+                },
+            )
         return response
 
     def upload_file_bin(self, bucket_name, file_name, file_bin):
         bucket_name = self.to_dns_name(bucket_name)
-        response = self.client.upload_fileobj(file_bin, bucket_name, file_name)
+        with metrics.aws_call('s3', 'PutObject', bucket_name):
+            response = self.client.upload_fileobj(file_bin, bucket_name, file_name)
         return response
 
     def delete_file_bin(self, bucket_name, file_name):
         bucket_name = self.to_dns_name(bucket_name)
-        return self.resource.Object(bucket_name, file_name).delete()
+        with metrics.aws_call('s3', 'DeleteObject', bucket_name):
+            return self.resource.Object(bucket_name, file_name).delete()
 
     def download_file_bin(self, bucket_name, file_name):
         bucket_name = self.to_dns_name(bucket_name)
         try:
             with tempfile.NamedTemporaryFile() as data:
-                self.client.download_fileobj(bucket_name, file_name, data)
+                with metrics.aws_call('s3', 'GetObject', bucket_name):
+                    self.client.download_fileobj(bucket_name, file_name, data)
                 data.seek(0)
                 return data.read()
         except botocore.exceptions.ClientError as e:
@@ -582,8 +1728,8 @@ class S3:
 
 class IAM:
     def __init__(self, boto3_session):
-        self.client = boto3_session.client('iam')
-        self.resource = boto3_session.resource('iam')
+        self.client = client_pool.client(boto3_session, 'iam')
+        self.resource = client_pool.resource(boto3_session, 'iam')
 
     def create_role_and_attach_policies(self, role_name):
         policy_arns = [
@@ -649,7 +1795,7 @@ class IAM:
 
 class CostExplorer:
     def __init__(self, boto3_session):
-        self.client = boto3_session.client('ce', 'us-east-1')
+        self.client = client_pool.client(boto3_session, 'ce', 'us-east-1')
 
     def get_cost_and_usage(self, start, end):
         response = self.client.get_cost_and_usage(
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after ttl seconds.
+    It only lives inside a warm container, so other containers may keep serving
+    an entry until it expires.
+    """
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._items.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.time():
+                self._items.pop(key)
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        with self._lock:
+            self._items[key] = (value, time.time() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def peek(self, key, default=None):
+        """
+        Like get, without counting a hit or a miss or refreshing the entry.
+        """
+        with self._lock:
+            entry = self._items.get(key, None)
+            if entry is None or entry[1] < time.time():
+                return default
+            return entry[0]
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._items.pop(key, None)
+        return entry[0] if entry else None
+
+    def pop_if(self, predicate):
+        """
+        Remove every entry whose value satisfies predicate.
+
+        :return: Number of removed entries
+        """
+        with self._lock:
+            keys = [key for key, (value, _) in self._items.items() if predicate(value)]
+            for key in keys:
+                self._items.pop(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'size': len(self._items),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class VersionedCache:
+    """
+    LRUCache of items validated by a version every write increments. A write in
+    this container leaves a tombstone of the version it produced, so an older copy
+    read concurrently is never cached over it. Writes of other containers are seen
+    once the entry expires, the ttl bounds how stale a cached item can be.
+    """
+    def __init__(self, max_size=1024, ttl=10):
+        self.hits = 0
+        self.misses = 0
+        self._cache = LRUCache(max_size, ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._cache.get(key)
+        item = entry[0] if entry else None
+        with self._lock:
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return item
+
+    def put(self, key, item, version, ttl=None):
+        """
+        :return: False if a newer version was written or cached meanwhile
+        """
+        with self._lock:
+            entry = self._cache.peek(key)
+            if entry and entry[1] > version:
+                return False
+            self._cache.put(key, (item, version), ttl)
+            return True
+
+    def invalidate(self, key, version=None, ttl=None):
+        """
+        :param version: Version the write produced, None to just drop the entry
+        """
+        with self._lock:
+            if version is None:
+                self._cache.pop(key)
+            else:
+                self._cache.put(key, (None, version), ttl)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        stats = self._cache.get_stats()
+        with self._lock:
+            stats['hits'] = self.hits
+            stats['misses'] = self.misses
+        return stats
@@ -1,5 +1,8 @@
 from cloud.aws import *
 from cloud.response import Response
+from cloud.database.util import get_count_shards, get_search_fields, check_item_types, \
+    SYSTEM_FIELDS
+from cloud.search import update_postings
 
 
 # Define the input output format of the function.
@@ -32,19 +35,31 @@ def do(data, boto3):
     read_groups = params.get('read_groups', [])
     write_groups = params.get('write_groups', [])
 
+    message = check_item_types(recipe, item)
+    if message:
+        body['success'] = False
+        body['message'] = message
+        return Response(body, status_code=400)
+
     read_groups.append('admin')
     write_groups.append('admin')
     read_groups = list(set(read_groups))
     write_groups = list(set(write_groups))
 
+    for field in SYSTEM_FIELDS:
+        item.pop(field, None)
     item['read_groups'] = read_groups
     item['write_groups'] = write_groups
     item['owner'] = user_id
 
     table_name = 'database-{}'.format(app_id)
 
-    dynamo = DynamoDB(boto3)
+    dynamo = DynamoDB(boto3, count_shards=get_count_shards(recipe),
+                      transactional=recipe.get('transactional_writes', False))
     dynamo.put_item(table_name, partition, item)
+    search_fields = get_search_fields(recipe, partition)
+    if search_fields:
+        update_postings(dynamo, table_name, partition, [(None, item)], search_fields)
 
     body['success'] = True
     body['item_id'] = item.get('id', None)
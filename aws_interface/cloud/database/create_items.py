@@ -0,0 +1,79 @@
+from cloud.aws import *
+from cloud.response import Response
+from cloud.database.util import get_count_shards, get_search_fields, check_item_types, \
+    SYSTEM_FIELDS
+from cloud.search import update_postings
+
+MAX_ITEMS = 1000
+
+# Define the input output format of the function.
+# This information is used when creating the *SDK*.
+info = {
+    'input_format': {
+        'session_id': 'str',
+        'items': 'list',
+        'partition': 'str',
+        'read_groups': 'list',
+        'write_groups': 'list',
+    },
+    'output_format': {
+        'success': 'bool',
+        'item_ids': 'list',
+        'unprocessed_count': 'int',
+    }
+}
+
+
+def do(data, boto3):
+    body = {}
+    recipe = data['recipe']
+    params = data['params']
+    app_id = data['app_id']
+    user = data['user']
+
+    user_id = user.get('id', None)
+
+    partition = params.get('partition', None)
+    items = params.get('items', [])
+    read_groups = params.get('read_groups', [])
+    write_groups = params.get('write_groups', [])
+
+    if len(items) > MAX_ITEMS:
+        body['success'] = False
+        body['message'] = 'items can contain up to {} items'.format(MAX_ITEMS)
+        return Response(body)
+
+    # Nothing is written if one of the items cannot be
+    for item in items:
+        message = check_item_types(recipe, item)
+        if message:
+            body['success'] = False
+            body['message'] = message
+            return Response(body, status_code=400)
+
+    read_groups = list(set(read_groups + ['admin']))
+    write_groups = list(set(write_groups + ['admin']))
+
+    partition_items = []
+    for item in items:
+        for field in SYSTEM_FIELDS:
+            item.pop(field, None)
+        item['read_groups'] = read_groups
+        item['write_groups'] = write_groups
+        item['owner'] = user_id
+        partition_items.append((partition, item))
+
+    table_name = 'database-{}'.format(app_id)
+
+    dynamo = DynamoDB(boto3, count_shards=get_count_shards(recipe))
+    result = dynamo.batch_put_items(table_name, partition_items)
+    search_fields = get_search_fields(recipe, partition)
+    if search_fields:
+        item_ids = set(result['item_ids'])
+        update_postings(dynamo, table_name, partition,
+                        [(None, item) for _, item in partition_items if item['id'] in item_ids], search_fields)
+
+    body['success'] = not result['unprocessed_items']
+    body['item_ids'] = result['item_ids']
+    body['unprocessed_count'] = len(result['unprocessed_items'])
+    return Response(body)
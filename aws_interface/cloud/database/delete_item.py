@@ -1,6 +1,8 @@
 from cloud.aws import *
 from cloud.response import Response
-from cloud.database.util import has_write_permission
+from cloud.database.util import get_write_permission_condition, get_count_shards, get_search_fields, \
+    has_search_fields
+from cloud.search import update_postings
 
 # Define the input output format of the function.
 # This information is used when creating the *SDK*.
@@ -8,6 +10,7 @@ info = {
     'input_format': {
         'session_id': 'str',
         'item_id': 'str',
+        'partition': 'str?',
     },
     'output_format': {
         'success': 'bool',
@@ -24,12 +27,25 @@ def do(data, boto3):
     user = data['user']
 
     item_id = params.get('item_id', None)
+    # Optional, lets the delete and the count update go out as one transaction
+    partition = params.get('partition', None)
     table_name = 'database-{}'.format(app_id)
-    dynamo = DynamoDB(boto3)
+    dynamo = DynamoDB(boto3, count_shards=get_count_shards(recipe))
 
-    item = dynamo.get_item(table_name, item_id).get('Item')
-    if has_write_permission(user, item):
-        _ = dynamo.delete_item(table_name, item_id)
+    # The postings of the item are found from its deleted attributes, which the
+    # transactional delete of a known partition does not return
+    searchable = get_search_fields(recipe, partition) if partition else has_search_fields(recipe)
+    if searchable:
+        partition = None
+
+    condition = get_write_permission_condition(user)
+    response = dynamo.delete_item(table_name, item_id, partition=partition, condition=condition)
+    if response:
+        if searchable:
+            old_item = response['Attributes']
+            search_fields = get_search_fields(recipe, old_item.get('partition', None))
+            if search_fields:
+                update_postings(dynamo, table_name, old_item['partition'], [(old_item, None)], search_fields)
         body['success'] = True
     else:
         body['success'] = False
@@ -1,6 +1,8 @@
 from cloud.aws import *
 from cloud.response import Response
-from cloud.database.util import has_read_permission
+from cloud.database.util import has_read_permission, get_cache_ttls, READ_PERMISSION_FIELDS
+import cloud.metrics as metrics
+import copy
 
 # Define the input output format of the function.
 # This information is used when creating the *SDK*.
@@ -8,6 +10,8 @@ info = {
     'input_format': {
         'session_id': 'str',
         'item_id': 'str',
+        'fields': 'list?',
+        'consistent_read': 'bool=False',
     },
     'output_format': {
         'success': 'bool',
@@ -25,17 +29,36 @@ def do(data, boto3):
 
     user_group = user.get('group', None)
     item_id = params.get('item_id', None)
+    fields = params.get('fields', None)
+    consistent_read = params.get('consistent_read', False)
 
     table_name = 'database-{}'.format(app_id)
+    cache_key = (table_name, item_id)
+    cache_ttls = get_cache_ttls(recipe)
 
-    dynamo = DynamoDB(boto3)
+    item = None
+    # Consistent reads always go to DynamoDB, their result refreshes the cache
+    if cache_ttls and not consistent_read:
+        item = item_cache.get(cache_key)
+        metrics.count('item_cache_hits' if item is not None else 'item_cache_misses')
 
-    item = dynamo.get_item(table_name, item_id)
-    item = item.get('Item', {})
+    if item is None:
+        dynamo = DynamoDB(boto3)
+        # Only whole items are cached, a projection costs the same read capacity
+        if fields and not cache_ttls:
+            item = dynamo.get_item(table_name, item_id, list(fields) + READ_PERMISSION_FIELDS, consistent_read)
+        else:
+            item = dynamo.get_item(table_name, item_id, consistent_read=consistent_read)
+        item = item.get('Item', {})
+        cache_ttl = cache_ttls.get(item.get('partition', None), None)
+        if cache_ttl:
+            item_cache.put(cache_key, item, item.get(VERSION_FIELD, 0), cache_ttl)
+    # The cached copy is shared with the following requests
+    item = copy.deepcopy(item)
 
     if has_read_permission(user, item):
         # Remove system key
-        body['item'] = item
+        body['item'] = project_item(item, fields)
         body['success'] = True
     else:
         body['success'] = False
@@ -1,5 +1,6 @@
 from cloud.aws import *
 from cloud.response import Response
+from cloud.database.util import get_count_shards
 
 
 # Define the input output format of the function.
@@ -25,8 +26,8 @@ def do(data, boto3):
     table_name = 'database-{}'.format(app_id)
     partition = params['partition']
 
-    dynamo = DynamoDB(boto3)
-    count = dynamo.get_item_count(table_name, '{}-count'.format(partition))
-    item = count.get('Item', {'count': 0})
+    dynamo = DynamoDB(boto3, count_shards=get_count_shards(recipe))
+    count = dynamo.get_item_count(table_name, partition)
+    item = count.get('Item')
     body['item'] = item
     return Response(body)
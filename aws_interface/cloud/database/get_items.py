@@ -1,7 +1,11 @@
 from cloud.aws import *
 from cloud.response import Response
-from cloud.database.util import has_read_permission
+from cloud.database.util import get_read_permission_condition
 import json
+from decimal import Decimal
+
+# Read capacity one get_items call may spend looking for readable items
+MAX_READ_UNITS = 50
 
 # Define the input output format of the function.
 # This information is used when creating the *SDK*.
@@ -12,6 +16,9 @@ info = {
         'start_key': 'dict',
         'limit': 'int=100',
         'reverse': 'bool=False',
+        'fields': 'list?',
+        'since': 'float?',
+        'until': 'float?',
     },
     'output_format': {
         'items': 'list',
@@ -31,22 +38,36 @@ def do(data, boto3):
     start_key = params.get('start_key', None)
     limit = params.get('limit', 100)
     reverse = params.get('reverse', False)
+    fields = params.get('fields', None)
+    # Seconds, bounds of creationDate both included
+    since = params.get('since', None)
+    until = params.get('until', None)
 
     if type(start_key) is str:
         start_key = json.loads(start_key)
+    # The end_key of a page holds creationDate as a float once serialized to json
+    start_key = to_decimal(start_key)
+
+    for name, value in (('since', since), ('until', until)):
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float, Decimal))):
+            body['message'] = '{} must be a number of seconds'.format(name)
+            body['items'] = []
+            body['end_key'] = None
+            return Response(body)
+    if since is not None and until is not None and since > until:
+        body['items'] = []
+        body['end_key'] = None
+        return Response(body)
 
     table_name = 'database-{}'.format(app_id)
 
     dynamo = DynamoDB(boto3)
-    result = dynamo.get_items(table_name, partition, start_key, limit, reverse)
-    end_key = result.get('LastEvaluatedKey', None)
-    items = result.get('Items', [])
-
-    filtered = []
-    for item in items:
-        if has_read_permission(user, item):
-            filtered.append(item)
+    # Unreadable items are dropped by DynamoDB, pages are filled up to limit readable items
+    condition = get_read_permission_condition(user)
+    key_condition = get_creation_date_condition(partition, since, until)
+    items, end_key = dynamo.get_items_page(table_name, partition, int(limit), reverse, start_key, fields,
+                                           condition, MAX_READ_UNITS, key_condition=key_condition)
 
-    body['items'] = filtered
+    body['items'] = [project_item(item, fields) for item in items]
     body['end_key'] = end_key
     return Response(body)
@@ -0,0 +1,60 @@
+from cloud.aws import *
+from cloud.response import Response
+from cloud.database.util import has_read_permission, READ_PERMISSION_FIELDS
+
+MAX_ITEM_IDS = 1000
+
+# Define the input output format of the function.
+# This information is used when creating the *SDK*.
+info = {
+    'input_format': {
+        'session_id': 'str',
+        'item_ids': 'list',
+        'fields': 'list?',
+    },
+    'output_format': {
+        'success': 'bool',
+        'items': 'list',
+    }
+}
+
+
+def do(data, boto3):
+    body = {}
+    recipe = data['recipe']
+    params = data['params']
+    app_id = data['app_id']
+    user = data['user']
+
+    item_ids = params.get('item_ids', [])
+    fields = params.get('fields', None)
+
+    if len(item_ids) > MAX_ITEM_IDS:
+        body['success'] = False
+        body['message'] = 'item_ids can contain up to {} ids'.format(MAX_ITEM_IDS)
+        return Response(body)
+
+    table_name = 'database-{}'.format(app_id)
+
+    dynamo = DynamoDB(boto3)
+    if fields:
+        result = dynamo.batch_get_items(table_name, item_ids, list(fields) + READ_PERMISSION_FIELDS)
+    else:
+        result = dynamo.batch_get_items(table_name, item_ids)
+    found = result['items']
+
+    # Keep the order of item_ids, None for missing or unreadable items
+    items = []
+    for item_id in item_ids:
+        item = found.get(item_id, None)
+        if item is not None and has_read_permission(user, item):
+            items.append(project_item(item, fields))
+        else:
+            items.append(None)
+
+    body['success'] = True
+    body['items'] = items
+    if result['unprocessed_ids']:
+        body['success'] = False
+        body['unprocessed_ids'] = result['unprocessed_ids']
+    return Response(body)
@@ -1,6 +1,7 @@
 from cloud.aws import *
 from cloud.response import Response
-from cloud.database.util import has_write_permission
+from cloud.database.util import get_write_permission_condition, has_search_fields, update_item_postings, \
+    check_item_types, SYSTEM_FIELDS
 
 # Define the input output format of the function.
 # This information is used when creating the *SDK*.
@@ -30,16 +31,34 @@ def do(data, boto3):
 
     table_name = 'database-{}'.format(app_id)
 
+    if field_name.split('.')[0] in SYSTEM_FIELDS:
+        body['success'] = False
+        body['message'] = 'field_name: {} cannot be changed'.format(field_name)
+        return Response(body)
+
+    # A nested path turns the top-level field into a map
+    top_field = field_name.split('.')[0]
+    message = check_item_types(recipe, {top_field: field_value if top_field == field_name else {}})
+    if message:
+        body['success'] = False
+        body['message'] = message
+        return Response(body, status_code=400)
+
     dynamo = DynamoDB(boto3)
 
-    result = dynamo.get_item(table_name, item_id)
-    item = result.get('Item', {})
+    # field_value None removes the field, field_name can be a nested path e.g. 'profile.address.city'
+    condition = get_write_permission_condition(user)
+    return_values = 'ALL_OLD' if has_search_fields(recipe) else None
+    try:
+        result = dynamo.update_item_fields(table_name, item_id, {field_name: field_value}, condition, return_values)
+    except botocore.exceptions.ClientError as ex:
+        body['success'] = False
+        body['message'] = ex.response.get('Error', {}).get('Message', str(ex))
+        return Response(body)
 
-    if has_write_permission(user, item):
-        item[field_name] = field_value
-        if field_value is None:
-            item.pop(field_name)
-        dynamo.update_item(table_name, item_id, item)
+    if result:
+        if return_values:
+            update_item_postings(dynamo, table_name, recipe, result['Attributes'], {field_name: field_value})
         body['success'] = True
     else:
         body['success'] = False
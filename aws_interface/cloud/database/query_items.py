@@ -0,0 +1,96 @@
+from cloud.aws import *
+from cloud.response import Response
+from cloud.database.util import get_read_permission_condition, validate_query_condition, choose_index, \
+    check_index_type, get_key_condition, get_filter_condition, combine_conditions
+import json
+
+# Read capacity one query_items call may spend looking for matching readable items
+MAX_READ_UNITS = 50
+MAX_CONDITIONS = 10
+
+# Define the input output format of the function.
+# This information is used when creating the *SDK*.
+info = {
+    'input_format': {
+        'session_id': 'str',
+        'partition': 'str',
+        'conditions': 'list',
+        'start_key': 'dict',
+        'limit': 'int=100',
+        'reverse': 'bool=False',
+        'fields': 'list?',
+    },
+    'output_format': {
+        'success': 'bool',
+        'items': 'list',
+        'end_key': 'str',
+    }
+}
+
+
+def do(data, boto3):
+    body = {}
+    recipe = data['recipe']
+    params = data['params']
+    app_id = data['app_id']
+    user = data['user']
+
+    partition = params.get('partition', None)
+    conditions = params.get('conditions', [])
+    start_key = params.get('start_key', None)
+    limit = params.get('limit', 100)
+    reverse = params.get('reverse', False)
+    fields = params.get('fields', None)
+
+    if type(start_key) is str:
+        start_key = json.loads(start_key)
+    # The end_key of a page holds creationDate as a float once serialized to json
+    start_key = to_decimal(start_key)
+
+    if not conditions or len(conditions) > MAX_CONDITIONS:
+        body['success'] = False
+        body['message'] = 'conditions must contain 1 to {} conditions'.format(MAX_CONDITIONS)
+        return Response(body)
+    for condition in conditions:
+        message = validate_query_condition(condition)
+        if message:
+            body['success'] = False
+            body['message'] = message
+            return Response(body)
+
+    # The most selective condition on an indexed field becomes the key condition,
+    # the others filter the items read from the index
+    indexes = dict(recipe.get('indexes', {}), creationDate='N')
+    index_condition, filters = choose_index(conditions, indexes)
+    if index_condition is None:
+        body['success'] = False
+        body['message'] = 'conditions need a field indexed with put_index: {}'.format(sorted(indexes))
+        return Response(body)
+    message = check_index_type(index_condition, indexes[index_condition['field']])
+    if message:
+        body['success'] = False
+        body['message'] = message
+        return Response(body)
+
+    table_name = 'database-{}'.format(app_id)
+    index_name = get_index_name(index_condition['field'])
+    key_condition = get_key_condition(partition, index_condition)
+    condition = combine_conditions(get_read_permission_condition(user), get_filter_condition(filters))
+
+    dynamo = DynamoDB(boto3)
+    try:
+        items, end_key = dynamo.get_items_page(table_name, partition, int(limit), reverse, start_key, fields,
+                                               condition, MAX_READ_UNITS, index_name, key_condition)
+    except botocore.exceptions.ClientError as ex:
+        if get_error_code(ex) != 'ValidationException':
+            raise
+        # Raised while the index is created and until it is ACTIVE
+        body['success'] = False
+        body['message'] = 'index of {} is not ready: {}'.format(
+            index_condition['field'], ex.response.get('Error', {}).get('Message', str(ex)))
+        return Response(body)
+
+    body['success'] = True
+    body['items'] = [project_item(item, fields) for item in items]
+    body['end_key'] = end_key
+    return Response(body)
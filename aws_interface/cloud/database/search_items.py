@@ -0,0 +1,79 @@
+from cloud.aws import *
+from cloud.response import Response
+from cloud.database.util import has_read_permission, get_search_fields, READ_PERMISSION_FIELDS
+from cloud.search import get_query_terms, find_items, matches
+
+# Define the input output format of the function.
+# This information is used when creating the *SDK*.
+info = {
+    'input_format': {
+        'session_id': 'str',
+        'partition': 'str',
+        'query': 'str',
+        'start': 'int=0',
+        'limit': 'int=20',
+        'fields': 'list?',
+    },
+    'output_format': {
+        'success': 'bool',
+        'items': 'list',
+        'scores': 'list',
+        'next_start': 'int',
+        'truncated': 'bool',
+    }
+}
+
+
+def do(data, boto3):
+    body = {}
+    recipe = data['recipe']
+    params = data['params']
+    app_id = data['app_id']
+    user = data['user']
+
+    partition = params.get('partition', None)
+    query = params.get('query', '')
+    start = int(params.get('start', 0))
+    limit = int(params.get('limit', 20))
+    fields = params.get('fields', None)
+
+    search_fields = get_search_fields(recipe, partition)
+    if not search_fields:
+        body['success'] = False
+        body['message'] = 'partition: {} has no search fields'.format(partition)
+        return Response(body)
+
+    table_name = 'database-{}'.format(app_id)
+    terms = get_query_terms(query)
+
+    dynamo = DynamoDB(boto3)
+    ranked, truncated = find_items(dynamo, table_name, partition, terms)
+
+    # Ranking is recomputed for every page, start is a position in it
+    read_fields = None
+    if fields:
+        read_fields = list(fields) + list(search_fields) + list(READ_PERMISSION_FIELDS)
+    items = []
+    scores = []
+    position = start
+    while len(items) < limit and position < len(ranked):
+        item_ids = [item_id for item_id, _ in ranked[position:position + limit - len(items)]]
+        position += len(item_ids)
+        found = dynamo.batch_get_items(table_name, item_ids, read_fields)['items']
+        for item_id in item_ids:
+            item = found.get(item_id, None)
+            if item is None or not has_read_permission(user, item):
+                continue
+            # Postings of an item changed or deleted concurrently may be stale
+            score = matches(item, search_fields, terms)
+            if score is None:
+                continue
+            items.append(project_item(item, fields))
+            scores.append(score)
+
+    body['success'] = True
+    body['items'] = items
+    body['scores'] = scores
+    body['next_start'] = position if position < len(ranked) else None
+    body['truncated'] = truncated
+    return Response(body)
@@ -1,6 +1,11 @@
 from cloud.aws import *
 from cloud.response import Response
-from cloud.database.util import has_write_permission
+from cloud.database.util import get_write_permission_condition, has_write_permission, get_search_fields, \
+    combine_conditions, check_item_types, SYSTEM_FIELDS
+from cloud.search import update_postings
+
+# Reads and conditional writes before giving up when the item keeps changing
+MAX_ATTEMPTS = 3
 
 # Define the input output format of the function.
 # This information is used when creating the *SDK*.
@@ -35,15 +40,55 @@ def do(data, boto3):
 
     table_name = 'database-{}'.format(app_id)
 
-    dynamo = DynamoDB(boto3)
+    for field in SYSTEM_FIELDS:
+        new_item.pop(field, None)
+
+    message = check_item_types(recipe, new_item)
+    if message:
+        body['success'] = False
+        body['message'] = message
+        return Response(body, status_code=400)
 
-    result = dynamo.get_item(table_name, item_id)
-    item = result.get('Item', {})
+    dynamo = DynamoDB(boto3)
 
-    if has_write_permission(user, item):
-        dynamo.update_item(table_name, item_id, new_item)
-        body['success'] = True
+    # The item is replaced with one PutItem keeping its system fields. The version
+    # condition makes sure it did not change since it was read.
+    for _ in range(MAX_ATTEMPTS):
+        old_item = dynamo.get_item(table_name, item_id, consistent_read=True).get('Item', None)
+        if not old_item or not has_write_permission(user, old_item):
+            break
+        item = dict(new_item)
+        for field in SYSTEM_FIELDS:
+            if field in old_item:
+                item[field] = old_item[field]
+        condition = combine_conditions(get_write_permission_condition(user), get_version_condition(old_item))
+        try:
+            result = dynamo.replace_item(table_name, item, condition)
+        except botocore.exceptions.ClientError as ex:
+            body['success'] = False
+            body['message'] = ex.response.get('Error', {}).get('Message', str(ex))
+            return Response(body)
+        if result:
+            search_fields = get_search_fields(recipe, old_item.get('partition', None))
+            if search_fields:
+                update_postings(dynamo, table_name, old_item['partition'], [(old_item, item)], search_fields)
+            body['success'] = True
+            return Response(body)
     else:
         body['success'] = False
-        body['message'] = 'permission denied'
+        body['message'] = 'item was changed concurrently, try again'
+        return Response(body)
+
+    body['success'] = False
+    body['message'] = 'permission denied'
     return Response(body)
+
+
+def get_version_condition(item):
+    """
+    :return: (expression, names, values) true while the stored item is still item
+    """
+    version = item.get(VERSION_FIELD, None)
+    if version is None:
+        return 'attribute_not_exists(#version)', {'#version': VERSION_FIELD}, {}
+    return '#version = :version', {'#version': VERSION_FIELD}, {':version': version}
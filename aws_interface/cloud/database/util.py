@@ -1,3 +1,24 @@
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+
+from cloud.aws import to_decimal, VERSION_FIELD
+from cloud.search import update_postings
+
+QUERY_OPERATORS = ('eq', 'lt', 'lte', 'gt', 'gte', 'between', 'begins_with')
+_COMPARISONS = {
+    'eq': '=',
+    'lt': '<',
+    'lte': '<=',
+    'gt': '>',
+    'gte': '>=',
+}
+# Managed by the database apis, changing them would break indexes, counts or permissions
+SYSTEM_FIELDS = ('id', 'partition', 'creationDate', 'owner', VERSION_FIELD)
+# Fetched with any projection so has_read_permission can check the item
+READ_PERMISSION_FIELDS = ['read_groups', 'owner']
+
+
 def has_read_permission(user, item):
     group = user.get('group', None)
     user_id = user.get('id', None)
@@ -9,6 +30,55 @@ def has_read_permission(user, item):
     return False
 
 
+def get_count_shards(recipe):
+    """
+    :return: {partition: count_shards} for DynamoDB(boto3, count_shards=...)
+    """
+    partitions = recipe.get('partitions', {})
+    return dict((name, partition.get('count_shards', 1)) for name, partition in partitions.items())
+
+
+def get_search_fields(recipe, partition):
+    """
+    :return: List of the search fields of partition, see cloud.search
+    """
+    return list(recipe.get('partitions', {}).get(partition, {}).get('search_fields', []))
+
+
+def get_cache_ttls(recipe):
+    """
+    :return: {partition: seconds get_item may serve a cached copy}, for partitions with a cache ttl
+    """
+    partitions = recipe.get('partitions', {})
+    return dict((name, partition['cache_ttl']) for name, partition in partitions.items()
+                if partition.get('cache_ttl', None))
+
+
+def has_search_fields(recipe):
+    return any(partition.get('search_fields', None) for partition in recipe.get('partitions', {}).values())
+
+
+def update_item_postings(dynamo, table_name, recipe, old_item, fields):
+    """
+    Update the postings of an item changed by DynamoDB.update_item_fields.
+
+    :param old_item: Item before the update, from ReturnValues ALL_OLD
+    :param fields: {path: value} of the update
+    """
+    partition = old_item.get('partition', None)
+    search_fields = get_search_fields(recipe, partition)
+    if not search_fields:
+        return
+    new_item = dict(old_item)
+    # Search fields are top-level strings, nested paths never change them
+    for path, value in fields.items():
+        if value is None:
+            new_item.pop(path, None)
+        else:
+            new_item[path] = value
+    update_postings(dynamo, table_name, partition, [(old_item, new_item)], search_fields)
+
+
 def has_write_permission(user, item):
     group = user.get('group', None)
     user_id = user.get('id', None)
@@ -18,3 +88,178 @@ def has_write_permission(user, item):
     elif 'owner' in groups and user_id == item.get('owner'):
         return True
     return False
+
+
+def get_permission_condition(user, groups_field):
+    """
+    has_read_permission / has_write_permission as a condition expression, so
+    DynamoDB checks it in the request itself.
+
+    :param groups_field: 'read_groups' or 'write_groups'
+    :return: (expression, names, values)
+    """
+    user = user or {}
+    group = user.get('group', None)
+    user_id = user.get('id', None)
+    names = {
+        '#groups': groups_field,
+        '#owner': 'owner',
+    }
+    values = {
+        ':group': group or '',
+        ':owner_group': 'owner',
+        ':user_id': user_id or '',
+    }
+    expression = 'contains(#groups, :group) OR ' \
+                 '(contains(#groups, :owner_group) AND #owner = :user_id)'
+    if group == 'admin':
+        # Items without the groups field are accessible by admin only
+        expression = 'attribute_not_exists(#groups) OR {}'.format(expression)
+    return expression, names, values
+
+
+def get_read_permission_condition(user):
+    return get_permission_condition(user, 'read_groups')
+
+
+def get_write_permission_condition(user):
+    return get_permission_condition(user, 'write_groups')
+
+
+def combine_conditions(*conditions):
+    """
+    :param conditions: (expression, names, values) tuples, None ones are skipped
+    :return: (expression, names, values) matching all of them, None if there are none
+    """
+    conditions = [condition for condition in conditions if condition]
+    if not conditions:
+        return None
+    names = {}
+    values = {}
+    for _, condition_names, condition_values in conditions:
+        names.update(condition_names)
+        values.update(condition_values)
+    expression = ' AND '.join('({})'.format(expression) for expression, _, _ in conditions)
+    return expression, names, values
+
+
+def validate_query_condition(condition):
+    """
+    :param condition: {'field': name or dotted path, 'op': one of QUERY_OPERATORS, 'value': value},
+    value is [low, high] for between
+    :return: Error message, None if condition is valid
+    """
+    if not isinstance(condition, dict) or not isinstance(condition.get('field', None), str):
+        return 'condition must be a map with a field'
+    op = condition.get('op', None)
+    value = condition.get('value', None)
+    if op not in QUERY_OPERATORS:
+        return 'op of {} must be one of {}'.format(condition['field'], QUERY_OPERATORS)
+    if value is None:
+        return 'value of {} is missing'.format(condition['field'])
+    if op == 'between' and (not isinstance(value, list) or len(value) != 2):
+        return 'value of {} must be [low, high] for between'.format(condition['field'])
+    if op == 'begins_with' and not isinstance(value, str):
+        return 'value of {} must be a string for begins_with'.format(condition['field'])
+    return None
+
+
+def get_key_condition(partition, condition):
+    """
+    :return: boto3 key condition on the index 'partition-<field of condition>'
+    """
+    key = Key(condition['field'])
+    value = to_decimal(condition['value'])
+    if condition['op'] == 'between':
+        sort_condition = key.between(value[0], value[1])
+    else:
+        sort_condition = getattr(key, condition['op'])(value)
+    return Key('partition').eq(partition) & sort_condition
+
+
+def get_filter_condition(conditions):
+    """
+    :return: (expression, names, values) of conditions for a FilterExpression, None if empty
+    """
+    names = {}
+    values = {}
+    expressions = []
+    for index, condition in enumerate(conditions):
+        parts = []
+        for part in condition['field'].split('.'):
+            placeholder = '#q{}'.format(len(names))
+            names[placeholder] = part
+            parts.append(placeholder)
+        path = '.'.join(parts)
+        op = condition['op']
+        value = to_decimal(condition['value'])
+        if op == 'between':
+            values[':q{}a'.format(index)], values[':q{}b'.format(index)] = value
+            expressions.append('{} BETWEEN :q{}a AND :q{}b'.format(path, index, index))
+        elif op == 'begins_with':
+            values[':q{}'.format(index)] = value
+            expressions.append('begins_with({}, :q{})'.format(path, index))
+        else:
+            values[':q{}'.format(index)] = value
+            expressions.append('{} {} :q{}'.format(path, _COMPARISONS[op], index))
+    if not expressions:
+        return None
+    return ' AND '.join(expressions), names, values
+
+
+def choose_index(conditions, indexes):
+    """
+    Pick the condition to run as the key condition of an index: equality first, then
+    between, then other ranges and prefixes.
+
+    :param indexes: {field: field_type} declared in the recipe, creationDate is always indexed
+    :return: (index condition, other conditions), index condition is None if no field is indexed
+    """
+    indexes = dict(indexes, creationDate='N')
+    ranks = {'eq': 0, 'between': 1}
+    candidates = [condition for condition in conditions if condition['field'] in indexes]
+    if not candidates:
+        return None, conditions
+    chosen = min(candidates, key=lambda condition: ranks.get(condition['op'], 2))
+    return chosen, [condition for condition in conditions if condition is not chosen]
+
+
+def get_type_error(field, value, field_type):
+    """
+    :return: Error message if value does not have the type field is indexed with
+    """
+    if field_type == 'N' and (isinstance(value, bool) or not isinstance(value, (int, float, Decimal))):
+        return '{} is indexed as a number'.format(field)
+    if field_type == 'S' and not isinstance(value, str):
+        return '{} is indexed as a string'.format(field)
+    return None
+
+
+def check_index_type(condition, field_type):
+    """
+    :return: Error message if the value cannot match the type of the indexed field
+    """
+    values = condition['value'] if condition['op'] == 'between' else [condition['value']]
+    for value in values:
+        message = get_type_error(condition['field'], value, field_type)
+        if message:
+            return message
+    return None
+
+
+def check_item_types(recipe, item):
+    """
+    DynamoDB rejects a write whose indexed field has another type than its index,
+    check it before writing.
+
+    :param item: Top-level fields to write, None values are removed
+    :return: Error message if a field does not have the type it is indexed with
+    """
+    for field, field_type in recipe.get('indexes', {}).items():
+        value = item.get(field, None)
+        if value is None:
+            continue
+        message = get_type_error(field, value, field_type)
+        if message:
+            return message
+    return None
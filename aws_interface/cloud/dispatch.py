@@ -0,0 +1,61 @@
+import importlib
+import threading
+
+from cloud.recipe_store import get_store
+
+_dispatcher = None
+_lock = threading.Lock()
+
+
+class Route:
+    """
+    Dispatch entry of a cloud_api. The module is imported on first use unless preloaded.
+    """
+    __slots__ = ('name', 'module_name', 'permissions', 'info', '_do')
+
+    def __init__(self, cloud_api):
+        self.name = cloud_api.name
+        self.module_name = cloud_api.module_name
+        self.permissions = cloud_api.permissions
+        self.info = cloud_api.info
+        self._do = None
+
+    @property
+    def do(self):
+        if self._do is None:
+            self._do = importlib.import_module(self.module_name).do
+        return self._do
+
+    def is_permitted(self, user):
+        if 'all' in self.permissions:
+            return True
+        group = user.get('group', None) if user else None
+        return group in self.permissions
+
+
+class Dispatcher:
+    def __init__(self, store):
+        self.store = store
+        self.routes = dict([(name, Route(cloud_api)) for name, cloud_api in store.cloud_apis.items()])
+
+    def get_route(self, name):
+        return self.routes.get(name, None)
+
+    def preload(self):
+        """
+        Import every cloud_api module so the first request does not pay for the import.
+        """
+        for route in self.routes.values():
+            _ = route.do
+
+
+def get_dispatcher():
+    global _dispatcher
+    store = get_store()
+    dispatcher = _dispatcher
+    if dispatcher is not None and dispatcher.store is store:
+        return dispatcher
+    with _lock:
+        if _dispatcher is None or _dispatcher.store is not store:
+            _dispatcher = Dispatcher(store)
+        return _dispatcher
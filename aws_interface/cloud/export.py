@@ -0,0 +1,119 @@
+"""
+Writers that stream DynamoDB items to newline-delimited JSON or CSV, used with
+DynamoDB.export_items.
+"""
+import base64
+import csv
+import decimal
+import json
+import os
+
+from boto3.dynamodb.types import Binary
+
+FORMATS = ('ndjson', 'csv')
+# Attributes leading every CSV row, other columns follow in the order they are first seen
+CSV_LEADING_COLUMNS = ['id', 'partition', 'creationDate', 'owner']
+# CSV column holding the attributes that were not in the header yet, as a json object
+CSV_EXTRA_COLUMN = '_extra'
+
+
+def to_native(value):
+    """
+    Convert a value read from DynamoDB to plain python types json can encode.
+    Decimal becomes int when it is integral and float otherwise, sets become sorted
+    lists and binary values become base64 strings.
+    """
+    if isinstance(value, decimal.Decimal):
+        if value == value.to_integral_value():
+            return int(value)
+        return float(value)
+    if isinstance(value, dict):
+        return dict((key, to_native(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [to_native(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(to_native(item) for item in value)
+    if isinstance(value, Binary):
+        value = value.value
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('utf-8')
+    return value
+
+
+class NDJSONWriter:
+    """
+    One json object per line.
+    """
+    def __init__(self, file, columns=None):
+        self.file = file
+        self.columns = columns
+
+    def write(self, items):
+        for item in items:
+            self.file.write(json.dumps(to_native(item), ensure_ascii=False))
+            self.file.write('\n')
+        self.file.flush()
+
+
+class CSVWriter:
+    """
+    The header is written with the first page unless columns are given, e.g. when
+    appending to the file of an export that is resumed. Attributes missing from
+    the header go to CSV_EXTRA_COLUMN so that no value is lost.
+    """
+    def __init__(self, file, columns=None):
+        self.file = file
+        self.columns = columns
+        self.writer = csv.writer(file)
+
+    def get_cell(self, value):
+        value = to_native(value)
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        if value is None:
+            return ''
+        return value
+
+    def write(self, items):
+        if not items:
+            return
+        if self.columns is None:
+            seen = dict.fromkeys(key for item in items for key in item)
+            self.columns = [column for column in CSV_LEADING_COLUMNS if column in seen]
+            self.columns += [column for column in seen if column not in self.columns]
+            self.writer.writerow(self.columns + [CSV_EXTRA_COLUMN])
+        for item in items:
+            row = [self.get_cell(item.get(column, None)) for column in self.columns]
+            extra = dict((key, value) for key, value in item.items() if key not in self.columns)
+            row.append(json.dumps(to_native(extra), ensure_ascii=False) if extra else '')
+            self.writer.writerow(row)
+        self.file.flush()
+
+
+def get_writer(file_format, file, columns=None):
+    if file_format == 'ndjson':
+        return NDJSONWriter(file, columns)
+    if file_format == 'csv':
+        return CSVWriter(file, columns)
+    raise ValueError('Unknown format {}, choose from {}'.format(file_format, FORMATS))
+
+
+def load_checkpoint(path):
+    """
+    :return: Checkpoint saved by save_checkpoint, None if there is none
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        # Keys of the checkpoint go back to DynamoDB, which only accepts Decimal numbers
+        return json.load(f, parse_float=decimal.Decimal, parse_int=decimal.Decimal)
+
+
+def save_checkpoint(path, checkpoint):
+    """
+    Write the checkpoint atomically, an interrupted save keeps the previous one.
+    """
+    temp_path = '{}.tmp'.format(path)
+    with open(temp_path, 'w') as f:
+        json.dump(to_native(checkpoint), f)
+    os.replace(temp_path, path)
@@ -0,0 +1,328 @@
+"""
+Bulk import of newline-delimited JSON or CSV streams into a database partition.
+
+Records are parsed lazily and written with BatchWriteItem by a bounded pool of
+workers. The reader waits while the workers are busy, so memory stays bounded
+whatever the size of the stream, and the number of workers writing at the same
+time shrinks when DynamoDB throttles and grows back when it stops.
+
+Records keeping their id overwrite the stored item, which is not counted again.
+Counts may still drift if the same ids are written by something else during the import.
+"""
+import csv
+import decimal
+import json
+import queue
+import threading
+import time
+
+import botocore.exceptions
+
+import cloud.metrics as metrics
+from cloud.aws import THROTTLE_ERRORS, get_backoff, to_decimal
+from cloud.export import CSV_EXTRA_COLUMN, FORMATS
+
+# Retries of BatchWriteItem inside one batch write, the pipeline slows down instead
+BATCH_MAX_RETRIES = 2
+# Times a batch is written again after throttling before its records are reported failed
+MAX_THROTTLED_WRITES = 10
+MAX_REPORTED_FAILURES = 1000
+PROGRESS_INTERVAL = 1.0
+
+
+def _reject_constant(name):
+    raise ValueError('{} is not supported'.format(name))
+
+
+def parse_json(text):
+    return json.loads(text, parse_float=decimal.Decimal, parse_constant=_reject_constant)
+
+
+def parse_csv_cell(text):
+    """
+    Numbers, lists and objects are parsed as json, as written by cloud.export.CSVWriter.
+    Anything else stays a string, empty cells are None.
+    """
+    if text == '':
+        return None
+    if text[0] in '[{-0123456789':
+        try:
+            return parse_json(text)
+        except ValueError:
+            pass
+    return text
+
+
+def iter_records(file, file_format):
+    """
+    Parse file one record at a time.
+
+    :return: Generator of (line_number, record, error), record is None when error is set
+    """
+    if file_format == 'ndjson':
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = parse_json(line)
+            except ValueError as ex:
+                yield line_number, None, 'Invalid json: {}'.format(ex)
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, 'Record must be a json object'
+                continue
+            yield line_number, record, None
+    elif file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, 'Row has more cells than the header'
+                continue
+            record = {}
+            try:
+                for column, text in row.items():
+                    value = parse_csv_cell(text or '')
+                    if column == CSV_EXTRA_COLUMN:
+                        record.update(value or {})
+                    elif value is not None:
+                        record[column] = value
+            except (TypeError, ValueError) as ex:
+                yield reader.line_num, None, 'Invalid {}: {}'.format(CSV_EXTRA_COLUMN, ex)
+                continue
+            yield reader.line_num, record, None
+    else:
+        raise ValueError('Unknown format {}, choose from {}'.format(file_format, FORMATS))
+
+
+def make_item(record, owner, read_groups, write_groups):
+    """
+    :return: Item to write. id, creationDate, owner and groups of the record are
+    kept, e.g. when migrating an export, partition is the one of the import.
+    """
+    item = to_decimal(record)
+    item.pop('partition', None)
+    item_id = item.get('id', None)
+    if item_id is not None and (not isinstance(item_id, str) or not item_id):
+        raise ValueError('id must be a non-empty string')
+    creation_date = item.get('creationDate', None)
+    if creation_date is not None and (isinstance(creation_date, bool)
+                                      or not isinstance(creation_date, (int, decimal.Decimal))):
+        raise ValueError('creationDate must be a number')
+    item['owner'] = item.get('owner', None) or owner
+    item['read_groups'] = list(set(item.get('read_groups', None) or read_groups) | {'admin'})
+    item['write_groups'] = list(set(item.get('write_groups', None) or write_groups) | {'admin'})
+    return item
+
+
+def get_replaced_partitions(dynamodb, table_name, items):
+    """
+    :param items: Items to write, only the ones keeping an id can replace a stored item
+    :return: {item_id: partition} of the stored items they replace
+    """
+    item_ids = [item['id'] for item in items if item.get('id', None)]
+    if not item_ids:
+        return {}
+    result = dynamodb.batch_get_items(table_name, item_ids, ['partition'])
+    if result['unprocessed_ids']:
+        raise botocore.exceptions.ClientError({'Error': {
+            'Code': 'ProvisionedThroughputExceededException',
+            'Message': 'Stored items could not be read',
+        }}, 'BatchGetItem')
+    return dict((item_id, item.get('partition', None)) for item_id, item in result['items'].items())
+
+
+class AdaptiveLimiter:
+    """
+    Limit the number of concurrent writes, additive increase and multiplicative decrease:
+    the limit is halved on throttling and grows by one after as many successful
+    writes in a row.
+    """
+    def __init__(self, max_limit, limit=None):
+        self.max_limit = max_limit
+        self.limit = limit or max_limit
+        self.active = 0
+        self.successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+            self.active += 1
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def throttled(self):
+        with self._condition:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+
+    def succeeded(self):
+        with self._condition:
+            self.successes += 1
+            if self.limit < self.max_limit and self.successes >= self.limit:
+                self.limit += 1
+                self.successes = 0
+                self._condition.notify()
+
+
+class ImportReport:
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self.failed = 0
+        self.throttled = 0
+        self.failures = []
+        self.concurrency = 0
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def add_failure(self, line_number, error):
+        with self._lock:
+            self.failed += 1
+            if len(self.failures) < MAX_REPORTED_FAILURES:
+                self.failures.append({'line': line_number, 'error': error})
+
+    def add_throttled(self):
+        with self._lock:
+            self.throttled += 1
+
+    def add_imported(self, count):
+        with self._lock:
+            self.imported += count
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'read': self.read,
+                'imported': self.imported,
+                'failed': self.failed,
+                'throttled': self.throttled,
+                'concurrency': self.concurrency,
+                'elapsed': time.time() - self.started_at,
+                'failures': list(self.failures),
+            }
+
+
+def import_records(dynamodb, table_name, partition, records, owner, read_groups=['admin'], write_groups=['admin'],
+                   max_workers=8, on_progress=None, on_failure=None):
+    """
+    Write records to partition with BatchWriteItem.
+
+    :param dynamodb: cloud.aws.DynamoDB
+    :param records: Iterable of (line_number, record, error) as from iter_records
+    :param max_workers: Upper bound of concurrent batch writes
+    :param on_progress: Called with the report dict about every PROGRESS_INTERVAL seconds
+    :param on_failure: Called with (line_number, error) for every record that failed
+    :return: Report dict, failures holds the first MAX_REPORTED_FAILURES failed records
+    """
+    report = ImportReport()
+    limiter = AdaptiveLimiter(max_workers)
+    # Bounded, the reader blocks while every worker is busy
+    batches = queue.Queue(maxsize=max_workers * 2)
+    last_progress = [time.time()]
+
+    failure_lock = threading.Lock()
+
+    def fail(line_number, error):
+        report.add_failure(line_number, error)
+        if on_failure:
+            # Workers fail records concurrently, on_failure does not have to be thread-safe
+            with failure_lock:
+                on_failure(line_number, error)
+
+    def write(batch):
+        """
+        :param batch: List of (line_number, item)
+        :return: (items written, [(line_number, item, error)]), error None when throttled
+        """
+        try:
+            replaced_partitions = get_replaced_partitions(dynamodb, table_name, [item for _, item in batch])
+            result = dynamodb.batch_put_items(table_name, [(partition, item) for _, item in batch],
+                                              max_retries=BATCH_MAX_RETRIES,
+                                              replaced_partitions=replaced_partitions,
+                                              keep_creation_dates=True)
+        except botocore.exceptions.ClientError as ex:
+            code = ex.response.get('Error', {}).get('Code', None)
+            error = None if code in THROTTLE_ERRORS else str(ex)
+            return 0, [(line_number, item, error) for line_number, item in batch]
+        except Exception as ex:  # e.g. values the serializer rejects or a lost connection
+            return 0, [(line_number, item, str(ex) or type(ex).__name__) for line_number, item in batch]
+        unprocessed_ids = set(item['id'] for item in result['unprocessed_items'])
+        return len(result['item_ids']), [(line_number, item, None) for line_number, item in batch
+                                         if item['id'] in unprocessed_ids]
+
+    def write_batch(batch):
+        for attempt in range(MAX_THROTTLED_WRITES + 1):
+            limiter.acquire()
+            try:
+                written, rejected = write(batch)
+            finally:
+                limiter.release()
+            report.add_imported(written)
+            throttled = [(line_number, item) for line_number, item, error in rejected if error is None]
+            invalid = [(line_number, error) for line_number, item, error in rejected if error is not None]
+            if len(invalid) > 1:
+                # One bad record rejects its whole batch, write them one by one to find it
+                for line_number, item, _ in rejected:
+                    write_batch([(line_number, item)])
+                return
+            for line_number, error in invalid:
+                fail(line_number, error)
+            if not throttled:
+                limiter.succeeded()
+                return
+            limiter.throttled()
+            report.add_throttled()
+            metrics.count('import_throttled')
+            batch = throttled
+            time.sleep(get_backoff(attempt))
+        for line_number, _ in batch:
+            fail(line_number, 'Throttled {} times'.format(MAX_THROTTLED_WRITES + 1))
+
+    def worker():
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            try:
+                write_batch(batch)
+            except Exception as ex:
+                # A worker that stops would leave the reader blocked on the full queue
+                for line_number, _ in batch:
+                    fail(line_number, str(ex) or type(ex).__name__)
+            if on_progress and time.time() - last_progress[0] >= PROGRESS_INTERVAL:
+                last_progress[0] = time.time()
+                report.concurrency = limiter.limit
+                on_progress(report.to_dict())
+
+    threads = [threading.Thread(target=worker) for _ in range(max_workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        batch = []
+        for line_number, record, error in records:
+            report.read += 1
+            if error is None:
+                try:
+                    batch.append((line_number, make_item(record, owner, read_groups, write_groups)))
+                except ValueError as ex:
+                    error = str(ex)
+            if error is not None:
+                fail(line_number, error)
+            if len(batch) >= dynamodb.BATCH_WRITE_SIZE:
+                batches.put(batch)
+                batch = []
+        if batch:
+            batches.put(batch)
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+    report.concurrency = limiter.limit
+    metrics.count('imported_items', report.imported)
+    return report.to_dict()
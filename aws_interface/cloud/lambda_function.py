@@ -1,9 +1,21 @@
+import os
 import urllib
 import cgi
-import json
-import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import boto3
-import cloud.auth.get_me as get_me
+import cloud.metrics as metrics
+from cloud.auth.util import get_session_user
+from cloud.dispatch import get_dispatcher
+from cloud.recipe_store import get_store
+from cloud.response import Response, encode_body, get_accept_encoding
+
+BATCH_CLOUD_API_NAME = 'batch'
+MAX_BATCH_CALLS = 25
+BATCH_MAX_WORKERS = 8
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
 
 
 def get_params(event):
@@ -25,33 +37,58 @@ def get_params(event):
 def handler(event, context):
     params = event
     cloud_api_name = params.get('cloud_api_name', None)
-    
-    with open('./cloud/recipe.json', 'r') as f:
-        recipe = json.load(f)
-      
-    with open('./cloud/app_id.txt', 'r') as file:
-        app_id = file.read()
-        
-    cloud_apis = recipe.get('cloud_apis', {})
-    cloud_api = cloud_apis.get(cloud_api_name, {})
-    module_name = cloud_api.get('module')
-    permissions = cloud_api.get('permissions', [])
 
+    invocation = metrics.start_invocation(cloud_api_name)
+    try:
+        response = to_api_response(handle(params, cloud_api_name))
+        with metrics.phase('compression'):
+            return encode_body(response, get_accept_encoding(params))
+    finally:
+        metrics.end_invocation(invocation)
+
+
+def handle(params, cloud_api_name):
+    with metrics.phase('recipe_load'):
+        store = get_store()
+    if cloud_api_name == BATCH_CLOUD_API_NAME:
+        data = make_data(store, params)
+        with metrics.phase('session_resolution'):
+            data['user'] = get_session_user(data, boto3)
+        return call_batch(data)
+
+    route = get_dispatcher().get_route(cloud_api_name)
+    if route is None:
+        return get_not_found_response(cloud_api_name)
+
+    data = make_data(store, params)
+    with metrics.phase('session_resolution'):
+        data['user'] = get_session_user(data, boto3)
+    return call_route(route, data)
+
+
+def make_data(store, params):
     data = {
         'params': params,
-        'recipe': recipe,
-        'app_id': app_id,
+        'recipe': store.recipe,
+        'app_id': store.app_id,
         'admin': False,
     }
+    return data
+
 
-    user = get_me.do(data, boto3).get('body', {}).get('item', None)
-    data['user'] = user
+def get_not_found_response(cloud_api_name):
+    return Response({
+        'error': '404',
+        'message': 'cloud_api_name: {} does not exist'.format(cloud_api_name)
+    }, status_code=404)
 
-    module = importlib.import_module(module_name)
-    if 'all' in permissions:
-        module_response = module.do(data, boto3)
-    elif user.get('group', None) in permissions:
-        module_response = module.do(data, boto3)
+
+def call_route(route, data):
+    with metrics.phase('permission_check'):
+        permitted = route.is_permitted(data['user'])
+    if permitted:
+        with metrics.phase('module_do'):
+            module_response = route.do(data, boto3)
     else:
         module_response = {
             'statusCode': 201,
@@ -59,10 +96,89 @@ def handler(event, context):
                 'message': 'permission denied'
             }
         }
+    return module_response
+
+
+def call_batch(data):
+    """
+    Run the calls listed in params['calls'], each {'cloud_api_name': str, 'params': dict},
+    with the user resolved once for all of them. Calls run one after another in order,
+    so a call sees the writes of the previous ones, or concurrently if params['parallel']
+    is true. Results are returned in request order.
+    """
+    params = data['params']
+    calls = params.get('calls', [])
+    parallel = params.get('parallel', False)
+    if not isinstance(calls, list) or not all(
+            isinstance(call, dict) and isinstance(call.get('params', None) or {}, dict) for call in calls):
+        return Response({
+            'error': '400',
+            'message': 'calls must be a list of {"cloud_api_name": str, "params": dict}'
+        }, status_code=400)
+    if len(calls) > MAX_BATCH_CALLS:
+        return Response({
+            'error': '413',
+            'message': 'batch can contain up to {} calls'.format(MAX_BATCH_CALLS)
+        }, status_code=413)
 
+    invocation = metrics.get_current()
+
+    def run(call):
+        with metrics.bind(invocation):
+            return run_call(call)
+
+    def run_call(call):
+        cloud_api_name = call.get('cloud_api_name', None)
+        route = get_dispatcher().get_route(cloud_api_name)
+        if route is None:
+            module_response = get_not_found_response(cloud_api_name)
+        else:
+            call_params = dict(call.get('params', None) or {})
+            call_params['cloud_api_name'] = cloud_api_name
+            if 'session_id' in params:
+                call_params.setdefault('session_id', params['session_id'])
+            call_data = dict(data)
+            call_data['params'] = call_params
+            call_data['user'] = dict(data['user']) if data['user'] else None
+            try:
+                module_response = call_route(route, call_data)
+            except Exception as ex:
+                print(ex)
+                module_response = Response({
+                    'error': '500',
+                    'message': 'cloud_api_name: {} failed'.format(cloud_api_name)
+                }, status_code=500)
+        return {
+            'cloud_api_name': cloud_api_name,
+            'statusCode': module_response.get('statusCode', 200),
+            'body': module_response.get('body', {}),
+        }
+
+    if parallel is True and len(calls) > 1:
+        results = list(get_batch_executor().map(run, calls))
+    else:
+        results = [run(call) for call in calls]
+    return Response({'results': results})
+
+
+def get_batch_executor():
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS)
+    return _batch_executor
+
+
+def to_api_response(module_response):
     response = {
         'statusCode': module_response.get('statusCode', 200),
         'headers': module_response.get('header', {}),
         'body': module_response.get('body', {}),
     }
     return response
+
+
+if os.environ.get('PRELOAD_CLOUD_APIS', 'false').lower() == 'true':
+    # Import every cloud_api module during the container's init phase
+    get_dispatcher().preload()
@@ -0,0 +1,207 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = 'aws-interface'
+
+_sample_rate = float(os.environ.get('METRICS_SAMPLE_RATE', '1.0'))
+_local = threading.local()
+
+
+class Invocation:
+    """
+    Timings collected while handling one request. Phases and counters add up,
+    so the sub-calls of a batch can report into the same invocation.
+    """
+    def __init__(self, cloud_api_name):
+        self.cloud_api_name = cloud_api_name
+        self.timestamp = int(time.time() * 1000)
+        self.started_at = time.perf_counter()
+        self.phases = {}
+        self.counters = {}
+        self.aws_calls = []
+        self._lock = threading.Lock()
+
+    def add_phase(self, name, duration):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0) + duration
+
+    def add_count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_aws_call(self, service, operation, resource, duration):
+        with self._lock:
+            self.aws_calls.append({
+                'service': service,
+                'operation': operation,
+                'resource': resource,
+                'duration': duration,
+            })
+
+    def get_hit_rates(self):
+        """
+        :return: {'{cache}_hit_rate': percent} of every cache counted as {cache}_hits and {cache}_misses
+        """
+        with self._lock:
+            counters = dict(self.counters)
+        caches = set(name.rsplit('_', 1)[0] for name in counters if name.endswith(('_hits', '_misses')))
+        hit_rates = {}
+        for cache in caches:
+            hits = counters.get('{}_hits'.format(cache), 0)
+            lookups = hits + counters.get('{}_misses'.format(cache), 0)
+            hit_rates['{}_hit_rate'.format(cache)] = 100.0 * hits / lookups if lookups else 0.0
+        return hit_rates
+
+    def to_record(self):
+        """
+        :return: CloudWatch embedded metric format (EMF) record
+        """
+        total = (time.perf_counter() - self.started_at) * 1000
+        aws_time = sum(call['duration'] for call in self.aws_calls)
+        values = dict(('{}_time'.format(name), duration) for name, duration in self.phases.items())
+        values['total_time'] = total
+        values['aws_time'] = aws_time
+        values['aws_calls'] = len(self.aws_calls)
+        values.update(self.counters)
+        values.update(self.get_hit_rates())
+        metric_definitions = [{
+            'Name': name,
+            'Unit': get_unit(name)
+        } for name in values]
+        record = {
+            '_aws': {
+                'Timestamp': self.timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['cloud_api_name']],
+                    'Metrics': metric_definitions,
+                }]
+            },
+            'cloud_api_name': self.cloud_api_name,
+            'aws_call_details': self.aws_calls,
+        }
+        record.update(values)
+        return record
+
+
+def get_unit(name):
+    if name.endswith('_time'):
+        return 'Milliseconds'
+    if name.endswith('_rate'):
+        return 'Percent'
+    return 'Count'
+
+
+class LogSink:
+    """
+    Print one json line per record, CloudWatch Logs picks EMF records up from stdout.
+    """
+    def emit(self, record):
+        print(json.dumps(record, default=str))
+
+
+class MemorySink:
+    """
+    Keep records in memory, for tests and benchmarks.
+    """
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def clear(self):
+        with self._lock:
+            self.records = []
+
+
+_sink = LogSink()
+
+
+def set_sink(sink):
+    """
+    Replace the sink and return the previous one.
+    """
+    global _sink
+    previous = _sink
+    _sink = sink
+    return previous
+
+
+def set_sample_rate(sample_rate):
+    global _sample_rate
+    _sample_rate = sample_rate
+
+
+def get_current():
+    return getattr(_local, 'invocation', None)
+
+
+def start_invocation(cloud_api_name):
+    """
+    Start collecting timings for the current thread, subject to the sample rate.
+
+    :return: Invocation or None if this request is not sampled
+    """
+    invocation = None
+    if _sample_rate >= 1 or random.random() < _sample_rate:
+        invocation = Invocation(cloud_api_name)
+    _local.invocation = invocation
+    return invocation
+
+
+def end_invocation(invocation):
+    _local.invocation = None
+    if invocation is not None:
+        _sink.emit(invocation.to_record())
+
+
+@contextmanager
+def bind(invocation):
+    """
+    Report into invocation from another thread, e.g. a worker running a batch sub-call.
+    """
+    previous = get_current()
+    _local.invocation = invocation
+    try:
+        yield invocation
+    finally:
+        _local.invocation = previous
+
+
+@contextmanager
+def phase(name):
+    invocation = get_current()
+    if invocation is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        invocation.add_phase(name, (time.perf_counter() - started_at) * 1000)
+
+
+@contextmanager
+def aws_call(service, operation, resource=None):
+    invocation = get_current()
+    if invocation is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        invocation.add_aws_call(service, operation, resource, (time.perf_counter() - started_at) * 1000)
+
+
+def count(name, value=1):
+    invocation = get_current()
+    if invocation is not None:
+        invocation.add_count(name, value)
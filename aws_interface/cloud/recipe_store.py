@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+from types import MappingProxyType
+
+
+RECIPE_FILE_NAME = 'recipe.json'
+APP_ID_FILE_NAME = 'app_id.txt'
+
+_base_dir = os.path.dirname(os.path.abspath(__file__))
+_store = None
+_lock = threading.Lock()
+
+
+def _freeze(obj):
+    if isinstance(obj, dict):
+        return MappingProxyType({key: _freeze(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(value) for value in obj)
+    return obj
+
+
+class CloudAPI:
+    """
+    Precomputed view of a single cloud_api entry of the recipe.
+    """
+    __slots__ = ('name', 'module_name', 'permissions', 'info')
+
+    def __init__(self, name, module_name, permissions, info):
+        self.name = name
+        self.module_name = module_name
+        self.permissions = frozenset(permissions)
+        self.info = info
+
+
+class RecipeStore:
+    """
+    Immutable snapshot of the recipe and app_id shipped with a lambda package.
+    """
+    def __init__(self, recipe, app_id):
+        self.recipe = _freeze(recipe)
+        self.app_id = app_id
+        self.cloud_apis = MappingProxyType(dict([
+            (name, CloudAPI(name, cloud_api.get('module'), cloud_api.get('permissions', []), cloud_api.get('info', {})))
+            for name, cloud_api in self.recipe.get('cloud_apis', {}).items()
+        ]))
+
+    def get_cloud_api(self, name):
+        return self.cloud_apis.get(name, None)
+
+    @classmethod
+    def load(cls, base_dir):
+        with open(os.path.join(base_dir, RECIPE_FILE_NAME), 'r') as f:
+            recipe = json.load(f)
+        with open(os.path.join(base_dir, APP_ID_FILE_NAME), 'r') as f:
+            app_id = f.read()
+        return cls(recipe, app_id)
+
+
+def get_store():
+    """
+    Return the process-wide recipe store, loading it from disk on first use only.
+    A new recipe is deployed as a new package, which AWS Lambda runs in new containers.
+
+    :return: RecipeStore
+    """
+    global _store
+    store = _store
+    if store is not None:
+        return store
+    with _lock:
+        if _store is None:
+            _store = RecipeStore.load(_base_dir)
+        return _store
+
+
+def set_store(store):
+    """
+    Install a store built in memory instead of one loaded from the package, e.g. when
+    the handler runs outside of AWS Lambda.
+    """
+    global _store
+    with _lock:
+        _store = store
+
+
+def invalidate():
+    global _store
+    with _lock:
+        _store = None
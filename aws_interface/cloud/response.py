@@ -1,3 +1,8 @@
+import base64
+import decimal
+import json
+import os
+import zlib
 
 
 def _get_header(content_type='application/json'):
@@ -16,3 +21,105 @@ class Response(dict):
         self['statusCode'] = status_code
         self['header'] = header
         self['body'] = body
+
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_LEVEL = 6
+# Preferred first when the client accepts several encodings with the same quality
+SUPPORTED_ENCODINGS = ('gzip', 'deflate')
+
+
+def parse_accept_encoding(accept_encoding):
+    """
+    :param accept_encoding: Accept-Encoding value, e.g. 'gzip;q=0.8, deflate'
+    :return: Supported encoding to use or None
+    """
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, _, options = part.strip().partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        options = options.strip()
+        if options.startswith('q='):
+            try:
+                quality = float(options[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+    candidates = [(qualities.get(coding, qualities.get('*', 0.0)), -index, coding)
+                  for index, coding in enumerate(SUPPORTED_ENCODINGS)]
+    quality, _, coding = max(candidates)
+    if quality <= 0:
+        return None
+    return coding
+
+
+def get_accept_encoding(event):
+    """
+    Read Accept-Encoding from the request headers (proxy integration) or from the
+    accept_encoding param the SDK sends with a non-proxy integration.
+    """
+    headers = event.get('headers', None) or {}
+    for key, value in headers.items():
+        if key.lower() == 'accept-encoding':
+            return value
+    return event.get('accept_encoding', None)
+
+
+def json_default(value):
+    """
+    Encode Decimal read from DynamoDB as a json number like in uncompressed bodies,
+    int when it is integral and float otherwise.
+    """
+    if isinstance(value, decimal.Decimal):
+        if value == value.to_integral_value():
+            return int(value)
+        return float(value)
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+def compress(data, encoding):
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data, encoding):
+    if encoding == 'gzip':
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    return zlib.decompress(data)
+
+
+def encode_body(response, accept_encoding, min_size=None):
+    """
+    Compress response['body'] in place when the client accepts it and the
+    json encoded body is at least min_size bytes. The compressed body is
+    base64 encoded and Content-Encoding is set on the headers.
+
+    :param response: Api response with statusCode, headers and body
+    :param accept_encoding: Accept-Encoding value of the request
+    :param min_size: Bodies smaller than this are left as they are
+    :return: response
+    """
+    encoding = parse_accept_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    if min_size is None:
+        min_size = COMPRESSION_MIN_SIZE
+    data = json.dumps(response['body'], default=json_default).encode('utf-8')
+    if len(data) < min_size:
+        return response
+    compressed = compress(data, encoding)
+    if len(compressed) >= len(data):
+        return response
+    headers = dict(response.get('headers', None) or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = 'Accept-Encoding'
+    response['headers'] = headers
+    response['body'] = base64.b64encode(compressed).decode('utf-8')
+    response['isBase64Encoded'] = True
+    return response
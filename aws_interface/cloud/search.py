@@ -0,0 +1,288 @@
+"""
+Inverted index of the search fields of database items, used by search_items.
+
+Every term of an item is stored as a posting item {item_id, tf} in the partition
+'search:{partition}:{term}' of the database table, so the posting list of a term
+is a Query on partition-creationDate. Postings are only written with BatchWriteItem
+and have no partition count, the first page of a posting list tells whether it is short.
+
+Words are lower-cased after NFKC normalization. Korean, Japanese and Chinese runs
+have no reliable word boundaries, e.g. particles are attached to Korean nouns, so
+they are indexed as their characters and overlapping bigrams. A query matches items
+holding all of its bigrams, or the character of a one-character run: '학교' and '학'
+match '학교에서'.
+"""
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import cloud.metrics as metrics
+
+# Hangul syllables and jamo, kana and CJK ideographs are split into characters and bigrams
+_NGRAM_CHARS = '\u1100-\u11ff\u3040-\u30ff\u3130-\u318f\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7a3'
+_TOKEN = re.compile('[{0}]+|[^\\W_{0}]+'.format(_NGRAM_CHARS))
+_NGRAM_RUN = re.compile('[{}]'.format(_NGRAM_CHARS))
+NGRAM_SIZE = 2
+MAX_TERM_LENGTH = 64
+# Terms indexed per item, every term costs a posting write
+MAX_TERMS_PER_ITEM = 100
+MAX_QUERY_TERMS = 10
+# Postings read per term, items beyond are not found
+MAX_POSTINGS = 5000
+# Postings read from every posting list before choosing the order to intersect them
+FIRST_PAGE_SIZE = 500
+POSTINGS_PAGE_SIZE = 1000
+# A Query page reads about 40 postings per read unit and a BatchGetItem key costs
+# half a unit, candidates are looked up directly when they are this many times fewer
+PROBE_RATIO = 40
+# Postings per BatchWriteItem task, each task sends 25 at a time
+WRITE_TASK_SIZE = 100
+MAX_WORKERS = 4
+REINDEX_BATCH_SIZE = 1000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    :return: Executor shared by every request of the container, MAX_WORKERS threads at most
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    return _executor
+
+
+def run_all(function, tasks):
+    """
+    :return: [function(task) for task in tasks] run on the executor, reporting to
+    the metrics of the calling thread
+    """
+    if len(tasks) < 2:
+        return [function(task) for task in tasks]
+    invocation = metrics.get_current()
+
+    def run(task):
+        with metrics.bind(invocation):
+            return function(task)
+    return list(get_executor().map(run, tasks))
+
+
+def normalize(text):
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+def tokenize(text, unigrams=True):
+    """
+    :param unigrams: Whether the characters of ngram runs longer than one are terms,
+    queries only need their bigrams
+    :return: Terms of text in order, repeated as often as they occur
+    """
+    terms = []
+    for token in _TOKEN.findall(normalize(text)):
+        if _NGRAM_RUN.match(token):
+            for i in range(len(token)):
+                if unigrams or len(token) == 1:
+                    terms.append(token[i])
+                if i + NGRAM_SIZE <= len(token):
+                    terms.append(token[i:i + NGRAM_SIZE])
+        else:
+            terms.append(token[:MAX_TERM_LENGTH])
+    return terms
+
+
+def get_term_frequencies(item, fields):
+    """
+    :param fields: Search fields, values that are not strings are ignored
+    :return: {term: number of occurrences} of the first MAX_TERMS_PER_ITEM terms
+    """
+    frequencies = {}
+    for field in fields:
+        value = (item or {}).get(field, None)
+        if not isinstance(value, str):
+            continue
+        for term in tokenize(value):
+            if term in frequencies:
+                frequencies[term] += 1
+            elif len(frequencies) < MAX_TERMS_PER_ITEM:
+                frequencies[term] = 1
+    return frequencies
+
+
+def get_query_terms(query):
+    """
+    :return: Distinct terms of query, up to MAX_QUERY_TERMS
+    """
+    return list(dict.fromkeys(tokenize(query, unigrams=False)))[:MAX_QUERY_TERMS]
+
+
+def get_posting_partition(partition, term):
+    return 'search:{}:{}'.format(partition, term)
+
+
+def get_posting_id(partition, term, item_id):
+    return '{}:{}'.format(get_posting_partition(partition, term), item_id)
+
+
+def get_posting(partition, term, item, tf):
+    return {
+        'id': get_posting_id(partition, term, item['id']),
+        'partition': get_posting_partition(partition, term),
+        'creationDate': item['creationDate'],
+        'item_id': item['id'],
+        'tf': tf,
+    }
+
+
+def write_postings(dynamodb, table_name, puts=(), delete_ids=()):
+    """
+    Put and delete postings with BatchWriteItem, WRITE_TASK_SIZE per task on the executor.
+
+    :return: Requests that could not be written
+    """
+    tasks = [(puts[i:i + WRITE_TASK_SIZE], []) for i in range(0, len(puts), WRITE_TASK_SIZE)]
+    tasks += [([], delete_ids[i:i + WRITE_TASK_SIZE]) for i in range(0, len(delete_ids), WRITE_TASK_SIZE)]
+    results = run_all(lambda task: dynamodb.batch_write_items(table_name, task[0], task[1]), tasks)
+    unprocessed = [request for result in results for request in result]
+    metrics.count('posting_writes', len(puts) + len(delete_ids) - len(unprocessed))
+    if unprocessed:
+        metrics.count('postings_unprocessed', len(unprocessed))
+    return unprocessed
+
+
+def update_postings(dynamodb, table_name, partition, changes, fields):
+    """
+    Write the postings of changed items and delete the ones of terms they no longer hold.
+
+    :param dynamodb: cloud.aws.DynamoDB
+    :param changes: List of (old_item, new_item), old_item is None for a created
+    item and new_item None for a deleted one
+    :param fields: Search fields of partition
+    :return: Number of postings that could not be written
+    """
+    puts = []
+    delete_ids = []
+    for old_item, new_item in changes:
+        item = new_item or old_item
+        old_terms = get_term_frequencies(old_item, fields)
+        new_terms = get_term_frequencies(new_item, fields)
+        for term, tf in new_terms.items():
+            if old_terms.get(term, None) != tf:
+                puts.append(get_posting(partition, term, item, tf))
+        for term in old_terms:
+            if term not in new_terms:
+                delete_ids.append(get_posting_id(partition, term, item['id']))
+    if not puts and not delete_ids:
+        return 0
+
+    unprocessed = write_postings(dynamodb, table_name, puts, delete_ids)
+    if unprocessed:
+        print('[{}] {} postings of {} were not written'.format(table_name, len(unprocessed), partition))
+    return len(unprocessed)
+
+
+def reindex_items(dynamodb, table_name, partition, items, fields):
+    """
+    Write the postings of every item of partition, e.g. after search fields were
+    added. Postings of terms the items no longer hold are left, search_items skips
+    the items they point to.
+
+    :param items: Iterable of every item of partition, e.g. from DynamoDB.iter_items
+    :return: (items indexed, postings that could not be written)
+    """
+    postings = []
+    indexed = 0
+    unprocessed = 0
+    for item in items:
+        indexed += 1
+        for term, tf in get_term_frequencies(item, fields).items():
+            postings.append(get_posting(partition, term, item, tf))
+        if len(postings) >= REINDEX_BATCH_SIZE:
+            unprocessed += len(write_postings(dynamodb, table_name, postings))
+            postings = []
+    unprocessed += len(write_postings(dynamodb, table_name, postings))
+    return indexed, unprocessed
+
+
+def read_postings(dynamodb, table_name, partition, term, limit, start_key=None):
+    """
+    :return: ({item_id: tf}, end_key) of up to limit postings of term, end_key is None
+    after the last one
+    """
+    postings = {}
+    end_key = start_key
+    while len(postings) < limit:
+        response = dynamodb.get_items(table_name, get_posting_partition(partition, term), end_key,
+                                      min(POSTINGS_PAGE_SIZE, limit - len(postings)), fields=['item_id', 'tf'])
+        for posting in response.get('Items', []):
+            postings[posting['item_id']] = int(posting['tf'])
+        end_key = response.get('LastEvaluatedKey', None)
+        if not end_key:
+            break
+    return postings, end_key
+
+
+def probe_postings(dynamodb, table_name, partition, term, item_ids):
+    """
+    :return: {item_id: tf} of the items of item_ids holding term
+    """
+    posting_ids = [get_posting_id(partition, term, item_id) for item_id in item_ids]
+    postings = dynamodb.batch_get_items(table_name, posting_ids, ['item_id', 'tf'])['items'].values()
+    return dict((posting['item_id'], int(posting['tf'])) for posting in postings)
+
+
+def find_items(dynamodb, table_name, partition, terms):
+    """
+    Intersect the posting lists of terms, shortest first. The first page of every list
+    is read to order them, long lists are then read on only while there are many
+    candidates left, few candidates are looked up in them instead.
+
+    :return: ([(item_id, score)] best first, truncated), score is the sum of the term
+    frequencies, truncated is True when a posting list was longer than MAX_POSTINGS
+    """
+    if not terms:
+        return [], False
+    pages = dict(zip(terms, run_all(
+        lambda term: read_postings(dynamodb, table_name, partition, term, FIRST_PAGE_SIZE), terms)))
+    if not all(postings for postings, _ in pages.values()):
+        return [], False
+    # Complete lists first, by length
+    terms = sorted(terms, key=lambda term: (pages[term][1] is not None, len(pages[term][0])))
+    truncated = False
+    scores = None
+    for term in terms:
+        term_scores, end_key = pages[term]
+        if end_key is not None:
+            missing = [item_id for item_id in scores or () if item_id not in term_scores]
+            # The list holds more than FIRST_PAGE_SIZE postings
+            if scores is not None and len(missing) * PROBE_RATIO < FIRST_PAGE_SIZE:
+                term_scores = dict(term_scores, **probe_postings(dynamodb, table_name, partition, term, missing))
+            else:
+                rest, end_key = read_postings(dynamodb, table_name, partition, term,
+                                              MAX_POSTINGS - len(term_scores), end_key)
+                term_scores = dict(term_scores, **rest)
+                truncated = truncated or end_key is not None
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = dict((item_id, score + term_scores[item_id])
+                          for item_id, score in scores.items() if item_id in term_scores)
+        if not scores:
+            break
+    ranked = sorted(scores.items(), key=lambda item_score: (-item_score[1], item_score[0]))
+    return ranked, truncated
+
+
+def matches(item, fields, terms):
+    """
+    :return: Score of item, None if it does not hold every term e.g. when it changed
+    after its postings were written
+    """
+    frequencies = get_term_frequencies(item, fields)
+    if not all(term in frequencies for term in terms):
+        return None
+    return sum(frequencies[term] for term in terms)
@@ -48,7 +48,7 @@ def do(data, boto3):
     }
     table_name = 'storage-{}'.format(app_id)
 
-    dynamo = DynamoDB(boto3)
+    dynamo = DynamoDB(boto3, transactional=recipe.get('transactional_writes', False))
 
     folder = dynamo.get_item(table_name, folder_path)
     if folder.get('Item'):
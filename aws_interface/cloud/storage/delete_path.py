@@ -41,25 +41,25 @@ def do(data, boto3):
     item = dynamo.get_item(table_name, _path).get('Item')
 
     def delete_item(_item):
-        if has_permission(_item):
-            dynamo.delete_item(table_name, _path)
-            if _item['type'] == 'folder':
-                items = dynamo.get_items(table_name, _path).get('Items', [])
-                print(items)
-                for __item in items:
-                    delete_item(__item)
-            elif _item['type'] == 'file':
-                file_key = item.get('file_key', None)
-                if file_key:
-                    s3.delete_file_bin(bucket_name, file_key)
+        if not has_permission(_item):
+            return False
+        if _item['type'] == 'folder':
+            # Children are listed page by page, folders of any size are deleted fully
+            for child in dynamo.iter_items(table_name, _item['id']):
+                delete_item(child)
+        elif _item['type'] == 'file':
+            file_key = _item.get('file_key', None)
+            if file_key:
+                s3.delete_file_bin(bucket_name, file_key)
+        dynamo.delete_item(table_name, _item['id'], partition=_item['partition'])
+        return True
+
+    if item:
+        if delete_item(item):
+            body['success'] = True
         else:
             body['success'] = False
             body['message'] = 'permission denied'
-            return Response(body)
-
-    if item:
-        delete_item(item)
-        body['success'] = True
         return Response(body)
     else:
         body['success'] = False
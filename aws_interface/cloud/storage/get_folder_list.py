@@ -9,6 +9,7 @@ info = {
         'session_id': 'str',
         'path': 'str',
         'start_key': 'str?',
+        'limit': 'int=100',
     },
     'output_format': {
         'items': 'list',
@@ -39,6 +40,7 @@ def do(data, boto3):
 
     folder_path = params.get('folder_path')
     start_key = params.get('start_key', None)
+    limit = params.get('limit', 100)
 
     table_name = 'storage-{}'.format(app_id)
     dynamo = DynamoDB(boto3)
@@ -46,9 +48,9 @@ def do(data, boto3):
     item = dynamo.get_item(table_name, folder_path).get('Item', None)
     if item or folder_path == '/':
         if has_permission(item) or folder_path == '/':
-            result = dynamo.get_items(table_name, folder_path, start_key)
-            body['items'] = result.get('Items', [])
-            body['end_key'] = result.get('LastEvaluatedKey', None)
+            items, end_key = dynamo.get_items_page(table_name, folder_path, int(limit), exclusive_start_key=start_key)
+            body['items'] = items
+            body['end_key'] = end_key
             return Response(body)
         else:
             body['success'] = False
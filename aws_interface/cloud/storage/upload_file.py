@@ -59,7 +59,7 @@ def do(data, boto3):
     }
     print(item)
 
-    dynamo = DynamoDB(boto3)
+    dynamo = DynamoDB(boto3, transactional=recipe.get('transactional_writes', False))
 
     folder = dynamo.get_item(table_name, file_path)
     if folder.get('Item'):
@@ -45,6 +45,9 @@ class AuthAPI(API):
     def get_users(self, start_key=None, limit=100):
         return self.service_controller.get_users(self.recipe_controller.to_json(), start_key, limit)
 
+    def iter_users(self, page_size=100):
+        return self.service_controller.iter_users(page_size)
+
     def get_user_count(self):
         return self.service_controller.get_user_count(self.recipe_controller.to_json())
 
@@ -37,6 +37,14 @@ class API(metaclass=ABCMeta):
     def get_recipe_json_string(self):
         return self.get_recipe_controller().to_json()
 
+    def set_capacity(self, mode, read_capacity=1, write_capacity=1, max_read_capacity=None,
+                     max_write_capacity=None, target_utilization=70):
+        return self.recipe_controller.set_capacity(mode, read_capacity, write_capacity, max_read_capacity,
+                                                   max_write_capacity, target_utilization)
+
+    def get_capacity(self):
+        return self.recipe_controller.get_capacity()
+
     def get_rest_api_url(self):
         return self.service_controller.get_rest_api_url(self.recipe_controller)
 
@@ -17,11 +17,42 @@ class DatabaseAPI(API):
     def delete_partition(self, partition_name):
         return self.recipe_controller.delete_partition(partition_name)
 
+    def set_count_shards(self, partition_name, count_shards):
+        return self.recipe_controller.set_count_shards(partition_name, count_shards)
+
+    def set_cache_ttl(self, partition_name, cache_ttl):
+        return self.recipe_controller.set_cache_ttl(partition_name, cache_ttl)
+
+    def get_cache_ttl(self, partition_name):
+        return self.recipe_controller.get_cache_ttl(partition_name)
+
+    def put_search_field(self, partition_name, field):
+        return self.recipe_controller.put_search_field(partition_name, field)
+
+    def delete_search_field(self, partition_name, field):
+        return self.recipe_controller.delete_search_field(partition_name, field)
+
+    def get_search_fields(self, partition_name):
+        return self.recipe_controller.get_search_fields(partition_name)
+
+    def put_index(self, field, field_type='S'):
+        return self.recipe_controller.put_index(field, field_type)
+
+    def delete_index(self, field):
+        return self.recipe_controller.delete_index(field)
+
+    def get_indexes(self):
+        return self.recipe_controller.get_indexes()
+
     # Service
     def create_item(self, partition, item, read_groups=['admin'], write_groups=['admin']):
         return self.service_controller.create_item(self.recipe_controller.to_json(),
                                                    partition, item, read_groups, write_groups)
 
+    def create_items(self, partition, items, read_groups=['admin'], write_groups=['admin']):
+        return self.service_controller.create_items(self.recipe_controller.to_json(),
+                                                    partition, items, read_groups, write_groups)
+
     def update_item(self, item_id, item, read_groups=['admin'], write_groups=['admin']):
         return self.service_controller.update_item(self.recipe_controller.to_json(),
                                                    item_id, item, read_groups, write_groups)
@@ -30,17 +61,47 @@ class DatabaseAPI(API):
         return self.service_controller.put_item_field(self.recipe_controller.to_json(),
                                                       item_id, field_name, field_value)
 
-    def get_item(self, item_id):
-        return self.service_controller.get_item(self.recipe_controller.to_json(), item_id)
+    def get_item(self, item_id, consistent_read=False):
+        return self.service_controller.get_item(self.recipe_controller.to_json(), item_id, consistent_read)
+
+    def get_items_by_ids(self, item_ids, fields=None):
+        return self.service_controller.get_items_by_ids(self.recipe_controller.to_json(), item_ids, fields)
 
     def delete_item(self, item_id):
         return self.service_controller.delete_item(self.recipe_controller.to_json(), item_id)
 
-    def get_items(self, partition, reverse=True, start_key=None):  # New item will be on the top
-        return self.service_controller.get_items(self.recipe_controller.to_json(), partition, reverse, start_key)
+    def get_items(self, partition, reverse=True, start_key=None, since=None, until=None):  # New item will be on the top
+        return self.service_controller.get_items(self.recipe_controller.to_json(), partition, reverse, start_key,
+                                                 since, until)
+
+    def query_items(self, partition, conditions, reverse=False, start_key=None, limit=100):
+        return self.service_controller.query_items(self.recipe_controller.to_json(), partition, conditions,
+                                                   reverse, start_key, limit)
+
+    def get_index_statuses(self):
+        # Starts the next index change left by apply, DynamoDB runs one at a time
+        return self.service_controller.apply_indexes(self.recipe_controller)
+
+    def iter_items(self, partition, reverse=False, page_size=100):
+        return self.service_controller.iter_items(partition, reverse, page_size)
+
+    def export_partition(self, partition, file, file_format='ndjson', total_segments=4, checkpoint_path=None):
+        return self.service_controller.export_partition(partition, file, file_format, total_segments,
+                                                        checkpoint_path)
+
+    def import_partition(self, partition, file, file_format='ndjson', read_groups=['admin'], write_groups=['admin'],
+                         max_workers=8, on_progress=None, on_failure=None):
+        count_shards = {partition: self.recipe_controller.get_count_shards(partition)}
+        return self.service_controller.import_partition(partition, file, file_format, read_groups, write_groups,
+                                                        max_workers, count_shards, on_progress, on_failure)
 
     def get_item_count(self, partition):
         return self.service_controller.get_item_count(self.recipe_controller.to_json(), partition)
 
-    def search_items(self, query):
-        raise NotImplementedError()
+    def search_items(self, partition, query, start=0, limit=20):
+        return self.service_controller.search_items(self.recipe_controller.to_json(), partition, query,
+                                                    start, limit)
+
+    def reindex_partition(self, partition):
+        search_fields = self.recipe_controller.get_search_fields(partition)
+        return self.service_controller.reindex_partition(partition, search_fields)
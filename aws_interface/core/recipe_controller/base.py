@@ -27,6 +27,57 @@ class RecipeController(metaclass=ABCMeta):
     def get_recipe(self):
         return type(self).RECIPE
 
+    def set_transactional_writes(self, enabled):
+        """
+        Write items and their partition counts in one TransactWriteItems on this recipe's table.
+        Atomic and one round trip less, at twice the write capacity of the item.
+        """
+        self.data['transactional_writes'] = bool(enabled)
+        return True
+
+    def get_transactional_writes(self):
+        return self.data.get('transactional_writes', False)
+
+    def set_capacity(self, mode, read_capacity=1, write_capacity=1, max_read_capacity=None,
+                     max_write_capacity=None, target_utilization=70):
+        """
+        Capacity profile of this recipe's table and its indexes, applied on apply.
+
+        :param mode: 'PAY_PER_REQUEST' for on-demand or 'PROVISIONED'
+        :param read_capacity: Provisioned read capacity units, the minimum with autoscaling
+        :param write_capacity: Provisioned write capacity units, the minimum with autoscaling
+        :param max_read_capacity: Enables autoscaling up to this, with max_write_capacity
+        :param max_write_capacity: Enables autoscaling up to this, with max_read_capacity
+        :param target_utilization: Percentage of provisioned capacity autoscaling aims to consume
+        :return: False if the profile is invalid
+        """
+        if mode == 'PAY_PER_REQUEST':
+            self.data['capacity'] = {
+                'mode': mode,
+            }
+            return True
+        if mode != 'PROVISIONED' or read_capacity < 1 or write_capacity < 1:
+            return False
+        capacity = {
+            'mode': mode,
+            'read_capacity': read_capacity,
+            'write_capacity': write_capacity,
+        }
+        if max_read_capacity or max_write_capacity:
+            capacity['autoscaling'] = {
+                'max_read_capacity': max(max_read_capacity or read_capacity, read_capacity),
+                'max_write_capacity': max(max_write_capacity or write_capacity, write_capacity),
+                'target_utilization': target_utilization,
+            }
+        self.data['capacity'] = capacity
+        return True
+
+    def get_capacity(self):
+        """
+        :return: Capacity profile, None if the tables are left as they are
+        """
+        return self.data.get('capacity', None)
+
     def put_cloud_api(self, name, module, permissions=['all']):  # 'cloud.auth.login'
         """
         Activate cloud api (add field within recipe data dict)
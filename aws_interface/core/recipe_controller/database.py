@@ -1,5 +1,14 @@
+import re
+
 from .base import RecipeController
 
+# DynamoDB allows 20 global secondary indexes per table, partition-creationDate is one
+MAX_INDEXES = 19
+INDEX_TYPES = ('S', 'N')
+# Fields that cannot be indexed: system and permission fields, creationDate is always indexed
+RESERVED_INDEX_FIELDS = ('id', 'partition', 'creationDate', 'owner', 'read_groups', 'write_groups',
+                         '_version', 'update_date')
+
 
 class DatabaseRecipeController(RecipeController):
     RECIPE = 'database'
@@ -10,19 +19,23 @@ class DatabaseRecipeController(RecipeController):
 
     def _init_cloud_api(self):
         self.put_cloud_api('create_item', 'cloud.database.create_item')
+        self.put_cloud_api('create_items', 'cloud.database.create_items')
         self.put_cloud_api('delete_item', 'cloud.database.delete_item')
         self.put_cloud_api('get_item', 'cloud.database.get_item')
         self.put_cloud_api('get_items', 'cloud.database.get_items')
+        self.put_cloud_api('get_items_by_ids', 'cloud.database.get_items_by_ids')
         self.put_cloud_api('put_item_field', 'cloud.database.put_item_field')
         self.put_cloud_api('update_item', 'cloud.database.update_item')
         self.put_cloud_api('get_item_count', 'cloud.database.get_item_count')
+        self.put_cloud_api('query_items', 'cloud.database.query_items')
+        self.put_cloud_api('search_items', 'cloud.database.search_items')
 
     def put_partition(self, partition_name):
         if 'partitions' not in self.data:
             self.data['partitions'] = {}
-        self.data['partitions'][partition_name] = {
-            'name': partition_name
-        }
+        # Keep the settings of an existing partition, e.g. count_shards
+        partition = self.data['partitions'].setdefault(partition_name, {})
+        partition['name'] = partition_name
 
     def get_partitions(self):
         partitions = self.data.get('partitions', {})
@@ -38,3 +51,90 @@ class DatabaseRecipeController(RecipeController):
             self.data['partitions'] = {}
         self.data['partitions'].pop(partition_name)
         return True
+
+    def set_count_shards(self, partition_name, count_shards):
+        """
+        Spread the item count of a write-heavy partition over count_shards keys.
+        The number of shards can only grow, shards beyond it would no longer be read.
+        """
+        if count_shards < self.get_count_shards(partition_name):
+            return False
+        self.put_partition(partition_name)
+        self.data['partitions'][partition_name]['count_shards'] = count_shards
+        return True
+
+    def get_count_shards(self, partition_name):
+        partition = self.get_partition(partition_name) or {}
+        return partition.get('count_shards', 1)
+
+    def set_cache_ttl(self, partition_name, cache_ttl):
+        """
+        Let get_item serve items of partition from the cache of the Lambda container
+        for up to cache_ttl seconds after they were read. Writes of the same container
+        are seen at once, writes of other containers once the copy expires.
+
+        :param cache_ttl: Seconds, 0 disables the cache
+        """
+        if cache_ttl < 0:
+            return False
+        self.put_partition(partition_name)
+        self.data['partitions'][partition_name]['cache_ttl'] = cache_ttl
+        return True
+
+    def get_cache_ttl(self, partition_name):
+        partition = self.get_partition(partition_name) or {}
+        return partition.get('cache_ttl', 0)
+
+    def put_search_field(self, partition_name, field):
+        """
+        Index the words of a top-level string field of the items of partition for
+        search_items. Items written before are found once reindex_partition ran.
+        """
+        if field in RESERVED_INDEX_FIELDS or not re.match(r'^[A-Za-z0-9_]+$', field):
+            return False
+        self.put_partition(partition_name)
+        search_fields = self.data['partitions'][partition_name].setdefault('search_fields', [])
+        if field not in search_fields:
+            search_fields.append(field)
+        return True
+
+    def delete_search_field(self, partition_name, field):
+        partition = self.get_partition(partition_name) or {}
+        if field in partition.get('search_fields', []):
+            partition['search_fields'].remove(field)
+        return True
+
+    def get_search_fields(self, partition_name):
+        partition = self.get_partition(partition_name) or {}
+        return partition.get('search_fields', [])
+
+    def put_index(self, field, field_type='S'):
+        """
+        Index the items of every partition on a top-level field, so that query_items
+        finds them by equality, range or prefix of the field without reading the whole
+        partition. The index is created on the next apply. Items without the field
+        are left out of it, DynamoDB rejects items whose field has another type.
+
+        :param field_type: 'S' for strings or 'N' for numbers
+        :return: False if the index cannot be declared
+        """
+        indexes = self.data.setdefault('indexes', {})
+        if field_type not in INDEX_TYPES or field in RESERVED_INDEX_FIELDS:
+            return False
+        # Index names are partition-<field>
+        if not re.match(r'^[A-Za-z0-9_]+$', field):
+            return False
+        if field not in indexes and len(indexes) >= MAX_INDEXES:
+            return False
+        indexes[field] = field_type
+        return True
+
+    def delete_index(self, field):
+        self.data.setdefault('indexes', {}).pop(field, None)
+        return True
+
+    def get_indexes(self):
+        """
+        :return: {field: field_type}
+        """
+        return self.data.get('indexes', {})
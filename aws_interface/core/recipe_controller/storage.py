@@ -13,3 +13,4 @@ class StorageRecipeController(RecipeController):
         self.put_cloud_api('upload_file', 'cloud.storage.upload_file')
         self.put_cloud_api('delete_path', 'cloud.storage.delete_path')
         self.put_cloud_api('download_file', 'cloud.storage.download_file')
+        self.put_cloud_api('get_folder_list', 'cloud.storage.get_folder_list')
@@ -1,5 +1,9 @@
 import requests
+import base64
 import json
+import zlib
+
+ACCEPT_ENCODING = 'gzip, deflate'
 
 
 class Client():
@@ -35,9 +39,28 @@ class Client():
         data['cloud_api_name'] = api_name
         if self.session_id:
             data['session_id'] = self.session_id
+        data['accept_encoding'] = ACCEPT_ENCODING
         data = json.dumps(data)
         resp = _post(url, data)
-        return resp.json().get('body', {'error': '404', 'message': 'NO RESPONSE'})
+        return _decode_body(resp.json())
+
+    def _call_batch(self, recipe_key, calls, parallel=False):
+        """
+        Call several apis of the same recipe in a single request.
+
+        :param calls: List of (api_name, data) tuples
+        :param parallel: Let the server run the calls concurrently, only for calls
+        that do not depend on each other e.g. reads
+        :return: List of {'cloud_api_name', 'statusCode', 'body'} in the order of calls
+        """
+        response = self._call_api(recipe_key, 'batch', {
+            'calls': [{
+                'cloud_api_name': api_name,
+                'params': data or {},
+            } for api_name, data in calls],
+            'parallel': parallel,
+        })
+        return response.get('results', [])
 
     def _auth(self, api_name, data):
         return self._call_api('auth', api_name, data)
@@ -48,6 +71,15 @@ class Client():
     def _storage(self, api_name, data):
         return self._call_api('storage', api_name, data)
 
+    def auth_batch(self, calls, parallel=False):
+        return self._call_batch('auth', calls, parallel)
+
+    def database_batch(self, calls, parallel=False):
+        return self._call_batch('database', calls, parallel)
+
+    def storage_batch(self, calls, parallel=False):
+        return self._call_batch('storage', calls, parallel)
+
     def auth_register(self, email, password, extra={}):
         response = self._auth('register', {
             'email': email,
@@ -64,16 +96,22 @@ class Client():
         self.session_id = response.get('session_id', None)
         return response
 
-    def auth_get_user(self, user_id):
-        response = self._auth('get_user', {
+    def auth_get_user(self, user_id, fields=None):
+        data = {
             'user_id': user_id
-        })
+        }
+        if fields:
+            data['fields'] = fields
+        response = self._auth('get_user', data)
         return response
 
-    def auth_get_users(self, start_key=None):
-        response = self._auth('get_users', {
+    def auth_get_users(self, start_key=None, fields=None):
+        data = {
             'start_key': start_key,
-        })
+        }
+        if fields:
+            data['fields'] = fields
+        response = self._auth('get_users', data)
         return response
 
     def auth_logout(self):
@@ -102,22 +140,81 @@ class Client():
         })
         return response
 
-    def database_delete_item(self, item_id):
-        response = self._database('delete_item', {
-            'item_id': item_id
+    def database_create_items(self, items, partition, read_groups, write_groups):
+        response = self._database('create_items', {
+            'items': items,
+            'partition': partition,
+            'read_groups': read_groups,
+            'write_groups': write_groups,
         })
         return response
 
-    def database_get_item(self, item_id):
-        response = self._database('get_item', {
+    def database_delete_item(self, item_id, partition=None):
+        data = {
             'item_id': item_id
-        })
+        }
+        if partition:
+            data['partition'] = partition
+        response = self._database('delete_item', data)
+        return response
+
+    def database_get_item(self, item_id, fields=None, consistent_read=False):
+        data = {
+            'item_id': item_id
+        }
+        if fields:
+            data['fields'] = fields
+        if consistent_read:
+            data['consistent_read'] = consistent_read
+        response = self._database('get_item', data)
+        return response
+
+    def database_get_items_by_ids(self, item_ids, fields=None):
+        data = {
+            'item_ids': item_ids,
+        }
+        if fields:
+            data['fields'] = fields
+        response = self._database('get_items_by_ids', data)
         return response
 
-    def database_get_items(self, partition):
-        response = self._database('get_items', {
+    def database_get_items(self, partition, fields=None, since=None, until=None):
+        data = {
             'partition': partition
-        })
+        }
+        if fields:
+            data['fields'] = fields
+        if since is not None:
+            data['since'] = since
+        if until is not None:
+            data['until'] = until
+        response = self._database('get_items', data)
+        return response
+
+    def database_query_items(self, partition, conditions, start_key=None, limit=100, reverse=False, fields=None):
+        data = {
+            'partition': partition,
+            'conditions': conditions,
+            'limit': limit,
+            'reverse': reverse,
+        }
+        if start_key:
+            data['start_key'] = start_key
+        if fields:
+            data['fields'] = fields
+        response = self._database('query_items', data)
+        return response
+
+    def database_search_items(self, partition, query, start=0, limit=20, fields=None):
+        data = {
+            'partition': partition,
+            'query': query,
+            'start': start,
+            'limit': limit,
+        }
+        if fields:
+            data['fields'] = fields
+        response = self._database('search_items', data)
         return response
 
     def database_put_item_field(self, item_id, field_name, field_value):
@@ -176,6 +273,16 @@ class Client():
         return response
 
 
+def _decode_body(response):
+    body = response.get('body', {'error': '404', 'message': 'NO RESPONSE'})
+    encoding = response.get('headers', {}).get('Content-Encoding', None)
+    if encoding == 'gzip':
+        body = json.loads(zlib.decompress(base64.b64decode(body), 16 + zlib.MAX_WBITS).decode('utf-8'))
+    elif encoding == 'deflate':
+        body = json.loads(zlib.decompress(base64.b64decode(body)).decode('utf-8'))
+    return body
+
+
 def _post(url, data):
     response = requests.post(url, data)
     return response
@@ -10,6 +10,9 @@ class AuthServiceController(ServiceController):
         super(AuthServiceController, self).__init__(bundle, app_id)
         self._init_table()
 
+    def get_table_name(self):
+        return 'auth-{}'.format(self.app_id)
+
     def _init_table(self):
         dynamodb = DynamoDB(self.boto3_session)
         table_name = 'auth-' + self.app_id
@@ -77,6 +80,14 @@ class AuthServiceController(ServiceController):
         boto3 = self.boto3_session
         return method.do(data, boto3)
 
+    def iter_users(self, page_size=100):
+        """
+        Stream every user, one Query page in memory at a time.
+        """
+        dynamodb = DynamoDB(self.boto3_session)
+        table_name = 'auth-{}'.format(self.app_id)
+        return dynamodb.iter_items(table_name, 'user', page_size=page_size)
+
     @lambda_method
     def get_users(self, recipe, start_key, limit):
         import cloud.auth.get_users as method
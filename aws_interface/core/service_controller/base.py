@@ -1,47 +1,45 @@
 import importlib
 import os
-import shutil
 from abc import ABCMeta
 import boto3
 from cloud.aws import *
+from .packager import build_package
 
 
-def create_lambda_zipfile_bin(app_id, recipe, dir_name, root_name='cloud'):
-    output_filename = tempfile.mktemp()
-
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        # Copy lambda dir into temp/root_name folder
-        shutil.copytree(dir_name, '{}/{}'.format(tmp_dir, root_name))
-
-        # Copy recipe from recipe_controller
-        with open(os.path.join(tmp_dir, root_name, 'recipe.json'), 'w+') as file:
-            file.write(recipe)
+def create_lambda_zipfile_bin(app_id, recipe, dir_name, root_name='cloud', runtime=None, measure=False):
+    """
+    Build the lambda package of a recipe. Only the modules reachable from the recipe's
+    cloud_apis are included, see packager.build_package.
 
-        # Write txt file included app_id
-        with open(os.path.join(tmp_dir, root_name, 'app_id.txt'), 'w+') as file:
-            file.write(app_id)
+    :return: (zip_file_bin, report)
+    """
+    extra_files = {
+        'recipe.json': recipe,
+        'app_id.txt': app_id,
+    }
+    return build_package(extra_files, recipe, dir_name, root_name, runtime, measure)
 
-        # Archive all files
-        shutil.make_archive(output_filename, 'zip', tmp_dir)
-        zip_file_name = '{}.zip'.format(output_filename)
-        zip_file = open(zip_file_name, 'rb')
-        zip_file_bin = zip_file.read()
-        zip_file.close()
 
-    # Remove temp files
-    os.remove(zip_file_name)
-    return zip_file_bin
+_boto3_sessions = {}
 
 
 def get_boto3_session(bundle):
+    """
+    Return a boto3 session for the credentials. Sessions are reused across service
+    controllers so that the clients cached in cloud.aws.client_pool are shared too.
+    """
     access_key = bundle['access_key']
     secret_key = bundle['secret_key']
     region_name = bundle.get('region_name', 'ap-northeast-2')  # TODO
-    session = boto3.Session(
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        region_name=region_name,
-    )
+    key = (access_key, secret_key, region_name)
+    session = _boto3_sessions.get(key, None)
+    if session is None:
+        session = boto3.Session(
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region_name,
+        )
+        session = _boto3_sessions.setdefault(key, session)
     return session
 
 
@@ -50,6 +48,8 @@ class ServiceController(metaclass=ABCMeta):
     Make sure to set RECIPE when you inherit this class.
     """
     RECIPE = None
+    # Measure import time of the lambda package against the full cloud package on apply
+    MEASURE_PACKAGE = False
 
     def __init__(self, bundle, app_id):
         """
@@ -94,7 +94,9 @@ class ServiceController(metaclass=ABCMeta):
         module_path = os.path.dirname(module.__file__)
 
         recipe = recipe_controller.to_json()
-        zip_file = create_lambda_zipfile_bin(self.app_id, recipe, module_path)
+        zip_file, report = create_lambda_zipfile_bin(self.app_id, recipe, module_path, runtime=runtime,
+                                                     measure=type(self).MEASURE_PACKAGE)
+        print('[{}:{}] apply_cloud_api: PACKAGE {}'.format(self.app_id, recipe_type, report))
 
         success = True
         try:
@@ -140,6 +142,32 @@ class ServiceController(metaclass=ABCMeta):
         api_url = api_client.get_rest_api_url(api_name, func_name)
         return api_url
 
+    def get_table_name(self):
+        """
+        :return: DynamoDB table of the recipe, None if it has none
+        """
+        return None
+
+    def apply_capacity(self, recipe_controller):
+        """
+        Make the table of the recipe and its indexes match the capacity profile of the
+        recipe, see RecipeController.set_capacity. Safe to run on every apply, only
+        what differs is changed.
+        """
+        table_name = self.get_table_name()
+        capacity = recipe_controller.get_capacity()
+        if not table_name or not capacity:
+            return
+        recipe_type = recipe_controller.get_recipe()
+        print('[{}:{}] apply_capacity: START'.format(self.app_id, recipe_type))
+        dynamodb = DynamoDB(self.boto3_session)
+        autoscaling = ApplicationAutoScaling(self.boto3_session)
+        changes = dynamodb.apply_capacity(table_name, capacity)
+        changes += autoscaling.apply_dynamodb_capacity(table_name, dynamodb.get_index_names(table_name), capacity)
+        for change in changes:
+            print('[{}:{}] apply_capacity: {}'.format(self.app_id, recipe_type, change))
+        print('[{}:{}] apply_capacity: {}'.format(self.app_id, recipe_type, 'COMPLETE' if changes else 'UNCHANGED'))
+
     def apply(self, recipe_controller):
         """
         Apply/deploy the recipe to AWS backend services. This includes
@@ -151,5 +179,6 @@ class ServiceController(metaclass=ABCMeta):
         :param recipe_controller:
         :return:
         """
+        self.apply_capacity(recipe_controller)
         self.apply_cloud_api(recipe_controller)
         self.deploy_cloud_api(recipe_controller)
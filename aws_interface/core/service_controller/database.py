@@ -2,6 +2,9 @@ from .base import ServiceController
 from .utils import lambda_method, make_data
 
 from cloud.aws import *
+from cloud.export import get_writer, load_checkpoint, save_checkpoint
+from cloud.importer import import_records, iter_records
+from cloud.search import reindex_items
 
 
 class DatabaseServiceController(ServiceController):
@@ -11,6 +14,9 @@ class DatabaseServiceController(ServiceController):
         super(DatabaseServiceController, self).__init__(bundle, app_id)
         self._init_table()
 
+    def get_table_name(self):
+        return 'database-{}'.format(self.app_id)
+
     def _init_table(self):
         dynamodb = DynamoDB(self.boto3_session)
         table_name = 'database-{}'.format(self.app_id)
@@ -20,6 +26,53 @@ class DatabaseServiceController(ServiceController):
     def common_apply(self, recipe_controller):
         return
 
+    def apply(self, recipe_controller):
+        self.apply_indexes(recipe_controller)
+        super(DatabaseServiceController, self).apply(recipe_controller)
+
+    def apply_indexes(self, recipe_controller):
+        """
+        Create the indexes declared with DatabaseRecipeController.put_index and delete
+        the ones no longer declared. DynamoDB changes one index at a time and a change
+        takes minutes, so at most one change is started and this returns without waiting.
+        The next change is started by a later call once the table is idle.
+
+        :return: {index_name: status}, PENDING for declared indexes not created yet
+        """
+        dynamodb = DynamoDB(self.boto3_session)
+        table_name = self.get_table_name()
+        declared = dict((get_index_name(field), (field, field_type))
+                        for field, field_type in recipe_controller.get_indexes().items())
+        statuses = dynamodb.get_index_statuses(table_name)
+        busy = any(status != 'ACTIVE' for status in statuses.values())
+        undeclared = [index_name for index_name in statuses
+                      if index_name != DEFAULT_INDEX and index_name not in declared]
+        missing = [index_name for index_name in declared if index_name not in statuses]
+        if not busy and undeclared:
+            print('[{}:database] apply_indexes: DELETE {}'.format(self.app_id, undeclared[0]))
+            dynamodb.delete_index(table_name, undeclared[0])
+            statuses = dynamodb.get_index_statuses(table_name)
+        elif not busy and missing:
+            field, field_type = declared[missing[0]]
+            print('[{}:database] apply_indexes: CREATE {}'.format(self.app_id, missing[0]))
+            dynamodb.update_table(table_name, indexes=[{
+                'hash_key': 'partition',
+                'hash_key_type': 'S',
+                'sort_key': field,
+                'sort_key_type': field_type,
+            }], capacity=recipe_controller.get_capacity())
+            statuses = dynamodb.get_index_statuses(table_name)
+        for index_name in declared:
+            statuses.setdefault(index_name, 'PENDING')
+        return statuses
+
+    def get_index_statuses(self):
+        """
+        :return: {index_name: status}, query_items can use an index once it is ACTIVE
+        """
+        dynamodb = DynamoDB(self.boto3_session)
+        return dynamodb.get_index_statuses(self.get_table_name())
+
     @lambda_method
     def create_item(self, recipe, partition, item, read_groups, write_groups):
         import cloud.database.create_item as method
@@ -33,6 +86,19 @@ class DatabaseServiceController(ServiceController):
         boto3 = self.boto3_session
         return method.do(data, boto3)
 
+    @lambda_method
+    def create_items(self, recipe, partition, items, read_groups, write_groups):
+        import cloud.database.create_items as method
+        params = {
+            'partition': partition,
+            'items': items,
+            'read_groups': read_groups,
+            'write_groups': write_groups,
+        }
+        data = make_data(self.app_id, params, recipe)
+        boto3 = self.boto3_session
+        return method.do(data, boto3)
+
     @lambda_method
     def update_item(self, recipe, item_id, item, read_groups, write_groups):
         import cloud.database.update_item as method
@@ -59,10 +125,22 @@ class DatabaseServiceController(ServiceController):
         return method.do(data, boto3)
 
     @lambda_method
-    def get_item(self, recipe, item_id):
+    def get_item(self, recipe, item_id, consistent_read=False):
         import cloud.database.get_item as method
         params = {
             'item_id': item_id,
+            'consistent_read': consistent_read,
+        }
+        data = make_data(self.app_id, params, recipe)
+        boto3 = self.boto3_session
+        return method.do(data, boto3)
+
+    @lambda_method
+    def get_items_by_ids(self, recipe, item_ids, fields=None):
+        import cloud.database.get_items_by_ids as method
+        params = {
+            'item_ids': item_ids,
+            'fields': fields,
         }
         data = make_data(self.app_id, params, recipe)
         boto3 = self.boto3_session
@@ -79,17 +157,118 @@ class DatabaseServiceController(ServiceController):
         return method.do(data, boto3)
 
     @lambda_method
-    def get_items(self, recipe, partition, reverse, start_key):
+    def get_items(self, recipe, partition, reverse, start_key, since=None, until=None):
         import cloud.database.get_items as method
         params = {
             'partition': partition,
             'reverse': reverse,
             'start_key': start_key,
+            'since': since,
+            'until': until,
+        }
+        data = make_data(self.app_id, params, recipe)
+        boto3 = self.boto3_session
+        return method.do(data, boto3)
+
+    @lambda_method
+    def query_items(self, recipe, partition, conditions, reverse, start_key, limit):
+        import cloud.database.query_items as method
+        params = {
+            'partition': partition,
+            'conditions': conditions,
+            'reverse': reverse,
+            'start_key': start_key,
+            'limit': limit,
         }
         data = make_data(self.app_id, params, recipe)
         boto3 = self.boto3_session
         return method.do(data, boto3)
 
+    @lambda_method
+    def search_items(self, recipe, partition, query, start, limit):
+        import cloud.database.search_items as method
+        params = {
+            'partition': partition,
+            'query': query,
+            'start': start,
+            'limit': limit,
+        }
+        data = make_data(self.app_id, params, recipe)
+        boto3 = self.boto3_session
+        return method.do(data, boto3)
+
+    def reindex_partition(self, partition, search_fields):
+        """
+        Index the search fields of the items written before they were declared.
+
+        :return: (items indexed, postings that could not be written)
+        """
+        dynamodb = DynamoDB(self.boto3_session)
+        table_name = 'database-{}'.format(self.app_id)
+        items = dynamodb.iter_items(table_name, partition, page_size=1000)
+        return reindex_items(dynamodb, table_name, partition, items, search_fields)
+
+    def iter_items(self, partition, reverse=False, page_size=100):
+        """
+        Stream every item of partition, one Query page in memory at a time.
+        """
+        dynamodb = DynamoDB(self.boto3_session)
+        table_name = 'database-{}'.format(self.app_id)
+        return dynamodb.iter_items(table_name, partition, page_size=page_size, reverse=reverse)
+
+    def export_partition(self, partition, file, file_format='ndjson', total_segments=DynamoDB.EXPORT_SEGMENTS,
+                         checkpoint_path=None):
+        """
+        Write every item of partition to file with a parallel segmented Scan.
+
+        :param file: Text file open for writing, in append mode when resuming
+        :param file_format: 'ndjson' or 'csv'
+        :param checkpoint_path: Progress is saved there after every page. If it exists,
+        the export resumes from it, pages written after the last save are written again.
+        :return: Number of items written
+        """
+        dynamodb = DynamoDB(self.boto3_session)
+        table_name = 'database-{}'.format(self.app_id)
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint:
+            if checkpoint['partition'] != partition or checkpoint['format'] != file_format:
+                raise ValueError('Checkpoint {} belongs to the {} export of {}'.format(
+                    checkpoint_path, checkpoint['format'], checkpoint['partition']))
+            # Segments only line up with the segment count they were started with
+            total_segments = int(checkpoint['total_segments'])
+        else:
+            checkpoint = {
+                'partition': partition,
+                'format': file_format,
+                'total_segments': total_segments,
+                'segments': {},
+            }
+        writer = get_writer(file_format, file, checkpoint.get('columns', None))
+
+        def on_checkpoint(segments):
+            if checkpoint_path:
+                checkpoint['columns'] = writer.columns
+                save_checkpoint(checkpoint_path, checkpoint)
+
+        return dynamodb.export_items(table_name, writer.write, partition, total_segments,
+                                     checkpoint['segments'], on_checkpoint)
+
+    def import_partition(self, partition, file, file_format='ndjson', read_groups=['admin'], write_groups=['admin'],
+                         max_workers=8, count_shards=None, on_progress=None, on_failure=None):
+        """
+        Write the records of file to partition with BatchWriteItem, see cloud.importer.
+
+        :param file: Text file of newline-delimited JSON or CSV, read lazily
+        :param count_shards: {partition: count_shards} of the recipe
+        :return: Report dict with read, imported, failed and throttled counts and failures
+        """
+        dynamodb = DynamoDB(self.boto3_session, count_shards=count_shards)
+        table_name = 'database-{}'.format(self.app_id)
+        owner = 'admin-{}'.format(self.app_id)
+        records = iter_records(file, file_format)
+        return import_records(dynamodb, table_name, partition, records, owner, read_groups, write_groups,
+                              max_workers, on_progress, on_failure)
+
     @lambda_method
     def get_item_count(self, recipe, partition):
         import cloud.database.get_item_count as method
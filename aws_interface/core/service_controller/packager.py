@@ -0,0 +1,174 @@
+import ast
+import importlib.util
+import json
+import os
+import py_compile
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Modules the lambda function needs regardless of the recipe
+ENTRY_MODULES = ('cloud.lambda_function',)
+
+_IMPORT_TIME_SCRIPT = '''
+import importlib, sys, time
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+print(time.perf_counter() - start)
+'''
+
+
+def _get_module_path(root_dir, root_name, module_name):
+    parts = module_name.split('.')
+    if parts[0] != root_name:
+        return None
+    path = os.path.join(root_dir, *parts[1:])
+    if os.path.isfile(path + '.py'):
+        return path + '.py'
+    if os.path.isfile(os.path.join(path, '__init__.py')):
+        return os.path.join(path, '__init__.py')
+    return None
+
+
+def _get_imported_modules(path, root_name):
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            yield node.module
+            # from cloud.auth import login imports the cloud.auth.login module
+            for alias in node.names:
+                yield '{}.{}'.format(node.module, alias.name)
+
+
+def find_modules(recipe, root_dir, root_name='cloud'):
+    """
+    Find the modules of the root package that the recipe's cloud_apis and the lambda
+    handler import, directly or transitively.
+
+    :param recipe: Recipe json string
+    :param root_dir: Directory of the root package
+    :param root_name: Name of the root package
+    :return: Dict of module name to source path, including the parent packages
+    """
+    recipe = json.loads(recipe)
+    queue = list(ENTRY_MODULES)
+    queue += [cloud_api['module'] for cloud_api in recipe.get('cloud_apis', {}).values()]
+    modules = {}
+    while queue:
+        module_name = queue.pop()
+        if module_name in modules:
+            continue
+        path = _get_module_path(root_dir, root_name, module_name)
+        if not path:
+            continue
+        modules[module_name] = path
+        parent_name = module_name.rpartition('.')[0]
+        if parent_name:
+            queue.append(parent_name)
+        for imported in _get_imported_modules(path, root_name):
+            if imported == root_name or imported.startswith(root_name + '.'):
+                queue.append(imported)
+    return modules
+
+
+def compile_modules(package_dir, paths):
+    """
+    Precompile sources into __pycache__. Hash based pycs are used where supported,
+    because the archive does not keep exact source timestamps.
+    """
+    kwargs = {}
+    if hasattr(py_compile, 'PycInvalidationMode'):
+        kwargs['invalidation_mode'] = py_compile.PycInvalidationMode.UNCHECKED_HASH
+    for path in paths:
+        path = os.path.join(package_dir, path)
+        # Zip archives store even-second timestamps only
+        mtime = int(os.path.getmtime(path)) // 2 * 2
+        os.utime(path, (mtime, mtime))
+        py_compile.compile(path, cfile=importlib.util.cache_from_source(path), doraise=True, **kwargs)
+
+
+def measure_import_time(package_dir, module_names):
+    """
+    Import the modules in a fresh interpreter whose working directory is package_dir.
+
+    :return: Seconds spent importing, or None if the interpreter failed
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    try:
+        output = subprocess.check_output([sys.executable, '-E', '-c', _IMPORT_TIME_SCRIPT] + list(module_names),
+                                         cwd=package_dir, env=env, stderr=subprocess.DEVNULL)
+        return float(output.decode('utf-8').strip().splitlines()[-1])
+    except (subprocess.CalledProcessError, ValueError, IndexError):
+        return None
+
+
+def _get_dir_size(dir_name, skip_cache=False):
+    size = 0
+    for base, dir_names, file_names in os.walk(dir_name):
+        if skip_cache and '__pycache__' in dir_names:
+            dir_names.remove('__pycache__')
+        for file_name in file_names:
+            size += os.path.getsize(os.path.join(base, file_name))
+    return size
+
+
+def _archive(package_dir):
+    output_filename = tempfile.mktemp()
+    shutil.make_archive(output_filename, 'zip', package_dir)
+    zip_file_name = '{}.zip'.format(output_filename)
+    with open(zip_file_name, 'rb') as f:
+        zip_file_bin = f.read()
+    os.remove(zip_file_name)
+    return zip_file_bin
+
+
+def build_package(extra_files, recipe, dir_name, root_name='cloud', runtime=None, measure=False):
+    """
+    Build a lambda package containing only the modules used by the recipe.
+
+    :param extra_files: Dict of file name to content, written into the root package
+    :param recipe: Recipe json string
+    :param dir_name: Directory of the root package
+    :param root_name: Name of the root package
+    :param runtime: Lambda runtime, e.g. 'python3.6'. Bytecode is shipped only when
+    the running interpreter has the same version.
+    :param measure: Measure import time against a full, uncompiled package
+    :return: (zip_file_bin, report)
+    """
+    modules = find_modules(recipe, dir_name, root_name)
+    paths = sorted(set(os.path.join(root_name, os.path.relpath(path, dir_name)) for path in modules.values()))
+    compiled = runtime == 'python{}.{}'.format(*sys.version_info[:2])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for path in paths:
+            os.makedirs(os.path.join(tmp_dir, os.path.dirname(path)), exist_ok=True)
+            shutil.copy2(os.path.join(dir_name, os.path.relpath(path, root_name)), os.path.join(tmp_dir, path))
+        for file_name, content in extra_files.items():
+            with open(os.path.join(tmp_dir, root_name, file_name), 'w+') as file:
+                file.write(content)
+        if compiled:
+            compile_modules(tmp_dir, paths)
+        zip_file_bin = _archive(tmp_dir)
+
+        report = {
+            'modules': len(modules),
+            'compiled': compiled,
+            'package_size': len(zip_file_bin),
+            'unpacked_size': _get_dir_size(tmp_dir),
+            'full_unpacked_size': _get_dir_size(dir_name, skip_cache=True),
+        }
+        if measure:
+            import_names = list(ENTRY_MODULES)
+            import_names += [name for name in modules if name not in import_names]
+            with tempfile.TemporaryDirectory() as full_dir:
+                ignore = shutil.ignore_patterns('__pycache__', '*.pyc')
+                shutil.copytree(dir_name, os.path.join(full_dir, root_name), ignore=ignore)
+                report['import_time'] = measure_import_time(tmp_dir, import_names)
+                report['full_import_time'] = measure_import_time(full_dir, import_names)
+    return zip_file_bin, report
@@ -17,6 +17,9 @@ class StorageServiceController(ServiceController):
         bucket_name = 'storage-{}'.format(self.app_id)
         s3.init_bucket(bucket_name)
 
+    def get_table_name(self):
+        return 'storage-{}'.format(self.app_id)
+
     def _init_table(self):
         dynamodb = DynamoDB(self.boto3_session)
         table_name = 'storage-{}'.format(self.app_id)
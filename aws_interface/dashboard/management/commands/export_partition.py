@@ -0,0 +1,35 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from cloud.aws import DynamoDB
+from cloud.export import FORMATS
+from dashboard.management.utils import get_api
+
+
+class Command(BaseCommand):
+    help = 'Export the items of a database partition to newline-delimited JSON or CSV. ' \
+           'An interrupted export resumes from its checkpoint when run again.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_id')
+        parser.add_argument('partition')
+        parser.add_argument('output', help='File to write, appended to when the export resumes')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--segments', type=int, default=DynamoDB.EXPORT_SEGMENTS,
+                            help='Scan segments read in parallel')
+        parser.add_argument('--checkpoint', default=None, help='Defaults to <output>.checkpoint')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        checkpoint_path = options['checkpoint'] or '{}.checkpoint'.format(output)
+        resume = os.path.exists(checkpoint_path)
+        api = get_api(options['app_id'], 'database')
+        with open(output, 'a' if resume else 'w', newline='', encoding='utf-8') as f:
+            count = api.export_partition(options['partition'], f, options['format'], options['segments'],
+                                         checkpoint_path)
+        # The export is complete, a later run starts over
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write('{} {} items of {} to {}'.format(
+            'Resumed, exported' if resume else 'Exported', count, options['partition'], output))
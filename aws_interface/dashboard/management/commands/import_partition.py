@@ -0,0 +1,49 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from cloud.export import FORMATS
+from dashboard.management.utils import get_api
+
+
+class Command(BaseCommand):
+    help = 'Import newline-delimited JSON or CSV records into a database partition.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_id')
+        parser.add_argument('partition')
+        parser.add_argument('input', help='File to read, - for stdin')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--workers', type=int, default=8, help='Maximum concurrent batch writes')
+        parser.add_argument('--read-groups', nargs='*', default=['admin'])
+        parser.add_argument('--write-groups', nargs='*', default=['admin'])
+        parser.add_argument('--errors', default=None,
+                            help='Write a json line per failed record to this file, defaults to <input>.errors')
+
+    def handle(self, *args, **options):
+        api = get_api(options['app_id'], 'database')
+        source = options['input']
+        errors_path = options['errors'] or ('import.errors' if source == '-' else '{}.errors'.format(source))
+
+        def on_progress(report):
+            self.stderr.write('read {read}, imported {imported}, failed {failed}, '
+                              'throttled {throttled}, concurrency {concurrency}'.format(**report))
+
+        with open(errors_path, 'w', encoding='utf-8') as errors:
+            def on_failure(line_number, error):
+                errors.write(json.dumps({'line': line_number, 'error': error}))
+                errors.write('\n')
+
+            f = sys.stdin if source == '-' else open(source, 'r', newline='', encoding='utf-8')
+            try:
+                report = api.import_partition(options['partition'], f, options['format'],
+                                              options['read_groups'], options['write_groups'],
+                                              options['workers'], on_progress, on_failure)
+            finally:
+                if f is not sys.stdin:
+                    f.close()
+        self.stdout.write('Imported {imported} of {read} records into {partition} in {elapsed:.1f}s, '
+                          '{failed} failed, see {errors}'.format(partition=options['partition'],
+                                                                 errors=errors_path, **report))
+
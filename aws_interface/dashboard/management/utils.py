@@ -0,0 +1,37 @@
+import getpass
+import os
+
+from django.core.management.base import CommandError
+
+from dashboard.models import App
+
+
+def get_credentials(app):
+    """
+    AWS credentials of app. AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY are used when
+    set, so commands can run unattended. Otherwise the keys of the app owner are
+    decrypted with a password prompted for.
+    """
+    access_key = os.environ.get('AWS_ACCESS_KEY_ID', None)
+    secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY', None)
+    if access_key and secret_key:
+        return {
+            'access_key': access_key,
+            'secret_key': secret_key,
+        }
+    password = getpass.getpass('Password of {}: '.format(app.user.email))
+    if not app.user.check_password(password):
+        raise CommandError('Wrong password')
+    return {
+        'access_key': app.user.get_aws_access_key(password),
+        'secret_key': app.user.get_aws_secret_key(password),
+    }
+
+
+def get_api(app_id, recipe_name):
+    try:
+        app = App.objects.get(id=app_id)
+    except App.DoesNotExist:
+        raise CommandError('App {} does not exist'.format(app_id))
+    recipe = app.recipe_set.get(name=recipe_name)
+    return recipe.get_api(get_credentials(app))
@@ -0,0 +1,61 @@
+"""
+Fixtures running the cloud_api modules against the in-memory AWS of fake_aws.
+"""
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TEST_DIR), 'aws_interface'))
+sys.path.insert(0, TEST_DIR)
+
+import pytest
+
+from cloud.aws import item_cache
+from cloud.recipe_store import RecipeStore
+from core.recipe_controller import DatabaseRecipeController
+from core.service_controller.database import DatabaseServiceController
+from fake_aws import FakeBoto3
+
+APP_ID = 'test'
+
+
+@pytest.fixture
+def boto3():
+    item_cache.clear()
+    return FakeBoto3()
+
+
+@pytest.fixture
+def database(boto3):
+    """
+    :return: DatabaseServiceController with its tables created in boto3
+    """
+    controller = object.__new__(DatabaseServiceController)
+    controller.boto3_session = boto3
+    controller.app_id = APP_ID
+    controller._init_table()
+    return controller
+
+
+@pytest.fixture
+def recipe_controller():
+    return DatabaseRecipeController()
+
+
+@pytest.fixture
+def call(boto3, database, recipe_controller):
+    """
+    :return: call(module, params, user=None), the body a cloud_api module returns
+    for a recipe frozen like the one the lambda function serves
+    """
+    def call(module, params, user=None):
+        recipe = RecipeStore(recipe_controller.data, APP_ID).recipe
+        data = {
+            'params': params,
+            'recipe': recipe,
+            'app_id': APP_ID,
+            'admin': False,
+            'user': user or {'id': 'user', 'group': 'user'},
+        }
+        return module.do(data, boto3)['body']
+    return call
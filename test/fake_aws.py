@@ -0,0 +1,1026 @@
+"""
+In-memory stand-ins for the parts of DynamoDB, S3 and Application Auto Scaling that cloud.aws uses.
+
+FakeBoto3 can be passed wherever cloud.aws expects a boto3 module or session.
+It counts every request per service operation, and per tag when the calling
+thread has set one with FakeBoto3.set_tag.
+"""
+import copy
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def _client_error(code, operation, message=''):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def _response(**fields):
+    fields['ResponseMetadata'] = {'HTTPStatusCode': 200}
+    return fields
+
+
+def serialize_item(item):
+    return dict((key, _serializer.serialize(value)) for key, value in item.items())
+
+
+def deserialize_item(item):
+    return dict((key, _deserializer.deserialize(value)) for key, value in item.items())
+
+
+def normalize_item(item):
+    """
+    Round trip through the DynamoDB type system like the real service does,
+    so that ints come back as Decimal and floats are rejected.
+    """
+    return deserialize_item(serialize_item(item))
+
+
+# Expressions
+
+_TOKEN_RE = re.compile(r'\s*(?:(<>|<=|>=|[=<>(),.\[\]+-])|(#\w+)|(:\w+)|(\d+)|([A-Za-z_][\w]*))')
+_KEYWORDS = ('AND', 'OR', 'NOT', 'BETWEEN', 'IN', 'SET', 'REMOVE', 'ADD', 'DELETE')
+_MISSING = object()
+
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN_RE.match(expression, position)
+        if not match or match.end() == position:
+            raise ValueError('Invalid expression: {}'.format(expression))
+        position = match.end()
+        operator, name, value, number, word = match.groups()
+        if operator:
+            tokens.append(('op', operator))
+        elif name:
+            tokens.append(('name', name))
+        elif value:
+            tokens.append(('value', value))
+        elif number:
+            tokens.append(('number', int(number)))
+        elif word.upper() in _KEYWORDS:
+            tokens.append(('keyword', word.upper()))
+        else:
+            tokens.append(('word', word))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, expression, names, values):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset=0):
+        if self.position + offset < len(self.tokens):
+            return self.tokens[self.position + offset]
+        return (None, None)
+
+    def take(self, kind=None, text=None):
+        token = self.peek()
+        if (kind and token[0] != kind) or (text and token[1] != text):
+            raise ValueError('Unexpected token {}, expected {} {}'.format(token, kind, text))
+        self.position += 1
+        return token
+
+    def accept(self, kind, text=None):
+        token = self.peek()
+        if token[0] == kind and (text is None or token[1] == text):
+            self.position += 1
+            return True
+        return False
+
+    # Paths and operands
+
+    def parse_path(self):
+        kind, text = self.take()
+        if kind == 'name':
+            parts = [self.names[text]]
+        elif kind == 'word':
+            parts = [text]
+        else:
+            raise ValueError('Invalid path token {}'.format(text))
+        while True:
+            if self.accept('op', '.'):
+                kind, text = self.take()
+                parts.append(self.names[text] if kind == 'name' else text)
+            elif self.accept('op', '['):
+                parts.append(self.take('number')[1])
+                self.take('op', ']')
+            else:
+                return tuple(parts)
+
+    def parse_operand(self):
+        kind, text = self.peek()
+        if kind == 'value':
+            self.take()
+            value = self.values[text]
+            return lambda item: value
+        if kind == 'word' and self.peek(1) == ('op', '('):
+            return self.parse_function()
+        path = self.parse_path()
+        return lambda item: get_path(item, path)
+
+    def parse_function(self):
+        name = self.take('word')[1]
+        self.take('op', '(')
+        if name in ('attribute_exists', 'attribute_not_exists'):
+            path = self.parse_path()
+            self.take('op', ')')
+            if name == 'attribute_exists':
+                return lambda item: get_path(item, path) is not _MISSING
+            return lambda item: get_path(item, path) is _MISSING
+        if name == 'size':
+            operand = self.parse_operand()
+            self.take('op', ')')
+            return lambda item: len(operand(item))
+        if name == 'if_not_exists':
+            path = self.parse_path()
+            self.take('op', ',')
+            default = self.parse_operand()
+            self.take('op', ')')
+
+            def if_not_exists(item):
+                value = get_path(item, path)
+                return default(item) if value is _MISSING else value
+            return if_not_exists
+        if name == 'list_append':
+            first = self.parse_operand()
+            self.take('op', ',')
+            second = self.parse_operand()
+            self.take('op', ')')
+            return lambda item: list(first(item)) + list(second(item))
+        if name in ('contains', 'begins_with', 'attribute_type'):
+            first = self.parse_operand()
+            self.take('op', ',')
+            second = self.parse_operand()
+            self.take('op', ')')
+            if name == 'contains':
+                def contains(item):
+                    container = first(item)
+                    if container is _MISSING:
+                        return False
+                    return second(item) in container
+                return contains
+            if name == 'begins_with':
+                def begins_with(item):
+                    value = first(item)
+                    return isinstance(value, str) and value.startswith(second(item))
+                return begins_with
+            return lambda item: True
+        raise ValueError('Unsupported function {}'.format(name))
+
+    # Conditions
+
+    def parse_condition(self):
+        condition = self.parse_and()
+        while self.accept('keyword', 'OR'):
+            left, right = condition, self.parse_and()
+            condition = (lambda l, r: lambda item: l(item) or r(item))(left, right)
+        return condition
+
+    def parse_and(self):
+        condition = self.parse_not()
+        while self.accept('keyword', 'AND'):
+            left, right = condition, self.parse_not()
+            condition = (lambda l, r: lambda item: l(item) and r(item))(left, right)
+        return condition
+
+    def parse_not(self):
+        if self.accept('keyword', 'NOT'):
+            condition = self.parse_not()
+            return lambda item: not condition(item)
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        if self.peek() == ('op', '('):
+            self.take()
+            condition = self.parse_condition()
+            self.take('op', ')')
+            return condition
+        left = self.parse_operand()
+        kind, text = self.peek()
+        if kind == 'op' and text in ('=', '<>', '<', '<=', '>', '>='):
+            self.take()
+            right = self.parse_operand()
+            return lambda item: _compare(text, left(item), right(item))
+        if kind == 'keyword' and text == 'BETWEEN':
+            self.take()
+            low = self.parse_operand()
+            self.take('keyword', 'AND')
+            high = self.parse_operand()
+            return lambda item: _compare('>=', left(item), low(item)) and _compare('<=', left(item), high(item))
+        if kind == 'keyword' and text == 'IN':
+            self.take()
+            self.take('op', '(')
+            candidates = [self.parse_operand()]
+            while self.accept('op', ','):
+                candidates.append(self.parse_operand())
+            self.take('op', ')')
+            return lambda item: any(_compare('=', left(item), c(item)) for c in candidates)
+        # Function conditions such as attribute_exists(a)
+        return lambda item: bool(left(item))
+
+    # Updates
+
+    def parse_update(self):
+        actions = []
+        while self.peek()[0] is not None:
+            clause = self.take('keyword')[1]
+            while True:
+                path = self.parse_path()
+                if clause == 'SET':
+                    self.take('op', '=')
+                    actions.append(('SET', path, self.parse_set_value()))
+                elif clause == 'REMOVE':
+                    actions.append(('REMOVE', path, None))
+                else:
+                    actions.append((clause, path, self.parse_operand()))
+                if not self.accept('op', ','):
+                    break
+        return actions
+
+    def parse_set_value(self):
+        value = self.parse_operand()
+        kind, text = self.peek()
+        if kind == 'op' and text in ('+', '-'):
+            self.take()
+            other = self.parse_operand()
+            if text == '+':
+                return lambda item: value(item) + other(item)
+            return lambda item: value(item) - other(item)
+        return value
+
+
+def _compare(operator, left, right):
+    if left is _MISSING or right is _MISSING:
+        return operator == '<>' and left is not right
+    try:
+        if operator == '=':
+            return left == right
+        if operator == '<>':
+            return left != right
+        if operator == '<':
+            return left < right
+        if operator == '<=':
+            return left <= right
+        if operator == '>':
+            return left > right
+        return left >= right
+    except TypeError:
+        return False
+
+
+def get_path(item, path):
+    value = item
+    for part in path:
+        try:
+            value = value[part]
+        except (KeyError, IndexError, TypeError):
+            return _MISSING
+    return value
+
+
+def _set_path(item, path, value):
+    target = item
+    for part in path[:-1]:
+        try:
+            target = target[part]
+        except (KeyError, IndexError, TypeError):
+            raise _client_error('ValidationException', 'UpdateItem',
+                                'The document path provided in the update expression is invalid for update')
+    if isinstance(target, list) and path[-1] >= len(target):
+        target.append(value)
+    else:
+        target[path[-1]] = value
+
+
+def _remove_path(item, path):
+    target = get_path(item, path[:-1]) if len(path) > 1 else item
+    if target is _MISSING:
+        return
+    try:
+        del target[path[-1]]
+    except (KeyError, IndexError):
+        pass
+
+
+def build_condition(condition, names=None, values=None):
+    """
+    :return: Predicate for a condition string or a boto3 condition object
+    """
+    if condition is None:
+        return lambda item: True
+    if isinstance(condition, ConditionBase):
+        built = ConditionExpressionBuilder().build_expression(condition)
+        condition = built.condition_expression
+        names = dict(names or {}, **built.attribute_name_placeholders)
+        values = dict(values or {}, **built.attribute_value_placeholders)
+    parser = _Parser(condition, names, values)
+    predicate = parser.parse_condition()
+    return lambda item: bool(predicate(item))
+
+
+def apply_update(item, expression, names=None, values=None):
+    actions = _Parser(expression, names, values).parse_update()
+    paths = [tuple(path) for _, path, _ in actions]
+    for index, path in enumerate(paths):
+        for other in paths[index + 1:]:
+            if path[:len(other)] == other or other[:len(path)] == path:
+                raise _client_error('ValidationException', 'UpdateItem',
+                                    'Invalid UpdateExpression: Two document paths overlap with each other')
+    for action, path, operand in actions:
+        if action == 'SET':
+            _set_path(item, path, operand(item))
+        elif action == 'REMOVE':
+            _remove_path(item, path)
+        elif action == 'ADD':
+            value = operand(item)
+            current = get_path(item, path)
+            if current is _MISSING:
+                _set_path(item, path, value)
+            elif isinstance(current, set):
+                _set_path(item, path, current | value)
+            else:
+                _set_path(item, path, current + value)
+        elif action == 'DELETE':
+            current = get_path(item, path)
+            if current is not _MISSING:
+                _set_path(item, path, current - operand(item))
+
+
+def apply_projection(item, expression, names=None):
+    if not expression:
+        return item
+    names = names or {}
+    paths = [tuple(_Parser(path_expression, names, {}).parse_path()) for path_expression in expression.split(',')]
+    for index, path in enumerate(paths):
+        for other in paths[index + 1:]:
+            if path[:len(other)] == other or other[:len(path)] == path:
+                raise _client_error('ValidationException', 'Query',
+                                    'Invalid ProjectionExpression: Two document paths overlap with each other')
+    projected = {}
+    for path in paths:
+        value = get_path(item, path)
+        if value is _MISSING:
+            continue
+        target = projected
+        for part in path[:-1]:
+            target = target.setdefault(part, {})
+        target[path[-1]] = copy.deepcopy(value)
+    return projected
+
+
+# DynamoDB
+
+def get_read_units(items, consistent=False):
+    """
+    Read capacity of reading items: 4 KB units, halved for eventually consistent reads.
+    """
+    size = sum(len(repr(item)) for item in items)
+    units = max(1, -(-size // 4096))
+    return units if consistent else units / 2
+
+
+class FakeDynamoDBBackend:
+    def __init__(self):
+        self.tables = defaultdict(dict)
+        # Descriptions of the tables created with CreateTable
+        self.descriptions = {}
+        self.lock = threading.RLock()
+
+    def get_table(self, table_name):
+        return self.tables[table_name]
+
+    def get_item(self, table_name, key, projection=None, names=None):
+        with self.lock:
+            item = self.get_table(table_name).get(key['id'], None)
+            if item is None:
+                return None
+            return apply_projection(copy.deepcopy(item), projection, names)
+
+    def check_key_types(self, operation, table_name, item):
+        """
+        Index keys must have the type declared in AttributeDefinitions, items of another type are rejected.
+        """
+        description = self.descriptions.get(table_name, {})
+        types = description.get('AttributeDefinitions', {})
+        for index in description.get('GlobalSecondaryIndexes', []):
+            for key in index['KeySchema']:
+                name = key['AttributeName']
+                if name not in item or name not in types:
+                    continue
+                actual = list(_serializer.serialize(item[name]))[0]
+                if actual != types[name]:
+                    raise _client_error('ValidationException', operation,
+                                        'One or more parameter values were invalid: Type mismatch for Index Key '
+                                        '{} Expected: {} Actual: {} IndexName: {}'.format(
+                                            name, types[name], actual, index['IndexName']))
+
+    def check_condition(self, operation, item, condition, names, values):
+        if condition is not None and not build_condition(condition, names, values)(item or {}):
+            raise _client_error('ConditionalCheckFailedException', operation, 'The conditional request failed')
+
+    def put_item(self, table_name, item, condition=None, names=None, values=None):
+        with self.lock:
+            table = self.get_table(table_name)
+            old = table.get(item['id'], None)
+            self.check_condition('PutItem', old, condition, names, values)
+            self.check_key_types('PutItem', table_name, item)
+            table[item['id']] = copy.deepcopy(normalize_item(item))
+            return old
+
+    def delete_item(self, table_name, key, condition=None, names=None, values=None):
+        with self.lock:
+            table = self.get_table(table_name)
+            old = table.get(key['id'], None)
+            self.check_condition('DeleteItem', old, condition, names, values)
+            table.pop(key['id'], None)
+            return old
+
+    def update_item(self, table_name, key, expression, condition=None, names=None, values=None):
+        with self.lock:
+            table = self.get_table(table_name)
+            old = table.get(key['id'], None)
+            self.check_condition('UpdateItem', old, condition, names, values)
+            new = copy.deepcopy(old) if old else dict(key)
+            apply_update(new, expression, names, values)
+            self.check_key_types('UpdateItem', table_name, new)
+            table[key['id']] = normalize_item(new)
+            return old, copy.deepcopy(table[key['id']])
+
+    def transact_write(self, actions):
+        """
+        :param actions: List of (kind, table_name, key_or_item, params) applied all or nothing
+        """
+        with self.lock:
+            reasons = []
+            for kind, table_name, key, params in actions:
+                if kind == 'Put':
+                    self.check_key_types('TransactWriteItems', table_name, key)
+                old = self.get_table(table_name).get(key['id'], None)
+                condition = params.get('condition', None)
+                passed = condition is None or build_condition(condition, params.get('names', None),
+                                                              params.get('values', None))(old or {})
+                reasons.append({'Code': 'None' if passed else 'ConditionalCheckFailed'})
+            if any(reason['Code'] != 'None' for reason in reasons):
+                error = _client_error('TransactionCanceledException', 'TransactWriteItems',
+                                      'Transaction cancelled, please refer cancellation reasons for specific reasons')
+                error.response['CancellationReasons'] = reasons
+                raise error
+            for kind, table_name, key, params in actions:
+                if kind == 'Put':
+                    self.put_item(table_name, key)
+                elif kind == 'Delete':
+                    self.delete_item(table_name, key)
+                elif kind == 'Update':
+                    self.update_item(table_name, key, params['expression'], None, params.get('names', None),
+                                     params.get('values', None))
+
+    def query(self, table_name, index_name, key_condition, filter_condition=None, limit=None,
+              exclusive_start_key=None, forward=True, projection=None, names=None, values=None):
+        if index_name:
+            hash_key, _, sort_key = index_name.partition('-')
+        else:
+            hash_key, sort_key = 'id', ''
+        key_predicate = build_condition(key_condition, names, values)
+        filter_predicate = build_condition(filter_condition, names, values)
+        with self.lock:
+            items = [item for item in self.get_table(table_name).values()
+                     if hash_key in item and (not sort_key or sort_key in item) and key_predicate(item)]
+            items = copy.deepcopy(items)
+        items.sort(key=lambda item: (item.get(sort_key, 0) if sort_key else 0, item['id']), reverse=not forward)
+
+        def get_key(item):
+            key = {'id': item['id'], hash_key: item[hash_key]}
+            if sort_key:
+                key[sort_key] = item[sort_key]
+            return key
+
+        if exclusive_start_key:
+            ids = [item['id'] for item in items]
+            start_id = exclusive_start_key.get('id', None)
+            items = items[ids.index(start_id) + 1:] if start_id in ids else []
+        evaluated = items[:limit] if limit else items
+        response = {
+            'Items': [apply_projection(item, projection, names) for item in evaluated if filter_predicate(item)],
+            'ScannedCount': len(evaluated),
+            'ReadUnits': get_read_units(evaluated),
+        }
+        response['Count'] = len(response['Items'])
+        if limit and len(items) > limit:
+            response['LastEvaluatedKey'] = get_key(evaluated[-1])
+        return response
+
+    def scan(self, table_name, segment=None, total_segments=None, filter_condition=None, limit=None,
+             exclusive_start_key=None, projection=None, names=None, values=None):
+        filter_predicate = build_condition(filter_condition, names, values)
+        with self.lock:
+            items = copy.deepcopy(list(self.get_table(table_name).values()))
+        if total_segments:
+            # Items are spread over segments by a stable hash of their key
+            items = [item for item in items
+                     if zlib.crc32(item['id'].encode('utf-8')) % total_segments == segment]
+        items.sort(key=lambda item: item['id'])
+        if exclusive_start_key:
+            items = [item for item in items if item['id'] > exclusive_start_key['id']]
+        evaluated = items[:limit] if limit else items
+        response = {
+            'Items': [apply_projection(item, projection, names) for item in evaluated if filter_predicate(item)],
+            'ScannedCount': len(evaluated),
+            'ReadUnits': get_read_units(evaluated),
+        }
+        response['Count'] = len(response['Items'])
+        if limit and len(items) > limit:
+            response['LastEvaluatedKey'] = {'id': evaluated[-1]['id']}
+        return response
+
+
+class FakeTable:
+    def __init__(self, fake, name):
+        self.fake = fake
+        self.name = name
+        self.backend = fake.dynamodb
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, ConsistentRead=False):
+        self.fake.record('dynamodb', 'GetItem')
+        item = self.backend.get_item(self.name, Key, ProjectionExpression, ExpressionAttributeNames)
+        return _response(Item=item) if item is not None else _response()
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues='NONE', **kwargs):
+        self.fake.record('dynamodb', 'PutItem')
+        old = self.backend.put_item(self.name, Item, ConditionExpression,
+                                    ExpressionAttributeNames, ExpressionAttributeValues)
+        if ReturnValues == 'ALL_OLD' and old:
+            return _response(Attributes=old)
+        return _response()
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE'):
+        self.fake.record('dynamodb', 'DeleteItem')
+        old = self.backend.delete_item(self.name, Key, ConditionExpression,
+                                       ExpressionAttributeNames, ExpressionAttributeValues)
+        if ReturnValues == 'ALL_OLD' and old:
+            return _response(Attributes=old)
+        return _response()
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE'):
+        self.fake.record('dynamodb', 'UpdateItem')
+        old, new = self.backend.update_item(self.name, Key, UpdateExpression, ConditionExpression,
+                                            ExpressionAttributeNames, ExpressionAttributeValues)
+        if ReturnValues == 'ALL_NEW':
+            return _response(Attributes=new)
+        if ReturnValues == 'ALL_OLD' and old:
+            return _response(Attributes=old)
+        if ReturnValues == 'UPDATED_NEW':
+            # Top-level attributes the update changed
+            return _response(Attributes=dict((key, value) for key, value in new.items()
+                                             if (old or {}).get(key, _MISSING) != value))
+        return _response()
+
+    def query(self, KeyConditionExpression, IndexName=None, Limit=None, ExclusiveStartKey=None,
+              ScanIndexForward=True, FilterExpression=None, ProjectionExpression=None,
+              ExpressionAttributeNames=None, ExpressionAttributeValues=None, ConsistentRead=False, **kwargs):
+        self.fake.record('dynamodb', 'Query')
+        if ExclusiveStartKey:
+            # The resource serializes keys, floats are rejected
+            serialize_item(ExclusiveStartKey)
+        description = self.backend.descriptions.get(self.name, None)
+        if IndexName and description is not None and IndexName not in [
+                index['IndexName'] for index in description['GlobalSecondaryIndexes']]:
+            raise _client_error('ValidationException', 'Query',
+                                'The table does not have the specified index: {}'.format(IndexName))
+        response = self.backend.query(self.name, IndexName, KeyConditionExpression, FilterExpression, Limit,
+                                      ExclusiveStartKey, ScanIndexForward, ProjectionExpression,
+                                      ExpressionAttributeNames, ExpressionAttributeValues)
+        read_units = response.pop('ReadUnits')
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            response['ConsumedCapacity'] = {'TableName': self.name, 'CapacityUnits': read_units}
+        return _response(**response)
+
+
+class FakeDynamoDBResource:
+    def __init__(self, fake):
+        self.fake = fake
+
+    def Table(self, name):
+        return FakeTable(self.fake, name)
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self.fake.record('dynamodb', 'BatchGetItem')
+        responses = {}
+        unprocessed = {}
+        for table_name, request in RequestItems.items():
+            keys = request['Keys']
+            if len(keys) > 100:
+                raise _client_error('ValidationException', 'BatchGetItem',
+                                    'Too many items requested for the BatchGetItem call')
+            if len(set(key['id'] for key in keys)) != len(keys):
+                raise _client_error('ValidationException', 'BatchGetItem',
+                                    'Provided list of item keys contains duplicates')
+            responses[table_name] = []
+            for key in keys:
+                if self.fake.should_throttle():
+                    unprocessed.setdefault(table_name, dict(request, Keys=[]))['Keys'].append(key)
+                    continue
+                item = self.fake.dynamodb.get_item(table_name, key, request.get('ProjectionExpression', None),
+                                                   request.get('ExpressionAttributeNames', None))
+                if item is not None:
+                    responses[table_name].append(item)
+        return _response(Responses=responses, UnprocessedKeys=unprocessed)
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self.fake.record('dynamodb', 'BatchWriteItem')
+        unprocessed = {}
+        for table_name, requests in RequestItems.items():
+            if len(requests) > 25:
+                raise _client_error('ValidationException', 'BatchWriteItem',
+                                    'Too many items requested for the BatchWriteItem call')
+            keys = [request.get('PutRequest', {}).get('Item', None) or request['DeleteRequest']['Key']
+                    for request in requests]
+            # The whole request is validated before anything is written
+            for key in keys:
+                serialize_item(key)
+                self.fake.dynamodb.check_key_types('BatchWriteItem', table_name, key)
+            if len(set(key['id'] for key in keys)) != len(keys):
+                raise _client_error('ValidationException', 'BatchWriteItem',
+                                    'Provided list of item keys contains duplicates')
+            if any(len(repr(key)) > 400 * 1024 for key in keys):
+                raise _client_error('ValidationException', 'BatchWriteItem',
+                                    'Item size has exceeded the maximum allowed size')
+            if self.fake.should_reject():
+                raise _client_error('ProvisionedThroughputExceededException', 'BatchWriteItem',
+                                    'The level of configured provisioned throughput for the table was exceeded')
+            for request in requests:
+                if self.fake.should_throttle():
+                    unprocessed.setdefault(table_name, []).append(request)
+                elif 'PutRequest' in request:
+                    self.fake.dynamodb.put_item(table_name, request['PutRequest']['Item'])
+                else:
+                    self.fake.dynamodb.delete_item(table_name, request['DeleteRequest']['Key'])
+        return _response(UnprocessedItems=unprocessed)
+
+
+_ON_DEMAND_THROUGHPUT = {'ReadCapacityUnits': 0, 'WriteCapacityUnits': 0}
+
+
+def _check_throughput(operation, billing_mode, throughput):
+    if billing_mode == 'PROVISIONED' and not throughput:
+        raise _client_error('ValidationException', operation,
+                            'No provisioned throughput specified for the table or index')
+    if billing_mode == 'PAY_PER_REQUEST' and throughput:
+        raise _client_error('ValidationException', operation,
+                            'One or more parameter values were invalid: Neither ReadCapacityUnits nor '
+                            'WriteCapacityUnits can be specified when BillingMode is PAY_PER_REQUEST')
+
+
+class FakeWaiter:
+    def wait(self, **kwargs):
+        pass
+
+
+class FakeDynamoDBClient:
+    def __init__(self, fake):
+        self.fake = fake
+        self.backend = fake.dynamodb
+
+    def create_table(self, TableName, BillingMode='PROVISIONED', ProvisionedThroughput=None, **kwargs):
+        self.fake.record('dynamodb', 'CreateTable')
+        _check_throughput('CreateTable', BillingMode, ProvisionedThroughput)
+        with self.backend.lock:
+            if TableName in self.backend.descriptions:
+                raise _client_error('ResourceInUseException', 'CreateTable',
+                                    'Table already exists: {}'.format(TableName))
+            self.backend.get_table(TableName)
+            self.backend.descriptions[TableName] = {
+                'TableName': TableName,
+                'TableStatus': 'ACTIVE',
+                'BillingModeSummary': {'BillingMode': BillingMode},
+                'ProvisionedThroughput': dict(ProvisionedThroughput or _ON_DEMAND_THROUGHPUT),
+                'GlobalSecondaryIndexes': [],
+                'AttributeDefinitions': dict((attribute['AttributeName'], attribute['AttributeType'])
+                                             for attribute in kwargs.get('AttributeDefinitions', [])),
+            }
+            return _response(TableDescription=copy.deepcopy(self.backend.descriptions[TableName]))
+
+    def describe_table(self, TableName):
+        self.fake.record('dynamodb', 'DescribeTable')
+        return _response(Table=copy.deepcopy(self._get_description('DescribeTable', TableName)))
+
+    def _get_description(self, operation, table_name):
+        description = self.backend.descriptions.get(table_name, None)
+        if description is None:
+            raise _client_error('ResourceNotFoundException', operation,
+                                'Requested resource not found: Table: {} not found'.format(table_name))
+        return description
+
+    def update_table(self, TableName, BillingMode=None, ProvisionedThroughput=None,
+                     GlobalSecondaryIndexUpdates=(), **kwargs):
+        self.fake.record('dynamodb', 'UpdateTable')
+        with self.backend.lock:
+            description = self._get_description('UpdateTable', TableName)
+            billing_mode = BillingMode or description['BillingModeSummary']['BillingMode']
+            indexes = dict((index['IndexName'], index) for index in description['GlobalSecondaryIndexes'])
+            updated = dict((update['Update']['IndexName'], update['Update'])
+                           for update in GlobalSecondaryIndexUpdates if 'Update' in update)
+            if BillingMode == 'PROVISIONED' and description['BillingModeSummary']['BillingMode'] != BillingMode:
+                if not ProvisionedThroughput or set(indexes) - set(updated):
+                    raise _client_error('ValidationException', 'UpdateTable',
+                                        'ProvisionedThroughput must be specified for the table and every index')
+            if ProvisionedThroughput:
+                _check_throughput('UpdateTable', billing_mode, ProvisionedThroughput)
+                if not BillingMode and ProvisionedThroughput == description['ProvisionedThroughput']:
+                    raise _client_error('ValidationException', 'UpdateTable',
+                                        'The provisioned throughput for the table will not change')
+            for update in GlobalSecondaryIndexUpdates:
+                if 'Create' in update:
+                    create = update['Create']
+                    if create['IndexName'] in indexes:
+                        raise _client_error('ValidationException', 'UpdateTable',
+                                            'Attempting to create an index which already exists')
+                    _check_throughput('UpdateTable', billing_mode, create.get('ProvisionedThroughput', None))
+                    indexes[create['IndexName']] = {
+                        'IndexName': create['IndexName'],
+                        'KeySchema': create['KeySchema'],
+                        'IndexStatus': 'ACTIVE',
+                        'ProvisionedThroughput': dict(create.get('ProvisionedThroughput', None)
+                                                      or _ON_DEMAND_THROUGHPUT),
+                    }
+                elif 'Delete' in update:
+                    if indexes.pop(update['Delete']['IndexName'], None) is None:
+                        raise _client_error('ResourceNotFoundException', 'UpdateTable', 'Index not found')
+                elif update['Update']['IndexName'] not in indexes:
+                    raise _client_error('ResourceNotFoundException', 'UpdateTable', 'Index not found')
+            for index_name, update in updated.items():
+                _check_throughput('UpdateTable', billing_mode, update['ProvisionedThroughput'])
+                indexes[index_name]['ProvisionedThroughput'] = dict(update['ProvisionedThroughput'])
+            description['BillingModeSummary'] = {'BillingMode': billing_mode}
+            if billing_mode == 'PAY_PER_REQUEST':
+                description['ProvisionedThroughput'] = dict(_ON_DEMAND_THROUGHPUT)
+                for index in indexes.values():
+                    index['ProvisionedThroughput'] = dict(_ON_DEMAND_THROUGHPUT)
+            elif ProvisionedThroughput:
+                description['ProvisionedThroughput'] = dict(ProvisionedThroughput)
+            description['GlobalSecondaryIndexes'] = list(indexes.values())
+            description['AttributeDefinitions'].update((attribute['AttributeName'], attribute['AttributeType'])
+                                                       for attribute in kwargs.get('AttributeDefinitions', []))
+            return _response(TableDescription=copy.deepcopy(description))
+
+    def get_waiter(self, waiter_name):
+        return FakeWaiter()
+
+    def get_item(self, TableName, Key, ProjectionExpression=None, ExpressionAttributeNames=None,
+                 ConsistentRead=False):
+        self.fake.record('dynamodb', 'GetItem')
+        item = self.backend.get_item(TableName, deserialize_item(Key), ProjectionExpression, ExpressionAttributeNames)
+        return _response(Item=serialize_item(item)) if item is not None else _response()
+
+    def delete_item(self, TableName, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE'):
+        self.fake.record('dynamodb', 'DeleteItem')
+        values = deserialize_item(ExpressionAttributeValues or {})
+        old = self.backend.delete_item(TableName, deserialize_item(Key), ConditionExpression,
+                                       ExpressionAttributeNames, values)
+        if ReturnValues == 'ALL_OLD' and old:
+            return _response(Attributes=serialize_item(old))
+        return _response()
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None, ReturnValues='NONE'):
+        self.fake.record('dynamodb', 'UpdateItem')
+        values = deserialize_item(ExpressionAttributeValues or {})
+        old, new = self.backend.update_item(TableName, deserialize_item(Key), UpdateExpression,
+                                            ConditionExpression, ExpressionAttributeNames, values)
+        if ReturnValues == 'ALL_NEW':
+            return _response(Attributes=serialize_item(new))
+        if ReturnValues == 'ALL_OLD' and old:
+            return _response(Attributes=serialize_item(old))
+        return _response()
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        self.fake.record('dynamodb', 'TransactWriteItems')
+        actions = []
+        for transact_item in TransactItems:
+            (kind, request), = transact_item.items()
+            params = {
+                'condition': request.get('ConditionExpression', None),
+                'names': request.get('ExpressionAttributeNames', None),
+                'values': deserialize_item(request.get('ExpressionAttributeValues', None) or {}),
+                'expression': request.get('UpdateExpression', None),
+            }
+            if kind == 'Put':
+                key = deserialize_item(request['Item'])
+            else:
+                key = deserialize_item(request['Key'])
+            actions.append((kind, request['TableName'], key, params))
+        self.backend.transact_write(actions)
+        return _response()
+
+    def scan(self, TableName, Segment=None, TotalSegments=None, Limit=None, ExclusiveStartKey=None,
+             FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, ConsistentRead=False, **kwargs):
+        self.fake.record('dynamodb', 'Scan')
+        values = deserialize_item(ExpressionAttributeValues or {})
+        start_key = deserialize_item(ExclusiveStartKey) if ExclusiveStartKey else None
+        response = self.backend.scan(TableName, Segment, TotalSegments, FilterExpression, Limit, start_key,
+                                     ProjectionExpression, ExpressionAttributeNames, values)
+        read_units = response.pop('ReadUnits')
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            response['ConsumedCapacity'] = {'TableName': TableName, 'CapacityUnits': read_units}
+        response['Items'] = [serialize_item(item) for item in response['Items']]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = serialize_item(response['LastEvaluatedKey'])
+        return _response(**response)
+
+
+# S3
+
+class FakeS3Backend:
+    def __init__(self):
+        self.buckets = defaultdict(dict)
+        self.lock = threading.Lock()
+
+
+class FakeS3Object:
+    def __init__(self, fake, bucket_name, key):
+        self.fake = fake
+        self.bucket_name = bucket_name
+        self.key = key
+
+    def delete(self):
+        self.fake.record('s3', 'DeleteObject')
+        with self.fake.s3.lock:
+            self.fake.s3.buckets[self.bucket_name].pop(self.key, None)
+        return _response()
+
+
+class FakeS3Resource:
+    def __init__(self, fake):
+        self.fake = fake
+
+    def Object(self, bucket_name, key):
+        return FakeS3Object(self.fake, bucket_name, key)
+
+
+class FakeS3Client:
+    def __init__(self, fake):
+        self.fake = fake
+        self.backend = fake.s3
+
+    def create_bucket(self, Bucket, **kwargs):
+        self.fake.record('s3', 'CreateBucket')
+        with self.backend.lock:
+            _ = self.backend.buckets[Bucket]
+        return _response()
+
+    def upload_fileobj(self, fileobj, bucket_name, key):
+        self.fake.record('s3', 'PutObject')
+        if hasattr(fileobj, 'read'):
+            body = fileobj.read()
+        else:
+            body = fileobj
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        with self.backend.lock:
+            self.backend.buckets[bucket_name][key] = bytes(body)
+
+    def download_fileobj(self, bucket_name, key, fileobj):
+        self.fake.record('s3', 'GetObject')
+        with self.backend.lock:
+            body = self.backend.buckets[bucket_name].get(key, None)
+        if body is None:
+            raise _client_error('404', 'HeadObject', 'Not Found')
+        fileobj.write(body)
+
+
+# Application Auto Scaling
+
+class FakeApplicationAutoScalingClient:
+    def __init__(self, fake):
+        self.fake = fake
+        self.backend = fake.autoscaling
+
+    def describe_scalable_targets(self, ServiceNamespace, ResourceIds=None, **kwargs):
+        self.fake.record('application-autoscaling', 'DescribeScalableTargets')
+        with self.backend.lock:
+            targets = [dict(target) for target in self.backend.targets.values()
+                       if target['ServiceNamespace'] == ServiceNamespace
+                       and (ResourceIds is None or target['ResourceId'] in ResourceIds)]
+        return _response(ScalableTargets=targets)
+
+    def register_scalable_target(self, ServiceNamespace, ResourceId, ScalableDimension, MinCapacity=None,
+                                 MaxCapacity=None, **kwargs):
+        self.fake.record('application-autoscaling', 'RegisterScalableTarget')
+        with self.backend.lock:
+            self.backend.targets[(ResourceId, ScalableDimension)] = {
+                'ServiceNamespace': ServiceNamespace,
+                'ResourceId': ResourceId,
+                'ScalableDimension': ScalableDimension,
+                'MinCapacity': MinCapacity,
+                'MaxCapacity': MaxCapacity,
+            }
+        return _response()
+
+    def deregister_scalable_target(self, ServiceNamespace, ResourceId, ScalableDimension, **kwargs):
+        self.fake.record('application-autoscaling', 'DeregisterScalableTarget')
+        with self.backend.lock:
+            if self.backend.targets.pop((ResourceId, ScalableDimension), None) is None:
+                raise _client_error('ObjectNotFoundException', 'DeregisterScalableTarget', 'No scalable target found')
+            for name, policy in list(self.backend.policies.items()):
+                if (policy['ResourceId'], policy['ScalableDimension']) == (ResourceId, ScalableDimension):
+                    self.backend.policies.pop(name)
+        return _response()
+
+    def describe_scaling_policies(self, ServiceNamespace, PolicyNames=None, **kwargs):
+        self.fake.record('application-autoscaling', 'DescribeScalingPolicies')
+        with self.backend.lock:
+            policies = [copy.deepcopy(policy) for name, policy in self.backend.policies.items()
+                        if PolicyNames is None or name in PolicyNames]
+        return _response(ScalingPolicies=policies)
+
+    def put_scaling_policy(self, PolicyName, ServiceNamespace, ResourceId, ScalableDimension, **kwargs):
+        self.fake.record('application-autoscaling', 'PutScalingPolicy')
+        with self.backend.lock:
+            if (ResourceId, ScalableDimension) not in self.backend.targets:
+                raise _client_error('ObjectNotFoundException', 'PutScalingPolicy', 'No scalable target registered')
+            self.backend.policies[PolicyName] = dict(kwargs, PolicyName=PolicyName, ServiceNamespace=ServiceNamespace,
+                                                     ResourceId=ResourceId, ScalableDimension=ScalableDimension)
+        return _response()
+
+
+class FakeApplicationAutoScalingBackend:
+    def __init__(self):
+        self.targets = {}
+        self.policies = {}
+        self.lock = threading.Lock()
+
+
+class FakeBoto3:
+    """
+    Stand-in for the boto3 module or a boto3.Session.
+
+    :param latency: Seconds to sleep on every request, to emulate the network
+    :param unprocessed_rate: Share of batch requests left unprocessed, to emulate throttling
+    :param throttle_rate: Share of BatchWriteItem calls failing with ProvisionedThroughputExceededException
+    """
+    def __init__(self, latency=0, unprocessed_rate=0, throttle_rate=0):
+        self.latency = latency
+        self.unprocessed_rate = unprocessed_rate
+        self.throttle_rate = throttle_rate
+        self.dynamodb = FakeDynamoDBBackend()
+        self.s3 = FakeS3Backend()
+        self.autoscaling = FakeApplicationAutoScalingBackend()
+        self.calls = Counter()
+        self.tagged_calls = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def set_tag(self, tag):
+        self._local.tag = tag
+
+    def should_throttle(self):
+        return self.unprocessed_rate > 0 and random.random() < self.unprocessed_rate
+
+    def should_reject(self):
+        return self.throttle_rate > 0 and random.random() < self.throttle_rate
+
+    def record(self, service_name, operation):
+        tag = getattr(self._local, 'tag', None)
+        with self._lock:
+            self.calls[(service_name, operation)] += 1
+            if tag is not None:
+                self.tagged_calls[tag][(service_name, operation)] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def client(self, service_name, region_name=None, config=None, **kwargs):
+        if service_name == 'dynamodb':
+            return FakeDynamoDBClient(self)
+        if service_name == 's3':
+            return FakeS3Client(self)
+        if service_name == 'application-autoscaling':
+            return FakeApplicationAutoScalingClient(self)
+        raise NotImplementedError('{} is not faked'.format(service_name))
+
+    def resource(self, service_name, region_name=None, config=None, **kwargs):
+        if service_name == 'dynamodb':
+            return FakeDynamoDBResource(self)
+        if service_name == 's3':
+            return FakeS3Resource(self)
+        raise NotImplementedError('{} is not faked'.format(service_name))
@@ -0,0 +1,297 @@
+"""
+In-process load test for cloud.lambda_function.handler.
+
+The handler runs against the in-memory DynamoDB and S3 stand-ins of fake_aws,
+so no AWS account is needed. Example:
+
+    python test/loadtest.py --concurrency 8 --requests 2000 --mix login=1,create_item=3,get_items=5,upload_file=1
+    python test/loadtest.py --mix get_item=9,create_item=1 --cache-ttl 10
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import redirect_stdout
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TEST_DIR), 'aws_interface'))
+sys.path.insert(0, TEST_DIR)
+
+import cloud.lambda_function as lambda_function
+import cloud.metrics as metrics
+import cloud.shortuuid as shortuuid
+from cloud.aws import item_cache, rate_limiters
+from cloud.recipe_store import RecipeStore, set_store
+from core.recipe_controller import AuthRecipeController, DatabaseRecipeController, StorageRecipeController
+from fake_aws import FakeBoto3
+
+APP_ID = 'loadtest'
+PARTITION = 'loadtest'
+PASSWORD = 'password'
+DEFAULT_MIX = 'login=1,create_item=3,get_items=5,upload_file=1'
+# Items every get_item reads, like config documents read by every client
+HOT_ITEMS = 4
+
+hot_item_ids = []
+
+
+def make_recipe(count_shards=1, transactional=False, cache_ttl=0):
+    """
+    Merge the auth, database and storage recipes so one handler serves every cloud_api.
+    """
+    database = DatabaseRecipeController()
+    database.set_count_shards(PARTITION, count_shards)
+    database.set_cache_ttl(PARTITION, cache_ttl)
+    recipe = json.loads(AuthRecipeController().to_json())
+    recipe['transactional_writes'] = transactional
+    recipe['partitions'] = json.loads(database.to_json()).get('partitions', {})
+    for rc in (database, StorageRecipeController()):
+        recipe['cloud_apis'].update(json.loads(rc.to_json())['cloud_apis'])
+    return recipe
+
+
+class Client:
+    def __init__(self, email):
+        self.email = email
+        self.session_id = None
+
+
+def login_event(client):
+    return {
+        'cloud_api_name': 'login',
+        'email': client.email,
+        'password': PASSWORD,
+    }
+
+
+def create_item_event(client):
+    return {
+        'cloud_api_name': 'create_item',
+        'session_id': client.session_id,
+        'partition': PARTITION,
+        'item': {
+            'title': shortuuid.uuid(),
+            'score': random.randint(0, 1000),
+        },
+        'read_groups': ['user'],
+        'write_groups': ['owner'],
+    }
+
+
+def get_items_event(client):
+    return {
+        'cloud_api_name': 'get_items',
+        'session_id': client.session_id,
+        'partition': PARTITION,
+        'limit': 20,
+        'reverse': True,
+    }
+
+
+def get_item_event(client):
+    return {
+        'cloud_api_name': 'get_item',
+        'session_id': client.session_id,
+        'item_id': random.choice(hot_item_ids),
+    }
+
+
+def upload_file_event(client):
+    return {
+        'cloud_api_name': 'upload_file',
+        'session_id': client.session_id,
+        'parent_path': '/',
+        'file_name': '{}.txt'.format(shortuuid.uuid()),
+        'file_bin': 'x' * 1024,
+        'read_groups': ['user'],
+        'write_groups': ['owner'],
+    }
+
+
+SCENARIOS = {
+    'login': login_event,
+    'create_item': create_item_event,
+    'get_items': get_items_event,
+    'get_item': get_item_event,
+    'upload_file': upload_file_event,
+}
+
+
+def parse_mix(mix):
+    weights = {}
+    for pair in mix.split(','):
+        name, _, weight = pair.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError('Unknown scenario {}, choose from {}'.format(name, list(SCENARIOS)))
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(values, rate):
+    if not values:
+        return 0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(rate * (len(values) - 1))))
+    return values[index]
+
+
+def set_up(fake, user_count, count_shards=1, transactional=False, cache_ttl=0):
+    lambda_function.boto3 = fake
+    set_store(RecipeStore(make_recipe(count_shards, transactional, cache_ttl), APP_ID))
+    clients = []
+    for _ in range(user_count):
+        client = Client('{}@loadtest.com'.format(shortuuid.uuid()))
+        lambda_function.handler({
+            'cloud_api_name': 'register',
+            'email': client.email,
+            'password': PASSWORD,
+        }, None)
+        body = lambda_function.handler(login_event(client), None)['body']
+        client.session_id = body['session_id']
+        clients.append(client)
+    return clients
+
+
+def run(concurrency=8, requests=1000, mix=DEFAULT_MIX, users=16, latency=0.0, seed=None, count_shards=1,
+        transactional=False, cache_ttl=0):
+    """
+    Drive the handler with a weighted mix of scenarios.
+
+    :return: Report dict with throughput, latency percentiles and AWS calls per API
+    """
+    random.seed(seed)
+    weights = parse_mix(mix)
+    names = list(weights)
+    fake = FakeBoto3(latency)
+    sink = metrics.MemorySink()
+    previous_sink = metrics.set_sink(sink)
+    clients = set_up(fake, users, count_shards, transactional, cache_ttl)
+    hot_item_ids[:] = [lambda_function.handler(create_item_event(clients[0]), None)['body']['item_id']
+                       for _ in range(HOT_ITEMS)]
+    sink.clear()
+    fake.tagged_calls.clear()
+    rate_limiters.clear()
+    item_cache.clear()
+    plan = random.choices(names, weights=[weights[name] for name in names], k=requests)
+    latencies = defaultdict(list)
+    errors = Counter()
+    lock = threading.Lock()
+    position = [0]
+
+    def worker(worker_id):
+        client = clients[worker_id % len(clients)]
+        while True:
+            with lock:
+                if position[0] >= len(plan):
+                    return
+                name = plan[position[0]]
+                position[0] += 1
+            fake.set_tag(name)
+            event = SCENARIOS[name](client)
+            started_at = time.perf_counter()
+            response = lambda_function.handler(event, None)
+            elapsed = (time.perf_counter() - started_at) * 1000
+            failed = response['statusCode'] != 200 or 'error' in response['body']
+            with lock:
+                latencies[name].append(elapsed)
+                if failed:
+                    errors[name] += 1
+            if name == 'login' and not failed:
+                client.session_id = response['body']['session_id']
+
+    started_at = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    # Some cloud_apis print debug output, keep it out of the report
+    with redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started_at
+    metrics.set_sink(previous_sink)
+
+    phases = defaultdict(lambda: defaultdict(list))
+    cache_counts = Counter()
+    for record in sink.records:
+        for key, value in record.items():
+            if key.endswith('_time'):
+                phases[record['cloud_api_name']][key].append(value)
+            elif key.endswith(('_hits', '_misses')):
+                cache_counts[key] += value
+
+    report = {
+        'concurrency': concurrency,
+        'requests': requests,
+        'elapsed': elapsed,
+        'throughput': requests / elapsed if elapsed else 0,
+        'apis': {},
+    }
+    all_latencies = []
+    for name in names:
+        values = latencies[name]
+        all_latencies += values
+        calls = fake.tagged_calls[name]
+        report['apis'][name] = {
+            'count': len(values),
+            'errors': errors[name],
+            'p50': percentile(values, 0.5),
+            'p95': percentile(values, 0.95),
+            'p99': percentile(values, 0.99),
+            'aws_calls': dict(('{}.{}'.format(*key), count / max(len(values), 1)) for key, count in calls.items()),
+            'phases': dict((key, sum(v) / len(v)) for key, v in phases[name].items()),
+        }
+    report['p50'] = percentile(all_latencies, 0.5)
+    report['p95'] = percentile(all_latencies, 0.95)
+    report['p99'] = percentile(all_latencies, 0.99)
+    report['throttled'] = rate_limiters.get_throttle_counts()
+    report['cache_hit_rates'] = {}
+    for cache in set(key.rsplit('_', 1)[0] for key in cache_counts):
+        hits = cache_counts['{}_hits'.format(cache)]
+        lookups = hits + cache_counts['{}_misses'.format(cache)]
+        report['cache_hit_rates'][cache] = 100.0 * hits / lookups if lookups else 0.0
+    return report
+
+
+def print_report(report):
+    print('{requests} requests, concurrency {concurrency}: {throughput:.1f} req/s, '
+          'p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms'.format(**report))
+    for table_name, count in sorted(report['throttled'].items()):
+        if count:
+            print('  {} throttled {} times'.format(table_name, count))
+    for cache, hit_rate in sorted(report['cache_hit_rates'].items()):
+        print('  {} hit rate {:.1f}%'.format(cache, hit_rate))
+    for name, api in report['apis'].items():
+        print('  {:<12} n={:<6} errors={:<4} p50={:.2f} p95={:.2f} p99={:.2f} ms'.format(
+            name, api['count'], api['errors'], api['p50'], api['p95'], api['p99']))
+        for call, count in sorted(api['aws_calls'].items()):
+            print('      {:<24} {:.2f} / request'.format(call, count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Weighted scenarios, e.g. {}'.format(DEFAULT_MIX))
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.0, help='Emulated seconds per AWS request')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--count-shards', type=int, default=1, help='Count shards of the test partition')
+    parser.add_argument('--transactional', action='store_true', help='Write items and counts in one transaction')
+    parser.add_argument('--cache-ttl', type=int, default=0, help='Seconds get_item may serve cached items')
+    parser.add_argument('--json', action='store_true', help='Print the report as json')
+    args = parser.parse_args()
+    report = run(args.concurrency, args.requests, args.mix, args.users, args.latency, args.seed,
+                 args.count_shards, args.transactional, args.cache_ttl)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
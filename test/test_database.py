@@ -0,0 +1,185 @@
+import json
+
+import botocore.exceptions
+import pytest
+
+import cloud.database.create_item as create_item
+import cloud.database.create_items as create_items
+import cloud.database.get_item as get_item
+import cloud.database.get_items as get_items
+import cloud.database.put_item_field as put_item_field
+import cloud.database.query_items as query_items
+import cloud.database.update_item as update_item
+from cloud.aws import DynamoDB
+
+
+def create(call, item):
+    body = call(create_item, {'partition': 'posts', 'item': item, 'read_groups': ['user'], 'write_groups': ['user']})
+    return body['item_id']
+
+
+def test_update_item_replaces_the_item(call):
+    item_id = create(call, {'title': 'a', 'n': 1})
+    body = call(update_item, {'item_id': item_id, 'item': {'title': 'b'},
+                              'read_groups': ['user'], 'write_groups': ['user']})
+    assert body['success']
+
+    item = call(get_item, {'item_id': item_id})['item']
+    assert item['title'] == 'b'
+    assert 'n' not in item
+    assert item['partition'] == 'posts'
+
+
+def test_update_item_replaces_dotted_attributes(call):
+    item_id = create(call, {'a.b': 'x', 't': 'x'})
+    body = call(update_item, {'item_id': item_id, 'item': {'t': 'y', 'c.d': 'z'},
+                              'read_groups': ['user'], 'write_groups': ['user']})
+    assert body['success']
+
+    item = call(get_item, {'item_id': item_id})['item']
+    assert 'a.b' not in item
+    assert item['t'] == 'y'
+    assert item['c.d'] == 'z'
+
+
+def test_update_item_returns_write_errors(call, database, recipe_controller):
+    recipe_controller.put_index('price', 'N')
+    database.apply_indexes(recipe_controller)
+    item_id = create(call, {'price': 1})
+    body = call(update_item, {'item_id': item_id, 'item': {'price': 'abc'},
+                              'read_groups': ['user'], 'write_groups': ['user']})
+    assert not body['success']
+    assert body['message'] == 'price is indexed as a number'
+
+
+def test_writes_check_indexed_field_types(call, database, recipe_controller):
+    recipe_controller.put_index('price', 'N')
+    database.apply_indexes(recipe_controller)
+    item_id = create(call, {'price': 1})
+
+    # One mistyped item writes nothing
+    body = call(create_items, {'partition': 'posts', 'items': [{'price': n} for n in range(30)] + [{'price': 'abc'}],
+                               'read_groups': ['user'], 'write_groups': ['user']})
+    assert body == {'success': False, 'message': 'price is indexed as a number'}
+    assert call(get_items, {'partition': 'posts'})['items'] == [call(get_item, {'item_id': item_id})['item']]
+    assert DynamoDB(database.boto3_session).get_item_count('database-test', 'posts')['Item']['count'] == 1
+
+    body = call(create_item, {'partition': 'posts', 'item': {'price': 'abc'}})
+    assert body == {'success': False, 'message': 'price is indexed as a number'}
+    for field_name, field_value in (('price', 'abc'), ('price.a', 1)):
+        body = call(put_item_field, {'item_id': item_id, 'field_name': field_name, 'field_value': field_value})
+        assert not body['success']
+    assert call(put_item_field, {'item_id': item_id, 'field_name': 'price', 'field_value': None})['success']
+
+
+def test_system_fields_cannot_be_indexed(recipe_controller):
+    for field in ('owner', 'read_groups', 'write_groups', '_version', 'update_date'):
+        assert recipe_controller.put_index(field, 'S') is False
+
+
+def test_update_item_checks_permission(call):
+    item_id = create(call, {'title': 'a'})
+    body = call(update_item, {'item_id': item_id, 'item': {'title': 'b'}},
+                user={'id': 'guest', 'group': 'guest'})
+    assert not body['success']
+    assert body['message'] == 'permission denied'
+
+
+def test_create_items_sets_creation_dates(call):
+    body = call(create_items, {'partition': 'posts', 'items': [{'title': 'a', 'creationDate': 'abc'},
+                                                               {'title': 'b', 'creationDate': 1, 'id': 'chosen'}],
+                               'read_groups': ['user'], 'write_groups': ['user']})
+    assert body['success']
+    assert 'chosen' not in body['item_ids']
+
+    items = [call(get_item, {'item_id': item_id})['item'] for item_id in body['item_ids']]
+    assert [item['title'] for item in items] == ['a', 'b']
+    assert all(item['creationDate'] > 1 for item in items)
+
+
+def test_create_item_sets_creation_date(call):
+    item_id = create(call, {'title': 'a', 'creationDate': 'abc'})
+    assert call(get_item, {'item_id': item_id})['item']['creationDate'] > 1
+
+
+def client_json(value):
+    """
+    :return: value as a client sends it back, numbers of the response become floats
+    """
+    return json.loads(json.dumps(value, default=float))
+
+
+def test_start_key_from_a_client(call):
+    call(create_items, {'partition': 'posts', 'items': [{'n': n} for n in range(5)],
+                        'read_groups': ['user'], 'write_groups': ['user']})
+    page = call(get_items, {'partition': 'posts', 'limit': 2})
+    assert isinstance(client_json(page['end_key'])['creationDate'], float)
+
+    for start_key in (client_json(page['end_key']), json.dumps(page['end_key'], default=float)):
+        body = call(get_items, {'partition': 'posts', 'limit': 10, 'start_key': start_key})
+        assert [item['n'] for item in body['items']] == [2, 3, 4]
+
+    conditions = [{'field': 'creationDate', 'op': 'gt', 'value': 0}]
+    page = call(query_items, {'partition': 'posts', 'conditions': conditions, 'limit': 2})
+    body = call(query_items, {'partition': 'posts', 'conditions': conditions, 'limit': 10,
+                              'start_key': client_json(page['end_key'])})
+    assert [item['n'] for item in body['items']] == [2, 3, 4]
+
+
+def test_apply_indexes_starts_one_change_per_call(boto3, database, recipe_controller):
+    recipe_controller.put_index('name', 'S')
+    recipe_controller.put_index('rank', 'N')
+    statuses = database.apply_indexes(recipe_controller)
+    assert sorted(statuses.values()) == ['ACTIVE', 'ACTIVE', 'PENDING']
+
+    # Nothing is started while an index is backfilling
+    description = boto3.dynamodb.descriptions['database-test']
+    for index in description['GlobalSecondaryIndexes']:
+        index['IndexStatus'] = 'CREATING'
+    assert 'PENDING' in database.apply_indexes(recipe_controller).values()
+
+    for index in description['GlobalSecondaryIndexes']:
+        index['IndexStatus'] = 'ACTIVE'
+    statuses = database.apply_indexes(recipe_controller)
+    assert set(statuses) == {'partition-creationDate', 'partition-name', 'partition-rank'}
+    assert set(statuses.values()) == {'ACTIVE'}
+
+    recipe_controller.delete_index('name')
+    assert 'partition-name' not in database.apply_indexes(recipe_controller)
+
+
+def test_get_item_fields_with_a_parent_path(call):
+    item_id = create(call, {'extra': {'name': 'a', 'age': 1}, 'title': 'b'})
+    item = call(get_item, {'item_id': item_id, 'fields': ['extra', 'extra.name']})['item']
+    assert item['extra'] == {'name': 'a', 'age': 1}
+    assert 'title' not in item
+
+
+def test_batch_put_items_counts_chunks_written_before_a_failure(boto3, database, monkeypatch):
+    dynamodb = DynamoDB(boto3)
+    batch_write = dynamodb._batch_write
+    written = []
+
+    def fail_second_chunk(table_name, requests, max_retries=None):
+        if written:
+            raise botocore.exceptions.ClientError({'Error': {'Code': 'AccessDeniedException'}}, 'BatchWriteItem')
+        written.append(requests)
+        return batch_write(table_name, requests, max_retries)
+    monkeypatch.setattr(dynamodb, '_batch_write', fail_second_chunk)
+
+    with pytest.raises(botocore.exceptions.ClientError):
+        dynamodb.batch_put_items('database-test', [('posts', {'n': n}) for n in range(40)])
+    assert dynamodb.get_item_count('database-test', 'posts')['Item']['count'] == 25
+
+
+def test_get_item_count_reads_unprocessed_shards(boto3, database, monkeypatch):
+    dynamodb = DynamoDB(boto3, count_shards={'posts': 4})
+    dynamodb.batch_put_items('database-test', [('posts', {'n': n}) for n in range(40)])
+    batch_get_items = dynamodb.batch_get_items
+
+    def leave_shards_unprocessed(table_name, item_ids, fields=None):
+        result = batch_get_items(table_name, item_ids[:1], fields)
+        result['unprocessed_ids'] = item_ids[1:]
+        return result
+    monkeypatch.setattr(dynamodb, 'batch_get_items', leave_shards_unprocessed)
+    assert dynamodb.get_item_count('database-test', 'posts')['Item']['count'] == 40
@@ -0,0 +1,79 @@
+import threading
+
+import botocore.exceptions
+
+from cloud.aws import DynamoDB
+import cloud.importer as importer
+from cloud.importer import import_records
+
+TABLE_NAME = 'database-test'
+
+
+def make_records(count, with_ids=False):
+    for line_number in range(1, count + 1):
+        record = {'n': line_number}
+        if with_ids:
+            record['id'] = 'item-{}'.format(line_number)
+        yield line_number, record, None
+
+
+def get_count(dynamodb, partition):
+    return dynamodb.get_item_count(TABLE_NAME, partition)['Item']['count']
+
+
+def test_import_reports_connection_errors(boto3, database, monkeypatch):
+    dynamodb = DynamoDB(boto3)
+
+    def batch_put_items(*args, **kwargs):
+        raise botocore.exceptions.EndpointConnectionError(endpoint_url='https://dynamodb')
+    monkeypatch.setattr(dynamodb, 'batch_put_items', batch_put_items)
+
+    reports = []
+    # More batches than the queue holds, a dead worker would block the reader
+    thread = threading.Thread(target=lambda: reports.append(import_records(
+        dynamodb, TABLE_NAME, 'posts', make_records(500), 'owner', max_workers=2)))
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive()
+    assert reports[0]['read'] == 500
+    assert reports[0]['imported'] == 0
+    assert reports[0]['failed'] == 500
+
+
+def test_import_keeps_counts_of_replaced_items(boto3, database):
+    dynamodb = DynamoDB(boto3)
+    for _ in range(2):
+        report = import_records(dynamodb, TABLE_NAME, 'posts', make_records(60, with_ids=True), 'owner')
+        assert report['imported'] == 60
+    assert get_count(dynamodb, 'posts') == 60
+
+    import_records(dynamodb, TABLE_NAME, 'archive', make_records(10, with_ids=True), 'owner')
+    assert get_count(dynamodb, 'posts') == 50
+    assert get_count(dynamodb, 'archive') == 10
+
+
+def test_import_rejects_invalid_creation_dates(boto3, database):
+    dynamodb = DynamoDB(boto3)
+    records = [(1, {'id': 'a', 'creationDate': 'abc'}, None), (2, {'id': 'b', 'creationDate': 5}, None)]
+    report = import_records(dynamodb, TABLE_NAME, 'posts', records, 'owner')
+    assert report['imported'] == 1
+    assert report['failures'] == [{'line': 1, 'error': 'creationDate must be a number'}]
+    assert dynamodb.get_item(TABLE_NAME, 'b')['Item']['creationDate'] == 5
+
+
+def test_import_reports_failed_workers_to_on_failure(boto3, database, monkeypatch):
+    dynamodb = DynamoDB(boto3)
+
+    def batch_put_items(*args, **kwargs):
+        raise botocore.exceptions.ClientError({'Error': {'Code': 'ThrottlingException'}}, 'BatchWriteItem')
+    monkeypatch.setattr(dynamodb, 'batch_put_items', batch_put_items)
+
+    def get_backoff(attempt):
+        raise RuntimeError('backoff failed')
+    monkeypatch.setattr(importer, 'get_backoff', get_backoff)
+
+    failures = []
+    report = import_records(dynamodb, TABLE_NAME, 'posts', make_records(60), 'owner',
+                            on_failure=lambda line_number, error: failures.append(line_number))
+    assert report['failed'] == 60
+    assert sorted(failures) == list(range(1, 61))
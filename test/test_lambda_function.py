@@ -0,0 +1,38 @@
+import pytest
+
+import cloud.lambda_function as lambda_function
+import cloud.recipe_store as recipe_store
+from cloud.recipe_store import RecipeStore
+
+from conftest import APP_ID
+
+
+@pytest.fixture
+def store(boto3, database, recipe_controller, monkeypatch):
+    store = RecipeStore(recipe_controller.data, APP_ID)
+    monkeypatch.setattr(recipe_store, '_store', store)
+    monkeypatch.setattr(lambda_function, 'boto3', boto3)
+    return store
+
+
+def make_data(store, params):
+    data = lambda_function.make_data(store, params)
+    data['user'] = {'id': 'user', 'group': 'user'}
+    return data
+
+
+def test_batch_runs_calls_in_order(store):
+    params = {'partition': 'posts', 'read_groups': ['user'], 'write_groups': ['user']}
+    calls = [{'cloud_api_name': 'create_item', 'params': dict(params, item={'n': n})} for n in range(3)]
+    calls.append({'cloud_api_name': 'get_items', 'params': {'partition': 'posts'}})
+
+    response = lambda_function.call_batch(make_data(store, {'calls': calls}))
+    results = response['body']['results']
+    assert [result['statusCode'] for result in results] == [200] * 4
+    assert [item['n'] for item in results[-1]['body']['items']] == [0, 1, 2]
+
+
+def test_batch_rejects_invalid_calls(store):
+    for calls in ('create_item', [1], [{'cloud_api_name': 'get_items', 'params': ['posts']}]):
+        response = lambda_function.call_batch(make_data(store, {'calls': calls}))
+        assert response['statusCode'] == 400
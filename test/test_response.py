@@ -0,0 +1,37 @@
+import base64
+import json
+from decimal import Decimal
+
+import cloud.database.create_items as create_items
+import cloud.database.get_items as get_items
+from cloud.response import Response, decompress, encode_body, json_default
+
+
+def decode(response):
+    """
+    :return: Body as the client reads it, uncompressed bodies are encoded by the Lambda runtime
+    """
+    if response.get('isBase64Encoded', False):
+        return json.loads(decompress(base64.b64decode(response['body']), 'gzip'))
+    return json.loads(json.dumps(response['body'], default=json_default))
+
+
+def test_compressed_body_keeps_number_types(call):
+    call(create_items, {'partition': 'posts', 'items': [{'n': n, 'price': Decimal(n) + Decimal('0.5')} for n in range(3)],
+                        'read_groups': ['user'], 'write_groups': ['user']})
+    body = call(get_items, {'partition': 'posts', 'limit': 2})
+
+    plain = decode(encode_body(Response(dict(body)), None))
+    compressed = encode_body(Response(dict(body)), 'gzip', min_size=0)
+    assert compressed['isBase64Encoded']
+    compressed = decode(compressed)
+    assert compressed == plain
+    for plain_item, item in zip(plain['items'], compressed['items']):
+        assert [type(value) for value in item.values()] == [type(value) for value in plain_item.values()]
+    assert isinstance(compressed['items'][0]['n'], int)
+    assert isinstance(compressed['items'][0]['creationDate'], float)
+    assert isinstance(compressed['end_key']['creationDate'], float)
+
+    # The end_key goes back as the start_key of the next page
+    page = call(get_items, {'partition': 'posts', 'limit': 2, 'start_key': compressed['end_key']})
+    assert [item['n'] for item in page['items']] == [2]
@@ -0,0 +1,61 @@
+import cloud.database.create_items as create_items
+import cloud.database.search_items as search_items
+import cloud.search as search
+
+
+def test_search_items_fields_with_frozen_recipe(call, recipe_controller):
+    recipe_controller.put_search_field('posts', 'title')
+    call(create_items, {
+        'partition': 'posts',
+        'items': [{'title': 'hello world', 'body': 'a'}, {'title': 'goodbye', 'body': 'b'}],
+        'read_groups': ['user'],
+        'write_groups': ['user'],
+    })
+
+    body = call(search_items, {'partition': 'posts', 'query': 'hello', 'fields': ['body']})
+    assert body['success']
+    assert [item['body'] for item in body['items']] == ['a']
+
+
+def create_posts(call, recipe_controller, items):
+    recipe_controller.put_search_field('posts', 'title')
+    body = call(create_items, {'partition': 'posts', 'items': items,
+                               'read_groups': ['user'], 'write_groups': ['user']})
+    return body['item_ids']
+
+
+def test_postings_are_written_in_batches(boto3, call, recipe_controller):
+    boto3.calls.clear()
+    create_posts(call, recipe_controller, [{'title': 'word{} common'.format(n)} for n in range(100)])
+    # 25 items per BatchWriteItem, 200 postings and 100 items, no UpdateItem per term
+    assert boto3.calls[('dynamodb', 'BatchWriteItem')] == 12
+    assert boto3.calls[('dynamodb', 'UpdateItem')] == 1
+
+
+def test_search_items_intersects_long_posting_lists(call, recipe_controller, monkeypatch):
+    monkeypatch.setattr(search, 'FIRST_PAGE_SIZE', 10)
+    monkeypatch.setattr(search, 'PROBE_RATIO', 1)
+    probed = []
+    probe_postings = search.probe_postings
+    monkeypatch.setattr(search, 'probe_postings', lambda *args: probed.append(args[3]) or probe_postings(*args))
+    titles = ['common'] * 30 + ['common rare'] * 3 + ['rare'] * 2 + ['common other'] * 20
+    item_ids = create_posts(call, recipe_controller, [{'title': title} for title in titles])
+
+    # rare is complete in its first page, common is probed for its 5 items
+    body = call(search_items, {'partition': 'posts', 'query': 'rare common', 'limit': 50})
+    assert sorted(item['id'] for item in body['items']) == sorted(item_ids[30:33])
+    assert probed == ['common']
+
+    # Both lists are longer than their first page, other is read on
+    body = call(search_items, {'partition': 'posts', 'query': 'common other', 'limit': 50})
+    assert sorted(item['id'] for item in body['items']) == sorted(item_ids[35:])
+    assert not body['truncated']
+    assert probed == ['common']
+
+
+def test_search_items_with_a_single_syllable(call, recipe_controller):
+    item_ids = create_posts(call, recipe_controller, [{'title': '학교'}, {'title': '학교에서 공부'}, {'title': '공부'}])
+
+    for query, expected in (('학', item_ids[:2]), ('학교', item_ids[:2]), ('교에', item_ids[1:2]), ('부', item_ids[1:])):
+        body = call(search_items, {'partition': 'posts', 'query': query})
+        assert sorted(item['id'] for item in body['items']) == sorted(expected)